@@ -7,6 +7,7 @@ from sqlalchemy import Integer
 from sqlalchemy import String
 from sqlalchemy import Boolean
 from sqlalchemy import JSON
+from sqlalchemy import DateTime
 from sqlalchemy import ForeignKey
 from sqlalchemy.orm import relationship
 
@@ -37,6 +38,12 @@ class User(TimestampMixin, Base):
         back_populates="user",
         cascade="all, delete-orphan"
     )
+    refresh_tokens = relationship(
+        "RefreshToken",
+        back_populates="user",
+        cascade="all, delete-orphan",
+        passive_deletes=True,
+    )
     posts = relationship(
         'Post',
         back_populates='user',
@@ -56,7 +63,23 @@ class ResetPassword(TimestampMixin, Base):
     __tablename__ = "reset_password"
 
     id = Column(Integer, primary_key=True, index=True)
-    secret = Column(String(255), nullable=True)
+    secret = Column(String(255), unique=True, index=True, nullable=True)
+    expires_at = Column(DateTime, index=True, nullable=True)
 
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
     user = relationship("User", back_populates="reset_password")
+
+
+class RefreshToken(TimestampMixin, Base):
+
+    __tablename__ = "refresh_tokens"
+
+    id = Column(Integer, primary_key=True, index=True)
+    token_hash = Column(String(64), unique=True, index=True, nullable=False)
+    family_id = Column(String(32), index=True, nullable=False)
+    expires_at = Column(DateTime, index=True, nullable=False)
+    otp_expires_at = Column(DateTime, nullable=True)
+    revoked_at = Column(DateTime, nullable=True)
+
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), index=True, nullable=False)
+    user = relationship("User", back_populates="refresh_tokens")
@@ -1,5 +1,7 @@
 import settings
+from datetime import datetime
 from datetime import timedelta
+from typing import Optional
 from fastapi import APIRouter
 from fastapi import Path
 from fastapi import Query
@@ -13,6 +15,8 @@ from loguru import logger
 
 from app.auth.utils.otp_handler import OtpHandler
 from app.auth.utils.auth_handler import AuthHandler
+from app.utils.typed_response import typed_response
+from app.utils.rate_limiter import RateLimiter
 from app.auth.schema.auth import LoginUserResponse
 from app.auth.schema.auth import UserResponse
 from app.auth.schema.auth import GetCurrentUserResponse
@@ -23,11 +27,16 @@ from app.auth.schema.auth import ChangePasswordRequest
 from app.auth.schema.auth import ChangePasswordResponse
 from app.auth.schema.auth import VerifyOtpRequest
 from app.auth.schema.auth import VerifyOtpResponse
+from app.auth.schema.auth import RefreshTokenRequest
+from app.auth.schema.auth import RefreshTokenResponse
 from app.auth.schema.auth import DownloadRecoveryOtpResponse
 from app.auth.schema.auth import VerifyRecoveryOtpResponse
 from app.auth.schema.auth import LogoutUserResponse
-from app.auth.services.universal import authentication_user
-from app.auth.services.universal import update_user
+from app.auth.services.login import login_with_password
+from app.auth.services.refresh_tokens import issue_refresh_token
+from app.auth.services.refresh_tokens import rotate_refresh_token
+from app.auth.services.refresh_tokens import set_refresh_token_otp_expires
+from app.auth.services.refresh_tokens import logout_user_by_id
 from app.auth.services.universal import get_user_by_id
 from app.auth.services.universal import register_user
 from app.auth.services.universal import forgot_password_user_by_email
@@ -64,27 +73,24 @@ async def register(
 
     user = await register_user(request)
 
-    return RegisterUserResponse(
-        success=True,
-        message='Register user successful',
-        user=UserResponse(
-            id=user.id,
-            name=user.name,
-            age=user.age,
-            username=user.username,
-            email=user.email,
-            is_admin=user.is_admin,
-            created_at=user.created_at,
-            updated_at=user.updated_at,
-            is_enable_otp=user.is_enable_otp,
-            is_logged_out=user.is_logged_out,
+    return typed_response(
+        RegisterUserResponse.construct(
+            success=True,
+            message='Register user successful',
+            user=UserResponse.from_orm(user),
         ),
+        status_code=201,
     )
 
 
 @auth_router.post(
     '/login',
     response_model=LoginUserResponse,
+    dependencies=[Depends(RateLimiter(
+        "login",
+        ip_limit=settings.RATE_LIMIT_LOGIN_PER_IP,
+        username_limit=settings.RATE_LIMIT_LOGIN_PER_USERNAME,
+    ))],
 )
 async def login_user(
     username: str = Query(
@@ -112,24 +118,26 @@ async def login_user(
 
     logger.info(f'Login with username={username}')
 
-    user = await authentication_user(username, password)
-    await update_user(user.username, is_logged_out=False)
+    user, otp_qr_code_base64 = await login_with_password(username, password)
 
-    otp_qr_code_base64 = None
-    if not user.is_enable_otp:
-        otp_qr_code_base64 = await OtpHandler().generate_otp_qr_code_base64(user.username)
+    refresh_token, family_id = await issue_refresh_token(user.id)
 
     access_token = await AuthHandler().encode_token(
         username=user.username,
         access_token_expires=timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES),
         otp_expires=timedelta(minutes=0),
+        user=user,
+        family_id=family_id,
     )
 
-    return LoginUserResponse(
-        success=True,
-        message="Login successful",
-        access_token=access_token,
-        otp_qr_code_base64=otp_qr_code_base64
+    return typed_response(
+        LoginUserResponse.construct(
+            success=True,
+            message="Login successful",
+            access_token=access_token,
+            refresh_token=refresh_token,
+            otp_qr_code_base64=otp_qr_code_base64
+        )
     )
 
 
@@ -211,21 +219,12 @@ async def get_current_user(
             detail=f'User with id={current_user_id} not found'
         )
 
-    return GetCurrentUserResponse(
-        success=True,
-        message='Get current user successful',
-        user=UserResponse(
-            id=user.id,
-            name=user.name,
-            age=user.age,
-            username=user.username,
-            email=user.email,
-            is_admin=user.is_admin,
-            created_at=user.created_at,
-            updated_at=user.updated_at,
-            is_enable_otp=user.is_enable_otp,
-            is_logged_out=user.is_logged_out,
-        ),
+    return typed_response(
+        GetCurrentUserResponse.construct(
+            success=True,
+            message='Get current user successful',
+            user=UserResponse.from_orm(user),
+        )
     )
 
 
@@ -237,6 +236,7 @@ async def verify_otp(
     request: VerifyOtpRequest,
     current_user_id: int = Depends(AuthHandler().get_current_user_id),
     jwt_expires_seconds: int = Depends(AuthHandler().get_jwt_expires_seconds),
+    family_id: Optional[str] = Depends(AuthHandler().get_token_family_id),
 ) -> VerifyOtpResponse:
     """
     Verify the user's OTP.
@@ -245,6 +245,7 @@ async def verify_otp(
         request (VerifyOtpRequest): The OTP request containing the OTP code to verify.
         current_user_id (int): The ID of the current user.
         jwt_expires_seconds (int): The duration in seconds after which the JWT expires.
+        family_id (Optional[str]): The refresh token family of the login.
 
     Returns:
         VerifyOtpResponse: The response containing the success status, message, and access token.
@@ -257,16 +258,73 @@ async def verify_otp(
 
     user = await OtpHandler().verify_otp(current_user_id, request.code)
 
+    if family_id:
+        otp_expires_at = datetime.now() + timedelta(minutes=settings.OTP_EXPIRE_MINUTES)
+        await set_refresh_token_otp_expires(family_id, otp_expires_at)
+
     access_token = await AuthHandler().encode_token(
         username=user.username,
         access_token_expires=timedelta(seconds=jwt_expires_seconds),
         otp_expires=timedelta(minutes=settings.OTP_EXPIRE_MINUTES),
+        user=user,
+        family_id=family_id,
+    )
+
+    return typed_response(
+        VerifyOtpResponse.construct(
+            success=True,
+            message="Verify OTP successful",
+            access_token=access_token,
+        )
+    )
+
+
+@auth_router.post(
+    '/refresh',
+    response_model=RefreshTokenResponse,
+)
+async def refresh(
+    request: RefreshTokenRequest,
+) -> RefreshTokenResponse:
+    """
+    Exchange a refresh token for a new access token and refresh token.
+
+    The refresh token is single use: the one returned replaces it. Presenting
+    a refresh token a second time revokes every token of its login.
+
+    Args:
+        request (RefreshTokenRequest): The request containing the refresh token.
+
+    Returns:
+        RefreshTokenResponse: The response containing the new tokens.
+
+    Raises:
+        HTTPException: If the refresh token is invalid, expired, revoked or reused.
+    """
+
+    logger.info(f'Refresh token')
+
+    user, refresh_token, family_id, otp_expires_at = await rotate_refresh_token(request.refresh_token)
+
+    otp_expires = timedelta(0)
+    if otp_expires_at is not None:
+        otp_expires = max(otp_expires_at - datetime.now(), timedelta(0))
+
+    access_token = await AuthHandler().encode_token(
+        username=user.username,
+        access_token_expires=timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES),
+        otp_expires=otp_expires,
+        user=user,
+        family_id=family_id,
     )
 
-    return VerifyOtpResponse(
-        success=True,
-        message="Verify OTP successful",
-        access_token=access_token,
+    return typed_response(
+        RefreshTokenResponse.construct(
+            success=True,
+            message="Refresh token successful",
+            access_token=access_token,
+            refresh_token=refresh_token,
+        )
     )
 
 
@@ -296,10 +354,12 @@ async def download_recovery_otp(
 
     list_otp_recovery = await OtpHandler().generate_otp_recovery(current_user_id)
 
-    return DownloadRecoveryOtpResponse(
-        success=True,
-        message='Download recovery OTP successful',
-        list_otp_recovery=list_otp_recovery,
+    return typed_response(
+        DownloadRecoveryOtpResponse.construct(
+            success=True,
+            message='Download recovery OTP successful',
+            list_otp_recovery=list_otp_recovery,
+        )
     )
 
 
@@ -332,15 +392,22 @@ async def verify_recovery_otp(
 
     await OtpHandler().verify_otp_recovery(current_user_id, code)
 
-    return VerifyRecoveryOtpResponse(
-        success=True,
-        message='Verify recovery OTP successful',
+    return typed_response(
+        VerifyRecoveryOtpResponse.construct(
+            success=True,
+            message='Verify recovery OTP successful',
+        )
     )
 
 
 @auth_router.post(
     '/forgot-password',
     response_model=ForgotPasswordResponse,
+    dependencies=[Depends(RateLimiter(
+        "forgot_password",
+        ip_limit=settings.RATE_LIMIT_PASSWORD_RESET_PER_IP,
+        username_limit=settings.RATE_LIMIT_PASSWORD_RESET_PER_USERNAME,
+    ))],
 )
 async def forgot_password(
     request: Request,
@@ -369,9 +436,11 @@ async def forgot_password(
     host = request.base_url
     await forgot_password_user_by_email(host, username, email)
 
-    return ForgotPasswordResponse(
-        success=True,
-        message='Send email to reset password successful',
+    return typed_response(
+        ForgotPasswordResponse.construct(
+            success=True,
+            message='Send email to reset password successful',
+        )
     )
 
 
@@ -379,6 +448,11 @@ async def forgot_password(
     '/reset-password/{username}/{secret}',
     response_class=HTMLResponse,
     deprecated=True,
+    dependencies=[Depends(RateLimiter(
+        "reset_password",
+        ip_limit=settings.RATE_LIMIT_PASSWORD_RESET_PER_IP,
+        username_limit=settings.RATE_LIMIT_PASSWORD_RESET_PER_USERNAME,
+    ))],
 )
 async def reset_password(
     username: str = Path(
@@ -440,9 +514,11 @@ async def change_password(
 
     await change_password_user(current_user_id, request.password, request.password_confirm)
 
-    return ChangePasswordResponse(
-        success=True,
-        message='Change password successful',
+    return typed_response(
+        ChangePasswordResponse.construct(
+            success=True,
+            message='Change password successful',
+        )
     )
 
 
@@ -457,7 +533,7 @@ async def logout_user(
     Logout the current user.
 
     This endpoint logs out the current user by updating their status 
-    to logged out in the database.
+    to logged out in the database and revoking their refresh tokens.
 
     Args:
         current_user_id (int): The ID of the current user.
@@ -468,9 +544,11 @@ async def logout_user(
 
     logger.info(f'Logout with current_user_id={current_user_id}')
 
-    await update_user(current_user_id, is_logged_out=True)
+    await logout_user_by_id(current_user_id)
 
-    return LogoutUserResponse(
-        success=True,
-        message='Logout successful',
+    return typed_response(
+        LogoutUserResponse.construct(
+            success=True,
+            message='Logout successful',
+        )
     )
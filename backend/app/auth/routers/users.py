@@ -1,6 +1,8 @@
+import settings
 from fastapi import APIRouter
 from fastapi import Depends
 from fastapi import Security
+from fastapi import Request
 from loguru import logger
 from app.auth.schema.auth import UserResponse
 from app.auth.schema.users import GetAllUsersResponse
@@ -8,11 +10,16 @@ from app.auth.schema.users import GetOneUserResponse
 from app.auth.schema.users import UpdateUserRequest
 from app.auth.schema.users import UpdateUserResponse
 from app.auth.schema.users import RemoveUserResponse
+from app.auth.schema.users import ImportUserRequest
+from app.auth.schema.users import ImportUsersResponse
 from app.auth.services.universal import select_all_users
 from app.auth.services.universal import get_user_by_id
 from app.auth.services.universal import update_user_by_id
 from app.auth.services.universal import remove_user_by_id
+from app.auth.services.universal import import_users
 from app.auth.utils.auth_handler import AuthHandler
+from app.utils.typed_response import typed_response
+from app.utils.stream_records import iter_request_records
 
 
 users_router = APIRouter(prefix="/users", tags=["users"])
@@ -39,22 +46,12 @@ async def get_all_users(
 
     users = await select_all_users()
 
-    return GetAllUsersResponse(
-        success=True,
-        message='Get all users successful',
-        users=[UserResponse(
-            id=user.id,
-            name=user.name,
-            age=user.age,
-            username=user.username,
-            email=user.email,
-            is_admin=user.is_admin,
-            created_at=user.created_at,
-            updated_at=user.updated_at,
-            is_enable_otp=user.is_enable_otp,
-            is_logged_out=user.is_logged_out,
-        ) for user in users
-        ],
+    return typed_response(
+        GetAllUsersResponse.construct(
+            success=True,
+            message='Get all users successful',
+            users=[UserResponse.from_orm(user) for user in users],
+        )
     )
 
 
@@ -83,21 +80,12 @@ async def get_one_user(
 
     user = await get_user_by_id(id)
 
-    return GetOneUserResponse(
-        success=True,
-        message='Get user by id successful',
-        user=UserResponse(
-            id=user.id,
-            name=user.name,
-            age=user.age,
-            username=user.username,
-            email=user.email,
-            is_admin=user.is_admin,
-            created_at=user.created_at,
-            updated_at=user.updated_at,
-            is_enable_otp=user.is_enable_otp,
-            is_logged_out=user.is_logged_out,
-        ),
+    return typed_response(
+        GetOneUserResponse.construct(
+            success=True,
+            message='Get user by id successful',
+            user=UserResponse.from_orm(user),
+        )
     )
 
 
@@ -127,21 +115,12 @@ async def update_user(
 
     user = await update_user_by_id(current_user_id, request)
 
-    return UpdateUserResponse(
-        success=True,
-        message='Update user successful',
-        user=UserResponse(
-            id=user.id,
-            name=user.name,
-            age=user.age,
-            username=user.username,
-            email=user.email,
-            is_admin=user.is_admin,
-            created_at=user.created_at,
-            updated_at=user.updated_at,
-            is_enable_otp=user.is_enable_otp,
-            is_logged_out=user.is_logged_out,
-        ),
+    return typed_response(
+        UpdateUserResponse.construct(
+            success=True,
+            message='Update user successful',
+            user=UserResponse.from_orm(user),
+        )
     )
 
 
@@ -170,7 +149,71 @@ async def remove_user(
 
     await remove_user_by_id(id)
 
-    return RemoveUserResponse(
-        success=True,
-        message='Remove user successful',
+    return typed_response(
+        RemoveUserResponse.construct(
+            success=True,
+            message='Remove user successful',
+        )
+    )
+
+
+@users_router.post(
+    '/import',
+    response_model=ImportUsersResponse,
+    dependencies=[Security(AuthHandler().is_role_admin)],
+    openapi_extra={
+        "requestBody": {
+            "required": True,
+            "content": {
+                "text/csv": {
+                    "schema": {
+                        "type": "string",
+                        "description": "Header line name,age,username,email,password[,is_admin] followed by one user per line",
+                    },
+                },
+                "application/x-ndjson": {
+                    "schema": {"type": "string", "description": "One ImportUserRequest JSON object per line"},
+                },
+                "application/json": {
+                    "schema": {"type": "array", "items": ImportUserRequest.schema()},
+                },
+            },
+        },
+    },
+)
+async def import_users_bulk(
+    request: Request,
+) -> ImportUsersResponse:
+    """
+    Import many users from a CSV or NDJSON upload.
+
+    The upload is streamed and processed in chunks. Rows that fail
+    validation, repeat a username or email, or clash with an existing user
+    are reported and skipped; the other rows are created.
+
+    Args:
+        request (Request): The request whose body contains the users to import.
+
+    Returns:
+        ImportUsersResponse: The per-row results of the import.
+
+    Raises:
+        HTTPException: If the body is malformed or has too many rows, or if the user is not an admin.
+    """
+
+    logger.info('Import users')
+
+    records = iter_request_records(request, settings.BULK_MAX_ITEMS)
+    results = await import_users(records)
+    created = sum(1 for result in results if result.success)
+
+    return typed_response(
+        ImportUsersResponse.construct(
+            success=True,
+            message='Import users successful',
+            total=len(results),
+            created=created,
+            failed=len(results) - created,
+            results=results,
+        )
     )
@@ -14,6 +14,10 @@ class LoginUserResponse(ResponseTemplate):
         ...,
         description="Access token",
     )
+    refresh_token: str = Field(
+        ...,
+        description="Refresh token",
+    )
     otp_qr_code_base64: Optional[str] = Field(
         None,
         description="OTP QR code base64",
@@ -63,6 +67,9 @@ class UserResponse(BaseModel):
         description="User is logged out",
     )
 
+    class Config:
+        orm_mode = True
+
 
 class GetCurrentUserResponse(ResponseTemplate):
 
@@ -161,6 +168,27 @@ class VerifyOtpResponse(ResponseTemplate):
     )
 
 
+class RefreshTokenRequest(BaseModel):
+
+    refresh_token: str = Field(
+        ...,
+        description="Refresh token",
+        max_length=255,
+    )
+
+
+class RefreshTokenResponse(ResponseTemplate):
+
+    access_token: str = Field(
+        ...,
+        description="Access token",
+    )
+    refresh_token: str = Field(
+        ...,
+        description="Refresh token",
+    )
+
+
 class DownloadRecoveryOtpResponse(ResponseTemplate):
 
     list_otp_recovery: List[str] = Field(
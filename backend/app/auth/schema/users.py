@@ -1,4 +1,5 @@
 from app.common.schema.response_template import ResponseTemplate
+from app.common.schema.bulk import BulkResponseTemplate
 
 
 from pydantic import BaseModel
@@ -50,3 +51,44 @@ class UpdateUserResponse(GetOneUserResponse):
 class RemoveUserResponse(ResponseTemplate):
 
     pass
+
+
+class ImportUserRequest(BaseModel):
+
+    name: str = Field(
+        ...,
+        description="User name",
+        regex=r'^[a-zA-Z\s]+$',
+    )
+    age: int = Field(
+        ...,
+        gt=0,
+        le=100,
+        description="Age must be a valid integer.",
+    )
+    username: str = Field(
+        ...,
+        min_length=5,
+        max_length=50,
+        regex=r'^[a-zA-Z0-9_]+$',
+        description="Username must be between 5 and 50 characters long and must only contain alphanumeric characters and underscores."
+    )
+    email: str = Field(
+        ...,
+        regex=r'^[\w\.-]+@([\w-]+\.)+[\w-]{2,4}$',
+        description="Email must be a valid email address."
+    )
+    password: str = Field(
+        ...,
+        regex=r'^(?!.*[_;*\'"`])(?=.*[a-z])(?=.*[A-Z])(?=.*\d)(?=.*[@$!%?&])[A-Za-z\d@$!%?&]{8,}$',
+        description="Password must be between 8 and 255 characters long."
+    )
+    is_admin: bool = Field(
+        False,
+        description="Is role admin"
+    )
+
+
+class ImportUsersResponse(BulkResponseTemplate):
+
+    pass
@@ -0,0 +1,105 @@
+import pyotp
+from typing import Optional
+from database import get_db_session
+from sqlalchemy import update
+from fastapi import HTTPException
+from loguru import logger
+
+
+from app.auth.models.users import User
+from app.auth.services.universal import get_user_credentials_by_username
+from app.auth.utils.otp_handler import OtpHandler
+from app.auth.utils.password_manager import PasswordManager
+from app.auth.utils.user_cache import USER_SNAPSHOT_COLUMNS
+from app.auth.utils.user_cache import UserSnapshot
+from app.auth.utils.user_cache import store_user_snapshot
+from app.utils.tracing import traced
+
+
+@traced()
+async def login_with_password(
+    username: str,
+    password: str,
+) -> tuple[User, Optional[str]]:
+    """
+    Authenticate a user and apply every state change of a login.
+
+    The user is loaded once. The changes a login implies (leaving the logged
+    out state, upgrading an outdated password hash, creating the OTP secret
+    of a user who has not enabled OTP yet) are applied with a single UPDATE,
+    which is skipped when there is nothing to change.
+
+    Args:
+        username (str): The username of the user to login.
+        password (str): The password of the user to login.
+
+    Returns:
+        tuple[User, Optional[str]]: The user, up to date, and the base64 OTP QR
+        code to show if the user has not enabled OTP yet.
+
+    Raises:
+        HTTPException: If the user does not exist or the password is incorrect.
+    """
+
+    logger.info(f'Login with password with username={username}')
+
+    user = await get_user_credentials_by_username(username)
+
+    if not user:
+
+        logger.error(f'Incorrect username or password')
+
+        raise HTTPException(
+            status_code=404,
+            detail=f'Incorrect username or password'
+        )
+
+    is_valid, new_password_hash = PasswordManager().verify_and_update_password(password, user.password)
+
+    if not is_valid:
+
+        logger.error(f'Incorrect username or password')
+
+        raise HTTPException(
+            status_code=401,
+            detail=f'Incorrect username or password'
+        )
+
+    changes = {}
+
+    if user.is_logged_out is not False:
+        changes["is_logged_out"] = False
+
+    if new_password_hash:
+
+        logger.info(f'Rehash password with username={username}')
+
+        changes["password"] = new_password_hash
+
+    if not user.is_enable_otp and not user.otp_secret:
+        changes["otp_secret"] = pyotp.random_base32()
+
+    if changes:
+        async with get_db_session() as session:
+            statement = (
+                update(User)
+                .where(User.id == user.id)
+                .values(**changes)
+                .returning(*USER_SNAPSHOT_COLUMNS)
+                .execution_options(synchronize_session=False)
+            )
+            row = (await session.execute(statement)).first()
+            await session.commit()
+
+        store_user_snapshot(UserSnapshot(*row))
+
+        for key, value in changes.items():
+            setattr(user, key, value)
+
+    otp_qr_code_base64 = None
+    if not user.is_enable_otp:
+        otp_handler = OtpHandler()
+        uri = await otp_handler.create_uri_from_secret(user.username, user.otp_secret)
+        otp_qr_code_base64 = await otp_handler.create_qr_from_uri(uri)
+
+    return user, otp_qr_code_base64
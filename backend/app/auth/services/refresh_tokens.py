@@ -0,0 +1,244 @@
+import settings
+from datetime import datetime
+from datetime import timedelta
+from typing import Optional
+from database import get_db_session
+from database import purge_in_batches
+from sqlalchemy import select
+from sqlalchemy import update
+from sqlalchemy import insert
+from fastapi import HTTPException
+from loguru import logger
+
+
+from app.auth.models.users import User
+from app.auth.models.users import RefreshToken
+from app.auth.utils.refresh_token import generate_refresh_token
+from app.auth.utils.refresh_token import generate_token_family_id
+from app.auth.utils.refresh_token import hash_refresh_token
+from app.auth.utils.user_cache import USER_SNAPSHOT_COLUMNS
+from app.auth.utils.user_cache import UserSnapshot
+from app.auth.utils.user_cache import store_user_snapshot
+from app.utils.tracing import traced
+
+
+def _new_refresh_token_values(
+    user_id: int,
+    family_id: str,
+    otp_expires_at: Optional[datetime],
+) -> tuple[str, dict]:
+
+    token = generate_refresh_token()
+
+    return token, {
+        "token_hash": hash_refresh_token(token),
+        "family_id": family_id,
+        "user_id": user_id,
+        "expires_at": datetime.now() + timedelta(days=settings.REFRESH_TOKEN_EXPIRE_DAYS),
+        "otp_expires_at": otp_expires_at,
+    }
+
+
+@traced()
+async def issue_refresh_token(user_id: int) -> tuple[str, str]:
+    """
+    Issue the first refresh token of a new login.
+
+    Args:
+        user_id (int): The id of the user who logged in.
+
+    Returns:
+        tuple[str, str]: The refresh token to send to the client, and its family id.
+    """
+
+    logger.info(f'Issue refresh token with user_id={user_id}')
+
+    family_id = generate_token_family_id()
+    token, values = _new_refresh_token_values(user_id, family_id, None)
+
+    async with get_db_session() as session:
+        await session.execute(insert(RefreshToken).values(**values))
+        await session.commit()
+
+    return token, family_id
+
+
+@traced()
+async def rotate_refresh_token(token: str) -> tuple[UserSnapshot, str, str, Optional[datetime]]:
+    """
+    Exchange a refresh token for a new one of the same family.
+
+    The presented token is revoked and its successor inserted in one
+    transaction. A token that was already rotated is only ever presented
+    again if it leaked, so its whole family is revoked: both the thief and
+    the legitimate client have to log in again.
+
+    Args:
+        token (str): The refresh token sent by the client.
+
+    Returns:
+        tuple[UserSnapshot, str, str, Optional[datetime]]: The user, the new refresh
+        token, its family id, and until when the family has passed OTP.
+
+    Raises:
+        HTTPException: If the token is unknown, expired, revoked or reused.
+    """
+
+    token_hash = hash_refresh_token(token)
+    now = datetime.now()
+
+    async with get_db_session() as session:
+
+        statement = (
+            update(RefreshToken)
+            .where(
+                RefreshToken.token_hash == token_hash,
+                RefreshToken.revoked_at.is_(None),
+                RefreshToken.expires_at > now,
+            )
+            .values(revoked_at=now)
+            .returning(RefreshToken.user_id, RefreshToken.family_id, RefreshToken.otp_expires_at)
+            .execution_options(synchronize_session=False)
+        )
+        row = (await session.execute(statement)).first()
+
+        if row is None:
+
+            statement = select(RefreshToken.family_id, RefreshToken.revoked_at).where(RefreshToken.token_hash == token_hash)
+            reused = (await session.execute(statement)).first()
+
+            if reused is not None and reused.revoked_at is not None:
+
+                logger.warning(f'Refresh token reuse detected, revoke family_id={reused.family_id}')
+
+                statement = (
+                    update(RefreshToken)
+                    .where(RefreshToken.family_id == reused.family_id, RefreshToken.revoked_at.is_(None))
+                    .values(revoked_at=now)
+                    .execution_options(synchronize_session=False)
+                )
+                await session.execute(statement)
+                await session.commit()
+
+            logger.error(f'Invalid or expired refresh token')
+
+            raise HTTPException(
+                status_code=401,
+                detail='Invalid or expired refresh token'
+            )
+
+        statement = select(*USER_SNAPSHOT_COLUMNS).where(User.id == row.user_id)
+        user = UserSnapshot(*(await session.execute(statement)).one())
+
+        new_token, values = _new_refresh_token_values(row.user_id, row.family_id, row.otp_expires_at)
+        await session.execute(insert(RefreshToken).values(**values))
+        await session.commit()
+
+    return user, new_token, row.family_id, row.otp_expires_at
+
+
+@traced()
+async def set_refresh_token_otp_expires(family_id: str, otp_expires_at: datetime) -> None:
+    """
+    Record that a login passed OTP, so that refreshed access tokens keep it.
+
+    Args:
+        family_id (str): The family id of the login.
+        otp_expires_at (datetime): Until when the OTP check holds.
+    """
+
+    logger.info(f'Set refresh token otp expires with family_id={family_id}')
+
+    async with get_db_session() as session:
+        statement = (
+            update(RefreshToken)
+            .where(RefreshToken.family_id == family_id, RefreshToken.revoked_at.is_(None))
+            .values(otp_expires_at=otp_expires_at)
+            .execution_options(synchronize_session=False)
+        )
+        await session.execute(statement)
+        await session.commit()
+
+
+@traced()
+async def logout_user_by_id(user_id: int) -> None:
+    """
+    Log a user out of every session.
+
+    Every refresh token of the user is revoked, so each session ends when
+    its short-lived access token expires.
+
+    Args:
+        user_id (int): The id of the user.
+    """
+
+    logger.info(f'Logout user with user_id={user_id}')
+
+    async with get_db_session() as session:
+        await session.execute(_revoke_user_refresh_tokens_statement(user_id))
+        statement = (
+            update(User)
+            .where(User.id == user_id)
+            .values(is_logged_out=True)
+            .returning(*USER_SNAPSHOT_COLUMNS)
+            .execution_options(synchronize_session=False)
+        )
+        row = (await session.execute(statement)).first()
+        await session.commit()
+
+    store_user_snapshot(UserSnapshot(*row) if row else None)
+
+
+@traced()
+async def revoke_user_refresh_tokens(user_id: int) -> None:
+    """
+    Revoke every refresh token of a user, e.g. when the password changes.
+
+    Unlike logout_user_by_id, the user is not marked as logged out: the
+    access tokens already issued stay valid until they expire, but no
+    session can be refreshed.
+
+    Args:
+        user_id (int): The id of the user.
+    """
+
+    logger.info(f'Revoke refresh tokens with user_id={user_id}')
+
+    async with get_db_session() as session:
+        await session.execute(_revoke_user_refresh_tokens_statement(user_id))
+        await session.commit()
+
+
+def _revoke_user_refresh_tokens_statement(user_id: int):
+    return (
+        update(RefreshToken)
+        .where(RefreshToken.user_id == user_id, RefreshToken.revoked_at.is_(None))
+        .values(revoked_at=datetime.now())
+        .execution_options(synchronize_session=False)
+    )
+
+
+@traced()
+async def purge_expired_refresh_tokens(
+    batch_size: int = None,
+    pause_seconds: float = None,
+) -> int:
+    """
+    Delete refresh tokens that have expired.
+
+    Revoked tokens are kept until they expire, so that their reuse is still
+    detected. Rows are deleted in batches with purge_in_batches.
+
+    Args:
+        batch_size (int, optional): The maximum number of rows per DELETE.
+            Defaults to settings.MAINTENANCE_DELETE_BATCH_SIZE.
+        pause_seconds (float, optional): The pause between batches.
+            Defaults to settings.MAINTENANCE_BATCH_PAUSE_SECONDS.
+
+    Returns:
+        int: The number of rows deleted.
+    """
+
+    logger.info('Purge expired refresh tokens')
+
+    return await purge_in_batches(RefreshToken, RefreshToken.expires_at <= datetime.now(), batch_size, pause_seconds)
@@ -1,8 +1,18 @@
 import settings
-from datetime import datetime
 from datetime import timedelta
+from typing import Any
+from typing import AsyncIterator
+from typing import Optional
 from database import get_db_session
+from database import purge_in_batches
 from sqlalchemy import select
+from sqlalchemy import update
+from sqlalchemy import delete
+from sqlalchemy import func
+from sqlalchemy import or_
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.exc import SQLAlchemyError
+from pydantic import ValidationError
 from fastapi import HTTPException
 from loguru import logger
 
@@ -10,13 +20,52 @@ from loguru import logger
 from app.auth.models.users import User
 from app.auth.models.users import ResetPassword
 from app.auth.schema.auth import RegisterUserRequest
+from app.auth.schema.users import ImportUserRequest
 from app.auth.schema.users import UpdateUserRequest
+from app.auth.services.refresh_tokens import revoke_user_refresh_tokens
 from app.auth.utils.password_manager import PasswordManager
+from app.auth.utils.password_manager import hash_passwords
+from app.common.schema.bulk import BulkItemResult
+from app.utils.stream_records import RecordError
+from app.utils.stream_records import chunked
+from app.utils.stream_records import format_validation_error
 from app.auth.utils.random_text import random_text
+from app.auth.utils.reset_token import generate_reset_token
+from app.auth.utils.reset_token import hash_reset_token
 from app.utils.render_html_template import render_html_template
 from app.utils.send_email import send_email
+from app.utils.invalidation import publish_invalidation
+from app.auth.utils.user_cache import USER_SNAPSHOT_COLUMNS
+from app.auth.utils.user_cache import UserSnapshot
+from app.auth.utils.user_cache import get_user_cache
+from app.auth.utils.user_cache import store_user_snapshot
+from app.utils.single_flight import SingleFlight
+from app.utils.tracing import traced
 
 
+_user_loads = SingleFlight()
+
+
+async def _load_user_snapshot(condition) -> Optional[UserSnapshot]:
+
+    cache = get_user_cache()
+    version = cache.start_fill()
+    user = None
+
+    try:
+        async with get_db_session() as session:
+            result = await session.execute(select(*USER_SNAPSHOT_COLUMNS).where(condition))
+            row = result.first()
+
+        if row is not None:
+            user = UserSnapshot(*row)
+    finally:
+        cache.finish_fill(version, user)
+
+    return user
+
+
+@traced()
 async def create_admin_default():
     """
     Called on application startup.  Currently just creates the admin
@@ -48,6 +97,7 @@ async def create_admin_default():
         logger.info("Admin default user already exists...")
 
 
+@traced()
 async def check_admin_default():
     """
     Check if the admin default user exists.
@@ -61,26 +111,80 @@ async def check_admin_default():
     return await get_user_by_username(settings.ADMIN_DEFAULT_USERNAME)
 
 
-async def get_user_by_username(username: str) -> User:
+@traced()
+async def get_user_by_username(username: str) -> Optional[UserSnapshot]:
     """
     Get user by username.
 
+    Served from the user cache, which is filled with a query of the public
+    columns only. Use get_user_credentials_by_username for the password
+    hash or the OTP secrets.
+
     Args:
         username (str): The username of the user to fetch.
 
     Returns:
-        User: The user object if the user exists, None otherwise.
+        Optional[UserSnapshot]: The user if the user exists, None otherwise.
     """
 
     logger.info(f"Get user by username={username}")
 
+    user = get_user_cache().get_by_username(username)
+
+    if user is None:
+        user = await _user_loads.do(
+            ("username", username),
+            lambda: _load_user_snapshot(User.username == username),
+        )
+
+    return user
+
+
+@traced()
+async def get_user_credentials_by_username(username: str) -> Optional[User]:
+    """
+    Load the full user row, with the password hash and OTP secrets, by username.
+
+    It is never cached: only use it where the secrets are needed.
+
+    Args:
+        username (str): The username of the user to fetch.
+
+    Returns:
+        Optional[User]: The user if the user exists, None otherwise.
+    """
+
+    logger.info(f"Get user credentials by username={username}")
+
     async with get_db_session() as session:
         statement = select(User).where(User.username == username)
         result = await session.execute(statement)
-        user = result.scalars().first()
-        return user
+        return result.scalars().first()
+
+
+@traced()
+async def get_user_credentials_by_id(user_id: int) -> Optional[User]:
+    """
+    Load the full user row, with the password hash and OTP secrets, by ID.
+
+    It is never cached: only use it where the secrets are needed.
+
+    Args:
+        user_id (int): The ID of the user to fetch.
+
+    Returns:
+        Optional[User]: The user if the user exists, None otherwise.
+    """
+
+    logger.info(f"Get user credentials by user_id={user_id}")
+
+    async with get_db_session() as session:
+        statement = select(User).where(User.id == user_id)
+        result = await session.execute(statement)
+        return result.scalars().first()
 
 
+@traced()
 async def add_user_with_password_hash(
         user: User
 ) -> User:
@@ -104,10 +208,13 @@ async def add_user_with_password_hash(
     async with get_db_session() as session:
         session.add(user)
         await session.commit()
-        await session.refresh(user)
-        return user
 
+    store_user_snapshot(UserSnapshot(*(getattr(user, field) for field in UserSnapshot._fields)))
+
+    return user
 
+
+@traced()
 async def authentication_user(
     username: str,
     password: str,
@@ -115,6 +222,9 @@ async def authentication_user(
     """
     Authentication user.
 
+    If the stored hash uses a deprecated scheme or cost, it is replaced by
+    a hash made with the current settings.
+
     Args:
         username (str): The username of the user to authenticate.
         password (str): The password of the user to authenticate.
@@ -125,7 +235,7 @@ async def authentication_user(
 
     logger.info(f'Authentication user with username={username}')
 
-    user = await get_user_by_username(username)
+    user = await get_user_credentials_by_username(username)
 
     if not user:
 
@@ -136,7 +246,9 @@ async def authentication_user(
             detail=f'Incorrect username or password'
         )
 
-    if not PasswordManager().verify_password(password, user.password):
+    is_valid, new_password_hash = PasswordManager().verify_and_update_password(password, user.password)
+
+    if not is_valid:
 
         logger.error(f'Incorrect username or password')
 
@@ -145,35 +257,56 @@ async def authentication_user(
             detail=f'Incorrect username or password'
         )
 
+    if new_password_hash:
+
+        logger.info(f'Rehash password with username={username}')
+
+        await update_user(username, password=new_password_hash)
+        user.password = new_password_hash
+
     return user
 
 
-async def update_user(username: str, **kwargs) -> User:
+@traced()
+async def update_user(username: str, **kwargs) -> Optional[UserSnapshot]:
     """
     Updates a user with the given username.
 
+    The update is a single UPDATE ... RETURNING, and the returned user is
+    written through to the user cache.
+
     Args:
         username (str): The username of the user to update.
         **kwargs: The keyword arguments to update the user with.
 
     Returns:
-        User: The updated user if found, None otherwise.
+        Optional[UserSnapshot]: The updated user if found, None otherwise.
+        Without changes, the current user is returned as is.
     """
 
     logger.info(f"Update user: {username}")
 
+    if not kwargs:
+        return await get_user_by_username(username)
+
     try:
-        user = await get_user_by_username(username)
+        statement = (
+            update(User)
+            .where(User.username == username)
+            .values(**kwargs)
+            .returning(*USER_SNAPSHOT_COLUMNS)
+            .execution_options(synchronize_session=False)
+        )
 
-        if user:
-            async with get_db_session() as session:
-                for key, value in kwargs.items():
-                    setattr(user, key, value)
+        async with get_db_session() as session:
+            row = (await session.execute(statement)).first()
+            await session.commit()
 
-                session.add(user)
-                await session.commit()
-                await session.refresh(user)
-                return user
+        if row:
+            user = UserSnapshot(*row)
+            store_user_snapshot(user, username)
+
+            return user
         else:
 
             logger.warning(f"User '{username}' not found")
@@ -186,28 +319,38 @@ async def update_user(username: str, **kwargs) -> User:
         return None
 
 
+@traced()
 async def get_user_by_id(
     user_id: int,
-) -> User:
+) -> Optional[UserSnapshot]:
     """
     Get user by ID.
 
+    Served from the user cache, which is filled with a query of the public
+    columns only. Use get_user_credentials_by_id for the password hash or
+    the OTP secrets.
+
     Args:
         user_id (int): The ID of the user to fetch.
 
     Returns:
-        User: The user object if the user exists, None otherwise.
+        Optional[UserSnapshot]: The user if the user exists, None otherwise.
     """
 
     logger.info(f'Get user by id with user_id={user_id}')
 
-    async with get_db_session() as session:
-        statement = select(User).where(User.id == user_id)
-        result = await session.execute(statement)
-        user = result.scalars().first()
-        return user
+    user = get_user_cache().get_by_id(user_id)
+
+    if user is None:
+        user = await _user_loads.do(
+            ("id", user_id),
+            lambda: _load_user_snapshot(User.id == user_id),
+        )
+
+    return user
 
 
+@traced()
 async def get_user_by_email(
     email: str,
 ) -> User:
@@ -230,6 +373,7 @@ async def get_user_by_email(
         return user
 
 
+@traced()
 async def register_user(
     request: RegisterUserRequest,
 ) -> User:
@@ -292,6 +436,135 @@ async def register_user(
     return await add_user_with_password_hash(new_user)
 
 
+@traced()
+async def import_users(
+    records: AsyncIterator[tuple[int, Any]],
+) -> list[BulkItemResult]:
+    """
+    Import many users.
+
+    Records are processed in chunks of settings.BULK_CHUNK_SIZE. For each
+    chunk, usernames and emails are checked against the upload so far and
+    against the users table with one set-based query, passwords are hashed
+    in the password hash process pool, and the new users are written with
+    one multi-row INSERT ... ON CONFLICT DO NOTHING RETURNING.
+
+    Args:
+        records (AsyncIterator[tuple[int, Any]]): The indexed records to import.
+
+    Returns:
+        list[BulkItemResult]: One result per record, in upload order.
+    """
+
+    logger.info('Import users')
+
+    results = []
+    seen_usernames = set()
+    seen_emails = set()
+
+    def reject(index: int, error: str) -> None:
+        results.append(BulkItemResult.construct(index=index, success=False, id=None, error=error))
+
+    async for chunk in chunked(records, settings.BULK_CHUNK_SIZE):
+
+        candidates = []
+
+        for index, record in chunk:
+
+            if isinstance(record, RecordError):
+                reject(index, str(record))
+                continue
+
+            try:
+                request = ImportUserRequest.parse_obj(record)
+            except ValidationError as e:
+                reject(index, format_validation_error(e))
+                continue
+
+            if request.username in seen_usernames:
+                reject(index, f'Duplicate username={request.username} in upload')
+                continue
+
+            if request.email in seen_emails:
+                reject(index, f'Duplicate email={request.email} in upload')
+                continue
+
+            seen_usernames.add(request.username)
+            seen_emails.add(request.email)
+            candidates.append((index, request))
+
+        if not candidates:
+            continue
+
+        async with get_db_session() as session:
+            statement = select(User.username, User.email).where(or_(
+                User.username.in_([request.username for _, request in candidates]),
+                User.email.in_([request.email for _, request in candidates]),
+            ))
+            result = await session.execute(statement)
+            existing = result.all()
+
+        existing_usernames = {username for username, _ in existing}
+        existing_emails = {email for _, email in existing}
+
+        new_users = []
+        for index, request in candidates:
+
+            if request.username in existing_usernames:
+                reject(index, f'User with username={request.username} already exists')
+            elif request.email in existing_emails:
+                reject(index, f'User with email={request.email} already exists')
+            else:
+                new_users.append((index, request))
+
+        if not new_users:
+            continue
+
+        password_hashes = await hash_passwords([request.password for _, request in new_users])
+
+        rows = [
+            {
+                "name": request.name,
+                "age": request.age,
+                "username": request.username,
+                "email": request.email,
+                "password": password_hash,
+                "is_admin": request.is_admin,
+                "is_enable_otp": False,
+                "is_logged_out": True,
+            }
+            for (_, request), password_hash in zip(new_users, password_hashes)
+        ]
+
+        try:
+            async with get_db_session() as session:
+                statement = insert(User).values(rows).on_conflict_do_nothing().returning(User.id, User.username)
+                result = await session.execute(statement)
+                user_ids = {username: user_id for user_id, username in result.all()}
+                await session.commit()
+        except SQLAlchemyError as e:
+
+            logger.error(f'Import users chunk failed: {e}')
+
+            for index, _ in new_users:
+                reject(index, 'Database error')
+            continue
+
+        logger.info(f'Imported {len(user_ids)} users')
+
+        for index, request in new_users:
+
+            if request.username in user_ids:
+                results.append(BulkItemResult.construct(index=index, success=True, id=user_ids[request.username], error=None))
+            else:
+                reject(index, f'User with username={request.username} or email={request.email} already exists')
+
+    results.sort(key=lambda item: item.index)
+
+    return results
+
+
+@traced()
 async def forgot_password_user_by_email(
     host: str,
     username: str,
@@ -331,30 +604,26 @@ async def forgot_password_user_by_email(
             detail=f'User with username={username} and email={email} not found'
         )
 
-    secret = await random_text()
-    secret_hash = PasswordManager().get_password_hash(secret)
+    secret = generate_reset_token()
+    expires_at = func.localtimestamp() + timedelta(minutes=settings.RESET_PASSWORD_EXPIRED_MINUTES)
 
     async with get_db_session() as session:
-        statement = select(ResetPassword).where(ResetPassword.user_id == user.id)
+        statement = (
+            update(ResetPassword)
+            .where(ResetPassword.user_id == user.id)
+            .values(secret=hash_reset_token(secret), expires_at=expires_at)
+            .execution_options(synchronize_session=False)
+        )
         result = await session.execute(statement)
-        user_reset_password = result.scalars().first()
 
-        if user_reset_password:
-            user_reset_password.secret = secret_hash
-            user_reset_password.updated_at = datetime.now()
-            session.add(user_reset_password)
-            await session.commit()
-            await session.refresh(user_reset_password)
-        else:
-            new_user_reset_password = ResetPassword(
+        if not result.rowcount:
+            session.add(ResetPassword(
                 user_id=user.id,
-                secret=secret_hash,
-                created_at=datetime.now(),
-                updated_at=datetime.now(),
-            )
-            session.add(new_user_reset_password)
-            await session.commit()
-            await session.refresh(new_user_reset_password)
+                secret=hash_reset_token(secret),
+                expires_at=expires_at,
+            ))
+
+        await session.commit()
 
     html_content = render_html_template(
         path_file_template="app/email/forgot_password.html",
@@ -371,6 +640,7 @@ async def forgot_password_user_by_email(
     )
 
 
+@traced()
 async def reset_password_user_by_secret(
     username: str,
     secret: str,
@@ -378,6 +648,10 @@ async def reset_password_user_by_secret(
     """
     Reset password user by secret.
 
+    The link is valid once, for settings.RESET_PASSWORD_EXPIRED_MINUTES
+    after it was sent. Every refresh token of the user is revoked, so no
+    session opened with the old password can be refreshed.
+
     Args:
         username (str): The username of the user to reset password.
         secret (str): The secret of the user to reset password.
@@ -386,66 +660,53 @@ async def reset_password_user_by_secret(
         str: The response of the reset password request.
 
     Raises:
-        HTTPException: If the user with the given username is not found.
-        HTTPException: If the reset password with the given username is not found.
-        HTTPException: If the secret is incorrect.
-        HTTPException: If the user reset password with the given username and secret expired.
+        HTTPException: If the secret does not match the username, was already used or expired.
     """
 
-    logger.info(f'Reset password user by username={username}, secret={secret}')
-
-    user = await get_user_by_username(username)
-
-    if not user:
-
-        logger.error(f'User with username={username} not found')
-
-        raise HTTPException(
-            status_code=404,
-            detail=f'User with username={username} not found'
-        )
+    logger.info(f'Reset password user by username={username}')
+
+    # Resolve, check and consume the token in one statement, so that the
+    # same link cannot be used twice even by concurrent requests. Expiry is
+    # checked with the clock of the database, which also set it.
+    consume_statement = (
+        update(ResetPassword)
+        .where(ResetPassword.secret == hash_reset_token(secret))
+        .where(ResetPassword.expires_at > func.localtimestamp())
+        .where(ResetPassword.user_id == select(User.id).where(User.username == username).scalar_subquery())
+        .values(secret=None, expires_at=None)
+        .returning(ResetPassword.user_id)
+        .execution_options(synchronize_session=False)
+    )
 
+    # The token is only used up if the new password is stored with it.
     async with get_db_session() as session:
-        statement = select(ResetPassword).where(ResetPassword.user_id == user.id)
-        result = await session.execute(statement)
-        user_reset_password = result.scalars().first()
-
-    if not user_reset_password:
+        result = await session.execute(consume_statement)
+        user_id = result.scalar()
 
-        logger.error(f'User reset password with username={username} not found')
+        if user_id is None:
 
-        raise HTTPException(
-            status_code=404,
-            detail=f'User reset password with username={username} not found'
-        )
+            logger.error(f'Invalid or expired reset password link with username={username}')
 
-    if not PasswordManager().verify_password(secret, user_reset_password.secret):
-
-        logger.error(f'Incorrect secret: {secret}')
-
-        raise HTTPException(
-            status_code=404,
-            detail=f'Incorrect secret: {secret}'
-        )
-
-    if user_reset_password.updated_at < datetime.now() - timedelta(minutes=settings.RESET_PASSWORD_EXPIRED_MINUTES):
-
-        logger.error(f'User reset password with username={username} and secret={secret} expired')
+            raise HTTPException(
+                status_code=404,
+                detail=f'Invalid or expired reset password link with username={username}'
+            )
 
-        raise HTTPException(
-            status_code=404,
-            detail=f'User reset password with username={username} and secret={secret} expired'
+        new_password = await random_text(length=12)
+        password_statement = (
+            update(User)
+            .where(User.id == user_id)
+            .values(password=PasswordManager().get_password_hash(new_password))
+            .returning(*USER_SNAPSHOT_COLUMNS)
+            .execution_options(synchronize_session=False)
         )
+        row = (await session.execute(password_statement)).first()
+        await session.commit()
 
-    user_reset_password.secret = None
-    user_reset_password.updated_at = datetime.now()
-    session.add(user_reset_password)
-    await session.commit()
-    await session.refresh(user_reset_password)
+    user = UserSnapshot(*row)
+    store_user_snapshot(user, username)
 
-    new_password = await random_text(length=12)
-    new_password_hash = PasswordManager().get_password_hash(new_password)
-    await update_user(username, password=new_password_hash)
+    await revoke_user_refresh_tokens(user.id)
 
     html_content = render_html_template(
         path_file_template="app/html/reset_password.html",
@@ -458,6 +719,37 @@ async def reset_password_user_by_secret(
     return html_content
 
 
+@traced()
+async def purge_expired_reset_tokens(
+    batch_size: int = None,
+    pause_seconds: float = None,
+) -> int:
+    """
+    Delete reset password rows whose token was used or has expired.
+
+    Rows are deleted in batches with purge_in_batches.
+
+    Args:
+        batch_size (int, optional): The maximum number of rows per DELETE.
+            Defaults to settings.MAINTENANCE_DELETE_BATCH_SIZE.
+        pause_seconds (float, optional): The pause between batches.
+            Defaults to settings.MAINTENANCE_BATCH_PAUSE_SECONDS.
+
+    Returns:
+        int: The number of rows deleted.
+    """
+
+    logger.info('Purge expired reset tokens')
+
+    return await purge_in_batches(
+        ResetPassword,
+        or_(ResetPassword.secret.is_(None), ResetPassword.expires_at <= func.localtimestamp()),
+        batch_size,
+        pause_seconds,
+    )
+
+
+@traced()
 async def change_password_user(
     current_user_id: int,
     password: str,
@@ -466,6 +758,9 @@ async def change_password_user(
     """
     Change password of the user with the given current user id.
 
+    Every refresh token of the user is revoked, so no session opened with
+    the old password can be refreshed.
+
     Args:
         current_user_id (int): The id of the current user.
         password (str): The new password.
@@ -503,16 +798,20 @@ async def change_password_user(
 
     new_password_hash = PasswordManager().get_password_hash(password)
     await update_user(user.username, password=new_password_hash)
+    await revoke_user_refresh_tokens(user.id)
 
     return user
 
 
-async def select_all_users() -> list[User]:
+@traced()
+async def select_all_users() -> list[UserSnapshot]:
     """
     Retrieve all users from the database.
 
+    Only the public columns are loaded.
+
     Returns:
-        list[User]: A list of all user objects.
+        list[UserSnapshot]: A list of all users.
 
     Logs:
         Logs the selection of all users.
@@ -521,13 +820,14 @@ async def select_all_users() -> list[User]:
     logger.info(f'Select all users')
 
     async with get_db_session() as session:
-        statement = select(User)
+        statement = select(*USER_SNAPSHOT_COLUMNS)
         result = await session.execute(statement)
-        users = result.scalars().all()
+        users = [UserSnapshot(*row) for row in result]
 
     return users
 
 
+@traced()
 async def update_user_by_id(
     current_user_id: int,
     request: UpdateUserRequest,
@@ -584,6 +884,7 @@ async def update_user_by_id(
     return user
 
 
+@traced()
 async def remove_user_by_id(
     user_id: int,
 ) -> None:
@@ -608,6 +909,22 @@ async def remove_user_by_id(
         )
 
     async with get_db_session() as session:
-        async with session.begin():
-            await session.delete(user)
-            await session.commit()
+        # Refresh tokens go with the user and posts and comments lose their
+        # author through the foreign keys; reset password rows have no
+        # ON DELETE rule.
+        await session.execute(
+            delete(ResetPassword)
+            .where(ResetPassword.user_id == user_id)
+            .execution_options(synchronize_session=False)
+        )
+        await session.execute(
+            delete(User)
+            .where(User.id == user_id)
+            .execution_options(synchronize_session=False)
+        )
+        await session.commit()
+
+    publish_invalidation("users", f"id:{user.id}", f"username:{user.username}")
+    # The posts and comments of the user lose their author.
+    publish_invalidation("posts")
+    publish_invalidation("comments")
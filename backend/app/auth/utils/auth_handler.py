@@ -7,8 +7,14 @@ from fastapi.security import HTTPBearer
 from fastapi import Depends
 from fastapi import HTTPException
 from loguru import logger
+from typing import Optional
+from app.auth.models.users import User
 from app.auth.services.universal import get_user_by_username
-from app.auth.services.universal import get_user_by_id
+from app.auth.utils.jwt_keys import decode_jwt
+from app.auth.utils.jwt_keys import encode_jwt
+from app.utils.metrics import JWT_DECODES
+from app.utils.server_timing import timed
+from app.utils.tracing import traced
 
 
 class AuthHandler:
@@ -17,11 +23,14 @@ class AuthHandler:
         scheme_name='Authorization'
     )
 
+    @traced()
     async def encode_token(
         self,
         username: str,
         access_token_expires: timedelta = timedelta(hours=24),
         otp_expires: timedelta = timedelta(hours=1),
+        user: Optional[User] = None,
+        family_id: Optional[str] = None,
     ) -> str:
         """
         Encode a JWT token for the given username.
@@ -30,6 +39,8 @@ class AuthHandler:
             username (str): The username of the user for whom the token is to be encoded.
             access_token_expires (timedelta, optional): The duration after which the access token expires.
             otp_expires (timedelta, optional): The duration after which the OTP expires.
+            user (Optional[User], optional): The user, if already loaded, to skip the lookup.
+            family_id (Optional[str], optional): The refresh token family of the login.
 
         Returns:
             str: The encoded JWT token.
@@ -40,7 +51,8 @@ class AuthHandler:
 
         logger.info(f"Encode token with username={username}")
 
-        user = await get_user_by_username(username)
+        if user is None:
+            user = await get_user_by_username(username)
 
         payload = {
             "iat": datetime.now(timezone.utc),
@@ -50,8 +62,12 @@ class AuthHandler:
             "is_admin": user.is_admin,
             "otp_expires": int(datetime.now(timezone.utc).timestamp()) + otp_expires.seconds,
         }
-        return jwt.encode(payload, settings.JWT_SECRET, algorithm=settings.JWT_ALGORITHM)
+        if family_id:
+            payload["fam"] = family_id
+        return encode_jwt(payload)
 
+    @traced()
+    @timed("auth")
     async def decode_token(
         self,
         token: str
@@ -59,6 +75,10 @@ class AuthHandler:
         """
         Decode a JWT token.
 
+        Access tokens are short-lived and checked statelessly, without any
+        database access: logging out revokes the refresh tokens, so a session
+        ends when its access token expires.
+
         Args:
             token (str): The JWT token to decode.
 
@@ -72,7 +92,8 @@ class AuthHandler:
         logger.info(f'Decode token with token={token}')
 
         try:
-            payload = jwt.decode(token, settings.JWT_SECRET, algorithms=[settings.JWT_ALGORITHM])
+            payload = decode_jwt(token)
+            JWT_DECODES.inc("valid")
 
             if payload.get('exp') < int(datetime.now(timezone.utc).timestamp()):
 
@@ -83,38 +104,19 @@ class AuthHandler:
                     detail='Token expired'
                 )
 
-            user_id = payload.get('sub')
-
-            user = await get_user_by_id(user_id)
-
-            if not user:
-
-                logger.error(f'User with user_id={user_id} not found')
-
-                raise HTTPException(
-                    status_code=404,
-                    detail=f'User with user_id={user_id} not found'
-                )
-
-            if user.is_logged_out:
-
-                logger.error(f'User with user_id={user_id} is logged out')
-
-                raise HTTPException(
-                    status_code=401,
-                    detail=f'User with user_id={user_id} is logged out'
-                )
-
             return payload
         except jwt.InvalidTokenError:
 
             logger.error(f'Invalid token')
 
+            JWT_DECODES.inc("invalid")
+
             raise HTTPException(
                 status_code=401,
                 detail='Invalid token'
             )
 
+    @traced()
     async def get_current_user_id(
         self,
         credentials: str = Depends(security)
@@ -141,6 +143,7 @@ class AuthHandler:
 
         return user_id
 
+    @traced()
     async def check_otp(
         self,
         credentials: str = Depends(security)
@@ -174,6 +177,7 @@ class AuthHandler:
 
         return payload
 
+    @traced()
     async def get_current_user_id_with_check_otp(
         self,
         credentials: str = Depends(security)
@@ -202,6 +206,7 @@ class AuthHandler:
         await self.check_otp(credentials)
         return await self.get_current_user_id(credentials)
 
+    @traced()
     async def is_role_admin(
         self,
         credentials: str = Depends(security)
@@ -236,6 +241,32 @@ class AuthHandler:
                 detail=f'User with user_id={user_id} is not admin'
             )
 
+    @traced()
+    async def get_token_family_id(
+        self,
+        credentials: str = Depends(security)
+    ) -> Optional[str]:
+        """
+        Get the refresh token family of the login the JWT token belongs to.
+
+        Args:
+            credentials (str): The JWT token to decode.
+
+        Returns:
+            Optional[str]: The family id, or None for tokens issued without one.
+
+        Raises:
+            HTTPException: If the token is expired or invalid.
+        """
+        token = credentials.credentials
+
+        logger.info(f'Get token family id with token={token}')
+
+        payload = await self.decode_token(token)
+
+        return payload.get('fam')
+
+    @traced()
     async def get_jwt_expires_seconds(
         self,
         credentials: str = Depends(security)
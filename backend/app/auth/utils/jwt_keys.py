@@ -0,0 +1,251 @@
+import settings
+import argparse
+import base64
+import hashlib
+import os
+from datetime import datetime
+from typing import Optional
+import jwt
+import orjson
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import ec
+from cryptography.hazmat.primitives.asymmetric import ed25519
+from loguru import logger
+
+
+ALGORITHMS = ("EdDSA", "ES256")
+
+
+def _b64url(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode()
+
+
+class SigningKey:
+    """
+    One key of the key ring: a private key, or only the public key of a
+    retired key that may still have signed live tokens.
+    """
+
+    __slots__ = ("kid", "algorithm", "private_key", "public_key")
+
+    def __init__(self, kid: str, private_key=None, public_key=None):
+        self.kid = kid
+        self.private_key = private_key
+        self.public_key = public_key or private_key.public_key()
+
+        if isinstance(self.public_key, ed25519.Ed25519PublicKey):
+            self.algorithm = "EdDSA"
+        elif isinstance(self.public_key, ec.EllipticCurvePublicKey) and isinstance(self.public_key.curve, ec.SECP256R1):
+            self.algorithm = "ES256"
+        else:
+            raise ValueError(f"Key {kid} must be an Ed25519 or P-256 key")
+
+    def to_jwk(self) -> dict:
+
+        jwk = {"kid": self.kid, "use": "sig", "alg": self.algorithm}
+
+        if self.algorithm == "EdDSA":
+            raw = self.public_key.public_bytes(serialization.Encoding.Raw, serialization.PublicFormat.Raw)
+            jwk.update(kty="OKP", crv="Ed25519", x=_b64url(raw))
+        else:
+            numbers = self.public_key.public_numbers()
+            jwk.update(
+                kty="EC",
+                crv="P-256",
+                x=_b64url(numbers.x.to_bytes(32, "big")),
+                y=_b64url(numbers.y.to_bytes(32, "big")),
+            )
+
+        return jwk
+
+
+class KeyRing:
+    """
+    The keys used to sign and verify access tokens.
+
+    Keys are read from a directory: "<kid>.pem" holds a private key and
+    "<kid>.pub.pem" the public key of a retired one. Tokens are signed with
+    settings.JWT_SIGNING_KEY_ID, which is required once the ring holds more
+    than one private key, and verified with whichever key their "kid" header
+    names.
+
+    To rotate without downtime: add the new private key to every replica
+    while they still sign with the old one, then switch
+    JWT_SIGNING_KEY_ID to it, and keep the old key (or its public half)
+    until the last token it signed has expired. Since a replica never signs
+    with a key it was not told to, no replica issues tokens that the
+    others cannot verify yet.
+    """
+
+    def __init__(self, keys: list[SigningKey], signing_kid: str = ""):
+
+        if not keys:
+            raise ValueError("The JWT key ring is empty")
+
+        self.keys = {key.kid: key for key in keys}
+
+        private_kids = sorted(key.kid for key in keys if key.private_key is not None)
+        if not private_kids:
+            raise ValueError("The JWT key ring has no private key to sign with")
+
+        if not signing_kid:
+            if len(private_kids) > 1:
+                raise ValueError(f"The JWT key ring has private keys {', '.join(private_kids)}: set JWT_SIGNING_KEY_ID to the one to sign with")
+            signing_kid = private_kids[0]
+
+        if signing_kid not in self.keys:
+            raise ValueError(f"JWT signing key {signing_kid} is not in the key ring")
+
+        self.signing_key = self.keys[signing_kid]
+        if self.signing_key.private_key is None:
+            raise ValueError(f"JWT signing key {self.signing_key.kid} has no private key")
+
+        self.jwks = orjson.dumps({"keys": [key.to_jwk() for key in self.keys.values()]})
+        self.jwks_etag = f'"{hashlib.sha256(self.jwks).hexdigest()[:32]}"'
+
+    @classmethod
+    def from_directory(cls, path: str, signing_kid: str = "") -> "KeyRing":
+
+        keys = []
+
+        for name in sorted(os.listdir(path)):
+
+            with open(os.path.join(path, name), "rb") as file:
+                data = file.read()
+
+            if name.endswith(".pub.pem"):
+                keys.append(SigningKey(name[:-len(".pub.pem")], public_key=serialization.load_pem_public_key(data)))
+            elif name.endswith(".pem"):
+                keys.append(SigningKey(name[:-len(".pem")], private_key=serialization.load_pem_private_key(data, None)))
+
+        logger.info(f'Loaded JWT keys {", ".join(key.kid for key in keys)} from {path}')
+
+        return cls(keys, signing_kid)
+
+    def encode(self, payload: dict) -> str:
+        return jwt.encode(
+            payload,
+            self.signing_key.private_key,
+            algorithm=self.signing_key.algorithm,
+            headers={"kid": self.signing_key.kid},
+        )
+
+    def decode(self, token: str) -> dict:
+
+        kid = jwt.get_unverified_header(token).get("kid")
+        key = self.keys.get(kid)
+
+        if key is None:
+            raise jwt.InvalidTokenError(f"Unknown key id {kid!r}")
+
+        return jwt.decode(token, key.public_key, algorithms=[key.algorithm])
+
+
+_key_ring: Optional[KeyRing] = None
+
+
+def get_key_ring() -> Optional[KeyRing]:
+    """
+    Get the key ring configured by settings.JWT_KEYS_DIR.
+
+    Returns:
+        Optional[KeyRing]: The key ring, or None when tokens are signed with
+        the shared settings.JWT_SECRET.
+    """
+
+    global _key_ring
+
+    if _key_ring is None and settings.JWT_KEYS_DIR:
+        _key_ring = KeyRing.from_directory(settings.JWT_KEYS_DIR, settings.JWT_SIGNING_KEY_ID)
+
+    return _key_ring
+
+
+def encode_jwt(payload: dict) -> str:
+    """
+    Sign a token with the current signing key, or the shared secret.
+
+    Args:
+        payload (dict): The claims of the token.
+
+    Returns:
+        str: The encoded token.
+    """
+
+    key_ring = get_key_ring()
+
+    if key_ring is None:
+        return jwt.encode(payload, settings.JWT_SECRET, algorithm=settings.JWT_ALGORITHM)
+
+    return key_ring.encode(payload)
+
+
+def decode_jwt(token: str) -> dict:
+    """
+    Verify a token and return its claims.
+
+    Args:
+        token (str): The encoded token.
+
+    Returns:
+        dict: The claims of the token.
+
+    Raises:
+        jwt.InvalidTokenError: If the token is malformed, expired, signed by an
+            unknown key or has an invalid signature.
+    """
+
+    key_ring = get_key_ring()
+
+    if key_ring is None:
+        return jwt.decode(token, settings.JWT_SECRET, algorithms=[settings.JWT_ALGORITHM])
+
+    return key_ring.decode(token)
+
+
+def generate_key(directory: str, algorithm: str = "EdDSA") -> str:
+    """
+    Generate a private key in the key directory.
+
+    The kid starts with the creation time. The key only verifies tokens
+    until settings.JWT_SIGNING_KEY_ID is set to its kid, unless it is the
+    only private key of the directory.
+
+    Args:
+        directory (str): The key directory.
+        algorithm (str, optional): "EdDSA" or "ES256". Defaults to "EdDSA".
+
+    Returns:
+        str: The path of the new key.
+    """
+
+    if algorithm == "EdDSA":
+        private_key = ed25519.Ed25519PrivateKey.generate()
+    else:
+        private_key = ec.generate_private_key(ec.SECP256R1())
+
+    kid = f"{datetime.now():%Y%m%d%H%M%S}-{os.urandom(3).hex()}"
+    path = os.path.join(directory, f"{kid}.pem")
+
+    os.makedirs(directory, exist_ok=True)
+
+    data = private_key.private_bytes(
+        serialization.Encoding.PEM,
+        serialization.PrivateFormat.PKCS8,
+        serialization.NoEncryption(),
+    )
+
+    with open(os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600), "wb") as file:
+        file.write(data)
+
+    return path
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description="Generate a JWT signing key. Usage: python -m app.auth.utils.jwt_keys --dir keys")
+    parser.add_argument("--dir", default=settings.JWT_KEYS_DIR or "jwt_keys")
+    parser.add_argument("--algorithm", choices=ALGORITHMS, default="EdDSA")
+    args = parser.parse_args()
+
+    print(generate_key(args.dir, args.algorithm))
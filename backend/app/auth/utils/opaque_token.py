@@ -0,0 +1,61 @@
+import settings
+import functools
+import hashlib
+import hmac
+import secrets
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.kdf.hkdf import HKDF
+
+
+def generate_opaque_token() -> str:
+    """
+    Generate a random, URL-safe token of 256 bits.
+
+    Returns:
+        str: The token to send to the user or client.
+    """
+    return secrets.token_urlsafe(32)
+
+
+@functools.lru_cache(maxsize=None)
+def derive_token_key(purpose: str) -> bytes:
+    """
+    Derive the HMAC key of one kind of token from settings.JWT_SECRET.
+
+    HKDF with the purpose as info gives each kind of token its own key, so
+    a digest of one kind is useless as a digest of another, and neither
+    reveals anything about the JWT secret.
+
+    Args:
+        purpose (str): The kind of token, e.g. "reset_password".
+
+    Returns:
+        bytes: The 32-byte key.
+    """
+
+    hkdf = HKDF(
+        algorithm=hashes.SHA256(),
+        length=32,
+        salt=None,
+        info=f"opaque_token:{purpose}".encode(),
+    )
+
+    return hkdf.derive(settings.JWT_SECRET.encode())
+
+
+def hash_opaque_token(key: bytes, token: str) -> str:
+    """
+    Digest an opaque token for storage and lookup.
+
+    The token carries 256 bits of randomness, so a keyed SHA-256 is enough
+    to keep a leaked table useless, and the digest of a token is stable so
+    it can be looked up with an index.
+
+    Args:
+        key (bytes): The HMAC key of this kind of token.
+        token (str): The token sent to the user or client.
+
+    Returns:
+        str: The hex HMAC-SHA256 digest of the token.
+    """
+    return hmac.new(key, token.encode(), hashlib.sha256).hexdigest()
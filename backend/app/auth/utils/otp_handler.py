@@ -2,14 +2,62 @@ import settings
 import pyotp
 import qrcode
 import base64
+import hmac
+import time
+from functools import lru_cache
 from io import BytesIO
+from typing import Optional
 from fastapi import HTTPException
 from loguru import logger
 from app.auth.models.users import User
-from app.auth.services.universal import get_user_by_username
-from app.auth.services.universal import get_user_by_id
+from app.auth.services.universal import get_user_credentials_by_username
+from app.auth.services.universal import get_user_credentials_by_id
 from app.auth.services.universal import update_user
+from app.auth.utils.otp_replay_cache import mark_otp_used
 from app.auth.utils.random_text import random_text
+from app.utils.metrics import OTP_QR_RENDERS
+
+
+@lru_cache(maxsize=10000)
+def get_totp(otp_secret: str) -> pyotp.TOTP:
+    """
+    Get the TOTP generator of a secret, reusing it across requests.
+
+    Args:
+        otp_secret (str): The base32 OTP secret.
+
+    Returns:
+        pyotp.TOTP: The TOTP generator.
+    """
+    return pyotp.TOTP(otp_secret)
+
+
+def find_otp_time_step(totp: pyotp.TOTP, code: str, now: float) -> Optional[int]:
+    """
+    Find the time step whose code matches, within settings.OTP_VALID_WINDOW steps of now.
+
+    Args:
+        totp (pyotp.TOTP): The TOTP generator of the user.
+        code (str): The OTP code to check.
+        now (float): The current Unix time.
+
+    Returns:
+        Optional[int]: The matching time step, or None if the code is incorrect,
+        including when it is not made of totp.digits ASCII digits.
+    """
+
+    code = str(code).encode()
+
+    if len(code) != totp.digits or not code.isdigit():
+        return None
+
+    current_step = int(now // totp.interval)
+
+    for time_step in range(current_step - settings.OTP_VALID_WINDOW, current_step + settings.OTP_VALID_WINDOW + 1):
+        if hmac.compare_digest(totp.generate_otp(time_step).encode(), code):
+            return time_step
+
+    return None
 
 
 class OtpHandler:
@@ -52,7 +100,7 @@ class OtpHandler:
 
         logger.info(f'Generate secret if not exits with username: {username}')
 
-        user = await get_user_by_username(username)
+        user = await get_user_credentials_by_username(username)
 
         if not user:
 
@@ -84,7 +132,7 @@ class OtpHandler:
 
         logger.info(f'Create URI from secret with username: {username}')
 
-        totp = pyotp.TOTP(otp_secret)
+        totp = get_totp(otp_secret)
 
         return totp.provisioning_uri(
             issuer_name=settings.ISSUER_NAME,
@@ -109,6 +157,8 @@ class OtpHandler:
         qr_img.save(buffered, "PNG")
         qr_base64 = base64.b64encode(buffered.getvalue()).decode('utf-8')
 
+        OTP_QR_RENDERS.inc()
+
         return qr_base64
 
     async def verify_otp(
@@ -119,6 +169,10 @@ class OtpHandler:
         """
         Verify the user's OTP.
 
+        Each code is accepted once: the time step it belongs to is recorded
+        per user until the code expires. The user is only written when OTP
+        gets enabled.
+
         Args:
             user_id (int): The ID of the user to verify the OTP for.
             code (str): The OTP code to verify.
@@ -127,12 +181,13 @@ class OtpHandler:
             User: The user object if the OTP is correct.
 
         Raises:
-            HTTPException: If the user with the given ID is not found or if the OTP is incorrect.
+            HTTPException: If the user with the given ID is not found or if the OTP is incorrect
+                or already used.
         """
 
         logger.info(f'Verify OTP with code={code}')
 
-        user = await get_user_by_id(user_id)
+        user = await get_user_credentials_by_id(user_id)
 
         if not user:
 
@@ -143,18 +198,34 @@ class OtpHandler:
                 detail=f"User with id '{user_id}' not found"
             )
 
-        totp = pyotp.TOTP(user.otp_secret)
-        if not totp.verify(code):
+        totp = get_totp(user.otp_secret)
+        now = time.time()
+        time_step = find_otp_time_step(totp, code, now)
+
+        if time_step is None:
             raise HTTPException(
                 status_code=400,
                 detail="Incorrect OTP."
             )
 
-        await update_user(
-            user.username,
-            is_enable_otp=True,
-            is_logged_out=False,
-        )
+        # The code stays valid until its step leaves the window.
+        ttl_seconds = int((time_step + settings.OTP_VALID_WINDOW + 1) * totp.interval - now) + 1
+
+        if not await mark_otp_used(user.id, time_step, ttl_seconds):
+
+            logger.error(f'OTP already used with user_id={user_id}')
+
+            raise HTTPException(
+                status_code=400,
+                detail="OTP already used."
+            )
+
+        if not user.is_enable_otp or user.is_logged_out:
+            await update_user(
+                user.username,
+                is_enable_otp=True,
+                is_logged_out=False,
+            )
 
         return user
 
@@ -177,7 +248,7 @@ class OtpHandler:
 
         logger.info(f'Generate OTP Recovery with user_id={user_id}')
 
-        user = await get_user_by_id(user_id)
+        user = await get_user_credentials_by_id(user_id)
 
         if not user:
 
@@ -218,7 +289,7 @@ class OtpHandler:
 
         logger.info(f'Verify OTP Recovery with user_id={user_id} and code={code}')
 
-        user = await get_user_by_id(user_id)
+        user = await get_user_credentials_by_id(user_id)
 
         if not user:
 
@@ -0,0 +1,129 @@
+import settings
+import heapq
+import time
+from abc import ABC
+from abc import abstractmethod
+from typing import Optional
+from loguru import logger
+
+
+from app.utils.redis_client import RedisError
+from app.utils.redis_client import get_redis_client
+
+
+class OtpReplayCache(ABC):
+    """
+    Remembers which TOTP time steps each user has already consumed.
+
+    An entry only has to live as long as the code of its time step is
+    accepted, so every entry expires on its own after ttl_seconds.
+    """
+
+    @abstractmethod
+    async def mark_used(self, user_id: int, time_step: int, ttl_seconds: int) -> bool:
+        """
+        Mark the code of a time step as used by a user.
+
+        Args:
+            user_id (int): The ID of the user.
+            time_step (int): The TOTP time step the code belongs to.
+            ttl_seconds (int): How long the code of this time step stays valid.
+
+        Returns:
+            bool: True if the code was not used before, False if it is a replay.
+        """
+
+
+class MemoryOtpReplayCache(OtpReplayCache):
+    """
+    Keep used time steps in process memory, bounded to max_keys entries.
+
+    Entries expire with the time step of their code, not in the order they
+    were written, so a heap by expiry finds the expired ones; when full, the
+    entry that expires first is evicted. Entries are per worker process.
+    """
+
+    def __init__(self, max_keys: int = 100000):
+        self.max_keys = max_keys
+        self._entries: dict = {}
+        self._expiry: list = []
+
+    async def mark_used(self, user_id: int, time_step: int, ttl_seconds: int) -> bool:
+
+        now = time.monotonic()
+
+        while self._expiry and (self._expiry[0][0] <= now or len(self._entries) >= self.max_keys):
+            expires_at, key = heapq.heappop(self._expiry)
+            if self._entries.get(key) == expires_at:
+                del self._entries[key]
+
+        key = (user_id, time_step)
+
+        if key in self._entries:
+            return False
+
+        expires_at = now + ttl_seconds
+        self._entries[key] = expires_at
+        heapq.heappush(self._expiry, (expires_at, key))
+
+        return True
+
+
+class RedisOtpReplayCache(OtpReplayCache):
+    """
+    Keep used time steps in a Redis-protocol server shared by all workers.
+    """
+
+    async def mark_used(self, user_id: int, time_step: int, ttl_seconds: int) -> bool:
+
+        reply = await get_redis_client().set(f"otp_used:{user_id}:{time_step}", 1, nx=True, ex=ttl_seconds)
+
+        return bool(reply)
+
+
+_otp_replay_cache: Optional[OtpReplayCache] = None
+
+
+def get_otp_replay_cache() -> OtpReplayCache:
+    """
+    Get the process-wide OTP replay cache selected by settings.OTP_REPLAY_BACKEND.
+
+    Returns:
+        OtpReplayCache: The shared cache.
+    """
+
+    global _otp_replay_cache
+
+    if _otp_replay_cache is None:
+
+        if settings.OTP_REPLAY_BACKEND == "redis":
+            _otp_replay_cache = RedisOtpReplayCache()
+        else:
+            _otp_replay_cache = MemoryOtpReplayCache(settings.OTP_REPLAY_MAX_KEYS)
+
+    return _otp_replay_cache
+
+
+async def mark_otp_used(user_id: int, time_step: int, ttl_seconds: int) -> bool:
+    """
+    Mark the code of a time step as used by a user.
+
+    If the Redis backend is unreachable the code is accepted, as it was
+    before replay protection existed.
+
+    Args:
+        user_id (int): The ID of the user.
+        time_step (int): The TOTP time step the code belongs to.
+        ttl_seconds (int): How long the code of this time step stays valid.
+
+    Returns:
+        bool: True if the code was not used before, False if it is a replay.
+    """
+
+    try:
+        return await get_otp_replay_cache().mark_used(user_id, time_step, ttl_seconds)
+    except RedisError as e:
+
+        logger.error(f'OTP replay cache unavailable, accepting code: {e}')
+
+        return True
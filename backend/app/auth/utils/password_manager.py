@@ -1,10 +1,53 @@
+import settings
+import asyncio
+import multiprocessing
+import statistics
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional
 from passlib.context import CryptContext
+from passlib.hash import bcrypt
+from loguru import logger
+
+
+from app.utils.metrics import PASSWORD_HASH_OPERATIONS
+from app.utils.server_timing import timed
+
+
+def create_crypt_context() -> CryptContext:
+    """
+    Build the password hashing policy from settings.
+
+    The first scheme of settings.PASSWORD_HASH_SCHEMES hashes new passwords;
+    the others are only accepted for verification. Bcrypt hashes whose cost
+    is outside PASSWORD_BCRYPT_MIN_ROUNDS..PASSWORD_BCRYPT_MAX_ROUNDS are
+    flagged as needing an update.
+
+    Returns:
+        CryptContext: The configured context.
+    """
+
+    options = {}
+
+    if "bcrypt" in settings.PASSWORD_HASH_SCHEMES:
+        options.update(
+            bcrypt__default_rounds=settings.PASSWORD_BCRYPT_ROUNDS,
+            bcrypt__min_rounds=settings.PASSWORD_BCRYPT_MIN_ROUNDS,
+            bcrypt__max_rounds=settings.PASSWORD_BCRYPT_MAX_ROUNDS,
+        )
+
+    return CryptContext(
+        schemes=settings.PASSWORD_HASH_SCHEMES,
+        deprecated="auto",
+        **options,
+    )
 
 
 class PasswordManager:
 
-    pwd_context = CryptContext(schemes=["bcrypt"])
+    pwd_context = create_crypt_context()
 
+    @timed("hash")
     def get_password_hash(self, password):
         """
         Hashes a plain-text password.
@@ -15,8 +58,10 @@ class PasswordManager:
         Returns:
             str: The hashed password.
         """
+        PASSWORD_HASH_OPERATIONS.inc("hash")
         return self.pwd_context.hash(password)
 
+    @timed("hash")
     def verify_password(self, plain_password, hashed_password):
         """
         Verifies a plain-text password against a hashed password.
@@ -28,4 +73,133 @@ class PasswordManager:
         Returns:
             bool: True if the password is valid, False otherwise.
         """
+        PASSWORD_HASH_OPERATIONS.inc("verify")
         return self.pwd_context.verify(plain_password, hashed_password)
+
+    @timed("hash")
+    def verify_and_update_password(self, plain_password, hashed_password) -> tuple[bool, Optional[str]]:
+        """
+        Verifies a plain-text password and rehashes it if the hash is outdated.
+
+        Args:
+            plain_password (str): The plain-text password to verify.
+            hashed_password (str): The hashed password to verify against.
+
+        Returns:
+            tuple[bool, Optional[str]]: Whether the password is valid, and a new
+            hash to store if the current one uses a deprecated scheme or cost.
+        """
+        PASSWORD_HASH_OPERATIONS.inc("verify")
+        valid, new_hash = self.pwd_context.verify_and_update(plain_password, hashed_password)
+        if new_hash:
+            PASSWORD_HASH_OPERATIONS.inc("hash")
+        return valid, new_hash
+
+
+def calibrate_bcrypt_rounds(
+    target_ms: float,
+    min_rounds: int = 10,
+    max_rounds: int = 16,
+    samples: int = 3,
+) -> tuple[int, dict[int, float]]:
+    """
+    Find the highest bcrypt cost whose hash latency fits a time budget on this machine.
+
+    Args:
+        target_ms (float): The latency budget of one hash in milliseconds.
+        min_rounds (int, optional): The lowest cost to consider. Defaults to 10.
+        max_rounds (int, optional): The highest cost to consider. Defaults to 16.
+        samples (int, optional): The number of hashes timed per cost. Defaults to 3.
+
+    Returns:
+        tuple[int, dict[int, float]]: The chosen cost, and the median latency in
+        milliseconds of every cost measured.
+    """
+
+    timings = {}
+    chosen = min_rounds
+
+    for rounds in range(min_rounds, max_rounds + 1):
+
+        durations = []
+        for _ in range(samples):
+            started = time.perf_counter()
+            bcrypt.using(rounds=rounds).hash("calibration-password")
+            durations.append((time.perf_counter() - started) * 1000)
+
+        timings[rounds] = statistics.median(durations)
+
+        if timings[rounds] > target_ms:
+            break
+
+        chosen = rounds
+
+    return chosen, timings
+
+
+_password_hash_executor = None
+
+
+def _hash_password(password: str) -> str:
+    return PasswordManager().get_password_hash(password)
+
+
+def get_password_hash_executor() -> ProcessPoolExecutor:
+    """
+    Get the process pool used to hash passwords in bulk, creating it on first use.
+
+    Returns:
+        ProcessPoolExecutor: The shared process pool.
+    """
+
+    global _password_hash_executor
+
+    if _password_hash_executor is None:
+
+        logger.info(f'Starting password hash pool with {settings.PASSWORD_HASH_WORKERS} workers')
+
+        _password_hash_executor = ProcessPoolExecutor(
+            max_workers=settings.PASSWORD_HASH_WORKERS,
+            mp_context=multiprocessing.get_context("spawn"),
+        )
+
+    return _password_hash_executor
+
+
+@timed("hash")
+async def hash_passwords(passwords: list[str]) -> list[str]:
+    """
+    Hash many passwords in parallel across CPU cores.
+
+    Args:
+        passwords (list[str]): The plain-text passwords to hash.
+
+    Returns:
+        list[str]: The hashed passwords, in the same order.
+    """
+
+    loop = asyncio.get_running_loop()
+    executor = get_password_hash_executor()
+
+    # Hashes run in worker processes, whose own counters are never exported.
+    PASSWORD_HASH_OPERATIONS.inc("hash", amount=len(passwords))
+
+    return await asyncio.gather(*(
+        loop.run_in_executor(executor, _hash_password, password)
+        for password in passwords
+    ))
+
+
+def shutdown_password_hash_executor() -> None:
+    """
+    Shut down the password hash pool if it was started.
+    """
+
+    global _password_hash_executor
+
+    if _password_hash_executor is not None:
+
+        logger.info('Shutting down password hash pool')
+
+        _password_hash_executor.shutdown(wait=True, cancel_futures=True)
+        _password_hash_executor = None
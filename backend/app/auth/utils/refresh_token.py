@@ -0,0 +1,46 @@
+import settings
+import secrets
+
+
+from app.auth.utils.opaque_token import derive_token_key
+from app.auth.utils.opaque_token import generate_opaque_token
+from app.auth.utils.opaque_token import hash_opaque_token
+
+
+def generate_refresh_token() -> str:
+    """
+    Generate a random, URL-safe refresh token.
+
+    Returns:
+        str: The token to send to the client.
+    """
+    return generate_opaque_token()
+
+
+def generate_token_family_id() -> str:
+    """
+    Generate the id shared by every refresh token issued from one login.
+
+    Returns:
+        str: The family id.
+    """
+    return secrets.token_hex(16)
+
+
+def hash_refresh_token(token: str) -> str:
+    """
+    Digest a refresh token for storage and lookup.
+
+    The key is settings.REFRESH_TOKEN_KEY, or one derived from
+    settings.JWT_SECRET for refresh tokens only.
+
+    Args:
+        token (str): The token sent to the client.
+
+    Returns:
+        str: The hex HMAC-SHA256 digest of the token.
+    """
+
+    key = settings.REFRESH_TOKEN_KEY.encode() or derive_token_key("refresh")
+
+    return hash_opaque_token(key, token)
@@ -0,0 +1,35 @@
+import settings
+
+
+from app.auth.utils.opaque_token import derive_token_key
+from app.auth.utils.opaque_token import generate_opaque_token
+from app.auth.utils.opaque_token import hash_opaque_token
+
+
+def generate_reset_token() -> str:
+    """
+    Generate a random, URL-safe reset password token.
+
+    Returns:
+        str: The token to send to the user.
+    """
+    return generate_opaque_token()
+
+
+def hash_reset_token(token: str) -> str:
+    """
+    Digest a reset password token for storage and lookup.
+
+    The key is settings.RESET_PASSWORD_TOKEN_KEY, or one derived from
+    settings.JWT_SECRET for reset tokens only.
+
+    Args:
+        token (str): The token sent to the user.
+
+    Returns:
+        str: The hex HMAC-SHA256 digest of the token.
+    """
+
+    key = settings.RESET_PASSWORD_TOKEN_KEY.encode() or derive_token_key("reset_password")
+
+    return hash_opaque_token(key, token)
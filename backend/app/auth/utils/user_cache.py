@@ -0,0 +1,264 @@
+import settings
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import NamedTuple
+from typing import Optional
+
+
+from app.auth.models.users import User
+from app.utils.cache import estimate_size
+from app.utils.cache import register_cache
+from app.utils.invalidation import get_invalidation_bus
+from app.utils.invalidation import publish_invalidation
+from app.utils.metrics import CACHE_MEMORY_BYTES
+from app.utils.metrics import CACHE_REQUESTS
+
+
+class UserSnapshot(NamedTuple):
+    """
+    An immutable copy of the public columns of a user.
+
+    It leaves out the password hash and the OTP secret and recovery codes:
+    code that needs them loads the full row on purpose.
+    """
+
+    id: int
+    name: str
+    age: int
+    username: str
+    email: str
+    is_admin: bool
+    is_enable_otp: Optional[bool]
+    is_logged_out: Optional[bool]
+    created_at: datetime
+    updated_at: datetime
+
+
+USER_SNAPSHOT_COLUMNS = tuple(getattr(User, field) for field in UserSnapshot._fields)
+
+
+class UserSnapshotCache:
+    """
+    In-process cache of user snapshots, reachable by id and by username.
+
+    Each user has a single entry, indexed under both keys, so the two
+    lookups can never disagree. Entries expire after ttl_seconds and the
+    least recently used are evicted beyond max_entries. Writes on this
+    worker store the new snapshot at once; writes on other workers and
+    replicas arrive through the "users" namespace of the invalidation bus.
+
+    Misses are filled between start_fill and finish_fill. Every write bumps
+    a version, and while fills are running the version of each written key
+    is recorded: a fill that read its row before a write of the same user
+    is dropped instead of overwriting the newer snapshot.
+    """
+
+    def __init__(self, max_entries: int, ttl_seconds: float):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self._entries: OrderedDict = OrderedDict()
+        self._ids_by_username: dict[str, int] = {}
+        self._bytes = 0
+        self._version = 0
+        self._fills = 0
+        self._written: dict[str, int] = {}
+        self._cleared = 0
+
+    def get_by_id(self, user_id: int) -> Optional[UserSnapshot]:
+
+        if not settings.CACHE_ENABLED:
+            return None
+
+        entry = self._entries.get(user_id)
+
+        if entry is not None and entry[0] <= time.monotonic():
+            self._discard(user_id)
+            entry = None
+
+        if entry is None:
+            self.misses += 1
+            CACHE_REQUESTS.inc("users", "miss")
+            return None
+
+        self._entries.move_to_end(user_id)
+        self.hits += 1
+        CACHE_REQUESTS.inc("users", "hit")
+
+        return entry[1]
+
+    def get_by_username(self, username: str) -> Optional[UserSnapshot]:
+
+        user_id = self._ids_by_username.get(username)
+
+        if user_id is None:
+            if settings.CACHE_ENABLED:
+                self.misses += 1
+                CACHE_REQUESTS.inc("users", "miss")
+            return None
+
+        return self.get_by_id(user_id)
+
+    def put(self, user: UserSnapshot) -> None:
+        """
+        Store a user as just written.
+
+        Args:
+            user (UserSnapshot): The user as committed.
+        """
+
+        self._mark_written((f"id:{user.id}", f"username:{user.username}"))
+        self._store(user)
+
+    def start_fill(self) -> int:
+        """
+        Register a load of a missing user, before its query runs.
+
+        Returns:
+            int: The version to hand to finish_fill.
+        """
+
+        self._fills += 1
+
+        return self._version
+
+    def finish_fill(self, version: int, user: Optional[UserSnapshot]) -> None:
+        """
+        Store a loaded user, unless it was written since the load started.
+
+        Call it even when the load failed, with None.
+
+        Args:
+            version (int): The version returned by start_fill.
+            user (Optional[UserSnapshot]): The loaded user, if any.
+        """
+
+        self._fills -= 1
+
+        if user is not None and not self._written_since(version, user):
+            self._store(user)
+
+        if not self._fills:
+            self._written.clear()
+
+    def invalidate(self, keys: Optional[frozenset]) -> None:
+
+        self._mark_written(keys)
+
+        if keys is None:
+            self._entries.clear()
+            self._ids_by_username.clear()
+            self._account(-self._bytes)
+            return
+
+        for key in keys:
+            kind, _, value = key.partition(":")
+            if kind == "id" and value.isdigit():
+                self._discard(int(value))
+            elif kind == "username":
+                user_id = self._ids_by_username.get(value)
+                if user_id is not None:
+                    self._discard(user_id)
+
+    def _store(self, user: UserSnapshot) -> None:
+
+        if not settings.CACHE_ENABLED:
+            return
+
+        self._discard(user.id)
+
+        size = estimate_size(user)
+        self._entries[user.id] = (time.monotonic() + self.ttl_seconds, user, size)
+        self._ids_by_username[user.username] = user.id
+        self._account(size)
+
+        while len(self._entries) > self.max_entries:
+            self._discard(next(iter(self._entries)))
+
+    def stats(self) -> dict:
+
+        requests = self.hits + self.misses
+
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "errors": 0,
+            "hit_ratio": round(self.hits / requests, 4) if requests else None,
+            "memory_bytes": self._bytes,
+            "entries": len(self._entries),
+        }
+
+    def _mark_written(self, keys) -> None:
+
+        self._version += 1
+
+        if keys is None:
+            self._cleared = self._version
+        elif self._fills:
+            for key in keys:
+                self._written[key] = self._version
+
+    def _written_since(self, version: int, user: UserSnapshot) -> bool:
+        return (
+            self._cleared > version
+            or self._written.get(f"id:{user.id}", 0) > version
+            or self._written.get(f"username:{user.username}", 0) > version
+        )
+
+    def _discard(self, user_id: int) -> None:
+
+        entry = self._entries.pop(user_id, None)
+
+        if entry is not None:
+            username = entry[1].username
+            if self._ids_by_username.get(username) == user_id:
+                del self._ids_by_username[username]
+            self._account(-entry[2])
+
+    def _account(self, size: int) -> None:
+        self._bytes += size
+        CACHE_MEMORY_BYTES.set(self._bytes, "users")
+
+
+_user_cache: Optional[UserSnapshotCache] = None
+
+
+def get_user_cache() -> UserSnapshotCache:
+    """
+    Get the process-wide user snapshot cache.
+
+    Returns:
+        UserSnapshotCache: The shared cache.
+    """
+
+    global _user_cache
+
+    if _user_cache is None:
+        _user_cache = UserSnapshotCache(settings.CACHE_USER_MAX_ENTRIES, settings.CACHE_USER_TTL_SECONDS)
+        get_invalidation_bus().subscribe("users", _user_cache.invalidate)
+        register_cache("users", _user_cache)
+
+    return _user_cache
+
+
+def store_user_snapshot(user: Optional[UserSnapshot], *previous_usernames: str) -> None:
+    """
+    Write a user through to the cache after a committed change.
+
+    Other workers are told to drop their copy, this one keeps the new one.
+
+    Args:
+        user (Optional[UserSnapshot]): The user as committed, or None if it was deleted.
+        *previous_usernames (str): Usernames the user had before the change.
+    """
+
+    if user is None:
+        return
+
+    keys = {f"id:{user.id}", f"username:{user.username}"}
+    keys.update(f"username:{username}" for username in previous_usernames)
+
+    publish_invalidation("users", *keys)
+    get_user_cache().put(user)
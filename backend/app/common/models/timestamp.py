@@ -1,12 +1,22 @@
 from database import Base
 from sqlalchemy import Column
 from sqlalchemy import DateTime
-from datetime import datetime
+from sqlalchemy import FetchedValue
+from sqlalchemy import text
 
 
 class TimestampMixin(Base):
+    """
+    created_at and updated_at, filled by the database.
+
+    Both default to LOCALTIMESTAMP and a trigger sets updated_at on every
+    UPDATE that does not set it itself (see migration 5c8e2f4a7b13). With
+    eager_defaults, the ORM fetches them with RETURNING in the INSERT or
+    UPDATE statement, so written objects need no refresh.
+    """
 
     __abstract__ = True
+    __mapper_args__ = {"eager_defaults": True}
 
-    created_at = Column(DateTime, default=datetime.now, nullable=False)
-    updated_at = Column(DateTime, default=datetime.now, onupdate=datetime.now, nullable=False)
+    created_at = Column(DateTime, server_default=text("LOCALTIMESTAMP"), nullable=False)
+    updated_at = Column(DateTime, server_default=text("LOCALTIMESTAMP"), server_onupdate=FetchedValue(), nullable=False)
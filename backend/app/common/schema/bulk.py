@@ -0,0 +1,47 @@
+from app.common.schema.response_template import ResponseTemplate
+
+
+from pydantic import BaseModel
+from pydantic import Field
+from typing import List
+from typing import Optional
+
+
+class BulkItemResult(BaseModel):
+
+    index: int = Field(
+        ...,
+        description="Position of the item in the uploaded batch",
+    )
+    success: bool = Field(
+        ...,
+        description="Item was created",
+    )
+    id: Optional[int] = Field(
+        None,
+        description="Id of the created item",
+    )
+    error: Optional[str] = Field(
+        None,
+        description="Reason the item was rejected",
+    )
+
+
+class BulkResponseTemplate(ResponseTemplate):
+
+    total: int = Field(
+        ...,
+        description="Number of items received",
+    )
+    created: int = Field(
+        ...,
+        description="Number of items created",
+    )
+    failed: int = Field(
+        ...,
+        description="Number of items rejected",
+    )
+    results: List[BulkItemResult] = Field(
+        ...,
+        description="Per-item results, in upload order",
+    )
@@ -1,22 +1,30 @@
+import settings
 from fastapi import APIRouter
 from fastapi import Query
 from fastapi import Depends
+from fastapi import Security
 from fastapi import HTTPException
+from fastapi import Request
 from loguru import logger
 
 
 from app.auth.utils.auth_handler import AuthHandler
+from app.utils.typed_response import typed_response
+from app.utils.stream_records import iter_request_records
 from app.post.schema.comments import CommentResponse
 from app.post.schema.comments import GetAllCommentsResponse
 from app.post.schema.comments import GetCommentByIdResponse
 from app.post.schema.comments import CreateCommentRequest
 from app.post.schema.comments import CreateCommentResponse
+from app.post.schema.comments import BulkCreateCommentRequest
+from app.post.schema.comments import BulkCreateCommentsResponse
 from app.post.schema.comments import UpdateCommentRequest
 from app.post.schema.comments import UpdateCommentResponse
 from app.post.schema.comments import DeleteCommentResponse
 from app.post.services.comments import select_all_comments
 from app.post.services.comments import select_comment_by_id
 from app.post.services.comments import create_new_comment
+from app.post.services.comments import bulk_create_comments
 from app.post.services.comments import update_comment_by_id
 from app.post.services.comments import delete_comment_by_id
 
@@ -54,12 +62,74 @@ async def create_comment(
 
     comment = await create_new_comment(current_user_id, post_id, request)
 
-    return CreateCommentResponse(
-        success=True,
-        message='Create comment successfully',
-        comment=CommentResponse(
-            id=comment.id,
-            text=comment.text,
+    return typed_response(
+        CreateCommentResponse.construct(
+            success=True,
+            message='Create comment successfully',
+            comment=CommentResponse.from_orm(comment)
+        )
+    )
+
+
+@comments_router.post(
+    '/bulk',
+    response_model=BulkCreateCommentsResponse,
+    dependencies=[Security(AuthHandler().is_role_admin)],
+    openapi_extra={
+        "requestBody": {
+            "required": True,
+            "content": {
+                "application/json": {
+                    "schema": {"type": "array", "items": BulkCreateCommentRequest.schema()},
+                },
+                "application/x-ndjson": {
+                    "schema": {"type": "string", "description": "One BulkCreateCommentRequest JSON object per line"},
+                },
+            },
+        },
+    },
+)
+async def create_comments_bulk(
+    post_id: int,
+    request: Request,
+    current_user_id: int = Depends(AuthHandler().get_current_user_id_with_check_otp),
+) -> BulkCreateCommentsResponse:
+    """
+    Import many comments on a post in one request.
+
+    The body is either a JSON array of comments or an NDJSON stream with one
+    comment per line. Each comment may name its author with user_id; it
+    defaults to the current user. Only admins may import comments.
+
+    Args:
+        post_id (int): The id of the post to comment on.
+        request (Request): The request whose body contains the comments to create.
+        current_user_id (int): The id of the current user.
+
+    Returns:
+        BulkCreateCommentsResponse: The per-item results of the import.
+
+    Raises:
+        HTTPException: If the post is not found, or the body is malformed or has too many items.
+
+    Logs:
+        Logs the bulk creation attempt of comments.
+    """
+
+    logger.info(f'Bulk create comments with current_user_id={current_user_id}, post_id={post_id}')
+
+    records = iter_request_records(request, settings.BULK_MAX_ITEMS)
+    results = await bulk_create_comments(current_user_id, post_id, records)
+    created = sum(1 for result in results if result.success)
+
+    return typed_response(
+        BulkCreateCommentsResponse.construct(
+            success=True,
+            message=f'Bulk create comments of post_id={post_id} successfully',
+            total=len(results),
+            created=created,
+            failed=len(results) - created,
+            results=results,
         )
     )
 
@@ -91,16 +161,15 @@ async def get_all_comments(
 
     comments = await select_all_comments(post_id, limit, offset)
 
-    return GetAllCommentsResponse(
-        success=True,
-        message=f'Get all comments of post_id={post_id} successfully',
-        comments=[
-            CommentResponse(
-                id=comment.id,
-                text=comment.text,
-            )
-            for comment in comments
-        ]
+    return typed_response(
+        GetAllCommentsResponse.construct(
+            success=True,
+            message=f'Get all comments of post_id={post_id} successfully',
+            comments=[
+                CommentResponse.from_orm(comment)
+                for comment in comments
+            ]
+        )
     )
 
 
@@ -135,12 +204,11 @@ async def get_comment_by_id(
             detail=f'Comment with comment_id={comment_id} not found'
         )
 
-    return GetCommentByIdResponse(
-        success=True,
-        message='Get comment by id successfully',
-        comment=CommentResponse(
-            id=comment.id,
-            text=comment.text,
+    return typed_response(
+        GetCommentByIdResponse.construct(
+            success=True,
+            message='Get comment by id successfully',
+            comment=CommentResponse.from_orm(comment)
         )
     )
 
@@ -177,12 +245,11 @@ async def update_comment(
 
     comment = await update_comment_by_id(current_user_id, post_id, comment_id, request)
 
-    return UpdateCommentResponse(
-        success=True,
-        message='Update comment successfully',
-        comment=CommentResponse(
-            id=comment.id,
-            text=comment.text,
+    return typed_response(
+        UpdateCommentResponse.construct(
+            success=True,
+            message='Update comment successfully',
+            comment=CommentResponse.from_orm(comment)
         )
     )
 
@@ -216,7 +283,9 @@ async def delete_comment(
 
     await delete_comment_by_id(current_user_id, post_id, comment_id)
 
-    return DeleteCommentResponse(
-        success=True,
-        message='Delete comment successfully',
+    return typed_response(
+        DeleteCommentResponse.construct(
+            success=True,
+            message='Delete comment successfully',
+        )
     )
@@ -1,22 +1,30 @@
+import settings
 from fastapi import APIRouter
 from fastapi import Query
 from fastapi import Depends
 from fastapi import HTTPException
+from fastapi import Request
 from loguru import logger
 
 
 from app.auth.utils.auth_handler import AuthHandler
+from app.utils.typed_response import typed_response
+from app.utils.typed_response import cached_response
+from app.utils.cache import get_cache
+from app.utils.stream_records import iter_request_records
 from app.post.schema.posts import PostResponse
 from app.post.schema.posts import GetAllPostsResponse
 from app.post.schema.posts import GetPostByIdResponse
 from app.post.schema.posts import CreatePostRequest
 from app.post.schema.posts import CreatePostResponse
+from app.post.schema.posts import BulkCreatePostsResponse
 from app.post.schema.posts import UpdatePostRequest
 from app.post.schema.posts import UpdatePostResponse
 from app.post.schema.posts import DeletePostResponse
 from app.post.services.posts import select_all_posts
 from app.post.services.posts import select_post_by_id
 from app.post.services.posts import create_new_post
+from app.post.services.posts import bulk_create_posts
 from app.post.services.posts import update_post_by_id
 from app.post.services.posts import delete_post_by_id
 
@@ -52,15 +60,71 @@ async def create_post(
 
     post = await create_new_post(current_user_id, request)
 
-    return CreatePostResponse(
-        success=True,
-        message='Create post successfully',
-        post=PostResponse(
-            id=post.id,
-            title=post.title,
-            content=post.content,
-            updated_at=post.updated_at,
-            created_at=post.created_at,
+    return typed_response(
+        CreatePostResponse.construct(
+            success=True,
+            message='Create post successfully',
+            post=PostResponse.from_orm(post)
+        )
+    )
+
+
+@posts_router.post(
+    '/bulk',
+    response_model=BulkCreatePostsResponse,
+    openapi_extra={
+        "requestBody": {
+            "required": True,
+            "content": {
+                "application/json": {
+                    "schema": {"type": "array", "items": CreatePostRequest.schema()},
+                },
+                "application/x-ndjson": {
+                    "schema": {"type": "string", "description": "One CreatePostRequest JSON object per line"},
+                },
+            },
+        },
+    },
+)
+async def create_posts_bulk(
+    request: Request,
+    current_user_id: int = Depends(AuthHandler().get_current_user_id_with_check_otp),
+) -> BulkCreatePostsResponse:
+    """
+    Create many posts in one request.
+
+    The body is either a JSON array of posts or an NDJSON stream with one
+    post per line. Invalid items are reported and skipped; valid items are
+    created.
+
+    Args:
+        request (Request): The request whose body contains the posts to create.
+        current_user_id (int): The id of the current user.
+
+    Returns:
+        BulkCreatePostsResponse: The per-item results of the upload.
+
+    Raises:
+        HTTPException: If the body is malformed or has too many items.
+
+    Logs:
+        Logs the bulk creation attempt of posts.
+    """
+
+    logger.info(f'Bulk create posts with current_user_id={current_user_id}')
+
+    records = iter_request_records(request, settings.BULK_MAX_ITEMS)
+    results = await bulk_create_posts(current_user_id, records)
+    created = sum(1 for result in results if result.success)
+
+    return typed_response(
+        BulkCreatePostsResponse.construct(
+            success=True,
+            message='Bulk create posts successfully',
+            total=len(results),
+            created=created,
+            failed=len(results) - created,
+            results=results,
         )
     )
 
@@ -89,22 +153,24 @@ async def get_all_posts(
 
     logger.info(f'Get all posts with limit={limit}, offset={offset}')
 
-    posts = await select_all_posts(limit, offset)
-
-    return GetAllPostsResponse(
-        success=True,
-        message='Get all posts successfully',
-        posts=[
-            PostResponse(
-                id=post.id,
-                title=post.title,
-                content=post.content,
-                updated_at=post.updated_at,
-                created_at=post.created_at,
+    async def render():
+
+        posts = await select_all_posts(limit, offset)
+
+        return typed_response(
+            GetAllPostsResponse.construct(
+                success=True,
+                message='Get all posts successfully',
+                posts=[
+                    PostResponse.from_orm(post)
+                    for post in posts
+                ]
             )
-            for post in posts
-        ]
-    )
+        )
+
+    cache = get_cache("post_page_responses", settings.CACHE_RESPONSE_TTL_SECONDS, "posts", clear_on_invalidation=True)
+
+    return await cached_response(cache, f"{limit}:{offset}", render)
 
 
 @posts_router.get(
@@ -129,25 +195,27 @@ async def get_post_by_id(
 
     logger.info(f'Get post by post_id={post_id}')
 
-    post = await select_post_by_id(post_id)
+    async def render():
 
-    if not post:
-        raise HTTPException(
-            status_code=404,
-            detail=f'Post with post_id={post_id} not found'
-        )
+        post = await select_post_by_id(post_id)
+
+        if not post:
+            raise HTTPException(
+                status_code=404,
+                detail=f'Post with post_id={post_id} not found'
+            )
 
-    return GetPostByIdResponse(
-        success=True,
-        message='Get post by id successfully',
-        post=PostResponse(
-            id=post.id,
-            title=post.title,
-            content=post.content,
-            updated_at=post.updated_at,
-            created_at=post.created_at,
+        return typed_response(
+            GetPostByIdResponse.construct(
+                success=True,
+                message='Get post by id successfully',
+                post=PostResponse.from_orm(post)
+            )
         )
-    )
+
+    cache = get_cache("post_responses", settings.CACHE_RESPONSE_TTL_SECONDS, "posts")
+
+    return await cached_response(cache, f"id:{post_id}", render)
 
 
 @posts_router.put(
@@ -180,15 +248,11 @@ async def update_post(
 
     post = await update_post_by_id(current_user_id, post_id, request)
 
-    return UpdatePostResponse(
-        success=True,
-        message='Update post successfully',
-        post=PostResponse(
-            id=post.id,
-            title=post.title,
-            content=post.content,
-            updated_at=post.updated_at,
-            created_at=post.created_at,
+    return typed_response(
+        UpdatePostResponse.construct(
+            success=True,
+            message='Update post successfully',
+            post=PostResponse.from_orm(post)
         )
     )
 
@@ -221,7 +285,9 @@ async def delete_post(
 
     await delete_post_by_id(current_user_id, post_id)
 
-    return DeletePostResponse(
-        success=True,
-        message='Delete post successfully',
+    return typed_response(
+        DeletePostResponse.construct(
+            success=True,
+            message='Delete post successfully',
+        )
     )
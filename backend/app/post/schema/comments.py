@@ -1,9 +1,11 @@
 from app.common.schema.response_template import ResponseTemplate
+from app.common.schema.bulk import BulkResponseTemplate
 
 
 from pydantic import BaseModel
 from pydantic import Field
 from typing import List
+from typing import Optional
 
 
 class CommentResponse(BaseModel):
@@ -17,6 +19,9 @@ class CommentResponse(BaseModel):
         description="Comment text",
     )
 
+    class Config:
+        orm_mode = True
+
 
 class GetAllCommentsResponse(ResponseTemplate):
 
@@ -50,6 +55,19 @@ class CreateCommentResponse(ResponseTemplate):
     )
 
 
+class BulkCreateCommentRequest(CreateCommentRequest):
+
+    user_id: Optional[int] = Field(
+        None,
+        description="Author of the comment, defaults to the current user",
+    )
+
+
+class BulkCreateCommentsResponse(BulkResponseTemplate):
+
+    pass
+
+
 class UpdateCommentRequest(BaseModel):
 
     text: str = Field(
@@ -1,4 +1,5 @@
 from app.common.schema.response_template import ResponseTemplate
+from app.common.schema.bulk import BulkResponseTemplate
 
 
 from datetime import datetime
@@ -31,6 +32,9 @@ class PostResponse(BaseModel):
         description="Post created at",
     )
 
+    class Config:
+        orm_mode = True
+
 
 class GetAllPostsResponse(ResponseTemplate):
 
@@ -68,6 +72,11 @@ class CreatePostResponse(ResponseTemplate):
     )
 
 
+class BulkCreatePostsResponse(BulkResponseTemplate):
+
+    pass
+
+
 class UpdatePostRequest(BaseModel):
 
     title: Optional[str] = Field(
@@ -1,21 +1,56 @@
+import settings
+from datetime import datetime
+from typing import Any
+from typing import AsyncIterator
+from typing import NamedTuple
+from typing import Optional
 from database import get_db_session
+from database import reserve_ids
 from sqlalchemy import select
+from sqlalchemy import insert
+from sqlalchemy.exc import SQLAlchemyError
+from pydantic import ValidationError
 from loguru import logger
 from fastapi import HTTPException
 
 
+from app.auth.models.users import User
 from app.auth.services.universal import get_user_by_id
-from app.post.services.posts import select_post_by_id
+from app.common.schema.bulk import BulkItemResult
+from app.post.services.posts import select_post_meta_by_id
 from app.post.models.comments import Comment
 from app.post.schema.comments import CreateCommentRequest
+from app.post.schema.comments import BulkCreateCommentRequest
 from app.post.schema.comments import UpdateCommentRequest
+from app.utils.stream_records import RecordError
+from app.utils.stream_records import format_validation_error
+from app.utils.invalidation import publish_invalidation
+from app.utils.cache import get_cache
+from app.utils.tracing import traced
 
 
+class CommentRow(NamedTuple):
+    """
+    A comment as the listing returns it: a plain tuple of the columns the
+    responses need, instead of an instrumented ORM instance.
+    """
+
+    id: int
+    text: str
+    user_id: Optional[int]
+    created_at: datetime
+    updated_at: datetime
+
+
+COMMENT_ROW_COLUMNS = tuple(getattr(Comment, field) for field in CommentRow._fields)
+
+
+@traced()
 async def select_all_comments(
     post_id: int,
     limit: int = 50,
     offset: int = 0,
-) -> list[Comment]:
+) -> list[CommentRow]:
     """
     Retrieve a list of all comments with pagination.
 
@@ -24,7 +59,7 @@ async def select_all_comments(
         offset (int): The number of comments to skip before starting to collect the result set. Defaults to 0.
 
     Returns:
-        list[Comment]: A list of all comment objects.
+        list[CommentRow]: A list of all comments.
 
     Logs:
         Logs the retrieval of all comments with the specified limit and offset.
@@ -32,21 +67,26 @@ async def select_all_comments(
 
     logger.info(f'Select all comments with post_id={post_id}, limit={limit}, offset={offset}')
 
-    post = await select_post_by_id(post_id)
+    post_meta = await select_post_meta_by_id(post_id)
 
-    if not post:
+    if not post_meta:
         raise HTTPException(
             status_code=404,
             detail=f'Post with post_id={post_id} not found'
         )
 
-    async with get_db_session() as session:
-        statement = select(Comment).where(Comment.post_id == post_id).offset(offset).limit(limit)
-        result = await session.execute(statement)
-        comments = result.scalars().all()
-        return comments
+    async def load():
+        async with get_db_session() as session:
+            statement = select(*COMMENT_ROW_COLUMNS).where(Comment.post_id == post_id).offset(offset).limit(limit)
+            result = await session.execute(statement)
+            return [CommentRow(*row) for row in result]
+
+    cache = get_cache("comment_lists", settings.CACHE_LIST_TTL_SECONDS, "comments", clear_on_invalidation=True)
 
+    return await cache.get_or_load(f"{post_id}:{limit}:{offset}", load)
 
+
+@traced()
 async def select_comment_by_id(
     post_id: int,
     comment_id: int,
@@ -66,9 +106,9 @@ async def select_comment_by_id(
 
     logger.info(f'Select comment by post_id={post_id}, comment_id={comment_id}')
 
-    post = await select_post_by_id(post_id)
+    post_meta = await select_post_meta_by_id(post_id)
 
-    if not post:
+    if not post_meta:
         raise HTTPException(
             status_code=404,
             detail=f'Post with post_id={post_id} not found'
@@ -81,6 +121,7 @@ async def select_comment_by_id(
         return comment
 
 
+@traced()
 async def create_new_comment(
     user_id: int,
     post_id: int,
@@ -113,9 +154,9 @@ async def create_new_comment(
             detail=f'User with user_id={user_id} not found'
         )
 
-    post = await select_post_by_id(post_id)
+    post_meta = await select_post_meta_by_id(post_id)
 
-    if not post:
+    if not post_meta:
         raise HTTPException(
             status_code=404,
             detail=f'Post with post_id={post_id} not found'
@@ -125,10 +166,128 @@ async def create_new_comment(
         comment = Comment(text=request.text, user_id=user_id, post_id=post_id)
         session.add(comment)
         await session.commit()
-        await session.refresh(comment)
-        return comment
 
+    publish_invalidation("comments", f"id:{comment.id}", f"post:{post_id}")
+
+    return comment
+
+
+@traced()
+async def bulk_create_comments(
+    user_id: int,
+    post_id: int,
+    records: AsyncIterator[tuple[int, Any]],
+) -> list[BulkItemResult]:
+    """
+    Create many comments on one post.
+
+    The post and the distinct authors are each checked with a single query,
+    then all valid comments are inserted in one transaction using multi-row
+    INSERT statements of settings.BULK_CHUNK_SIZE rows (to stay under the
+    driver's bind parameter limit). Their ids are reserved from the sequence
+    first and inserted with the rows, so each record is matched to its own id.
+
+    Args:
+        user_id (int): The ID of the current user, the default author.
+        post_id (int): The ID of the post to comment on.
+        records (AsyncIterator[tuple[int, Any]]): The indexed records to create.
+
+    Returns:
+        list[BulkItemResult]: One result per record, in upload order.
+
+    Raises:
+        HTTPException: If the post with the given ID is not found.
+        HTTPException: If the comments could not be inserted.
+    """
+
+    logger.info(f'Bulk create comments with user_id={user_id}, post_id={post_id}')
+
+    post_meta = await select_post_meta_by_id(post_id)
+
+    if not post_meta:
+        raise HTTPException(
+            status_code=404,
+            detail=f'Post with post_id={post_id} not found'
+        )
+
+    results = []
+    comments = []
+
+    async for index, record in records:
+
+        if isinstance(record, RecordError):
+            results.append(BulkItemResult.construct(index=index, success=False, id=None, error=str(record)))
+            continue
+
+        try:
+            request = BulkCreateCommentRequest.parse_obj(record)
+        except ValidationError as e:
+            results.append(BulkItemResult.construct(index=index, success=False, id=None, error=format_validation_error(e)))
+            continue
+
+        comments.append((index, request.user_id or user_id, request.text))
+
+    author_ids = {author_id for _, author_id, _ in comments}
+
+    if author_ids:
+        async with get_db_session() as session:
+            statement = select(User.id).where(User.id.in_(author_ids))
+            result = await session.execute(statement)
+            existing_author_ids = set(result.scalars().all())
+    else:
+        existing_author_ids = set()
+
+    rows = []
+    row_indexes = []
+
+    for index, author_id, text in comments:
+
+        if author_id not in existing_author_ids:
+            results.append(BulkItemResult.construct(index=index, success=False, id=None, error=f'User with user_id={author_id} not found'))
+            continue
+
+        rows.append({
+            "text": text,
+            "user_id": author_id,
+            "post_id": post_id,
+        })
+        row_indexes.append(index)
 
+    if rows:
+        try:
+            async with get_db_session() as session:
+                comment_ids = await reserve_ids(session, Comment.id, len(rows))
+                for row, comment_id in zip(rows, comment_ids):
+                    row["id"] = comment_id
+                chunk_size = settings.BULK_CHUNK_SIZE
+                for start in range(0, len(rows), chunk_size):
+                    statement = insert(Comment).values(rows[start:start + chunk_size])
+                    await session.execute(statement)
+                await session.commit()
+        except SQLAlchemyError as e:
+
+            logger.error(f'Bulk create comments failed: {e}')
+
+            raise HTTPException(
+                status_code=500,
+                detail=f'Bulk create comments with post_id={post_id} failed'
+            )
+
+        logger.info(f'Bulk created {len(comment_ids)} comments with post_id={post_id}')
+
+        publish_invalidation("comments", f"post:{post_id}", *(f"id:{comment_id}" for comment_id in comment_ids))
+
+        results.extend(
+            BulkItemResult.construct(index=index, success=True, id=comment_id, error=None)
+            for index, comment_id in zip(row_indexes, comment_ids)
+        )
+
+    results.sort(key=lambda item: item.index)
+
+    return results
+
+
+@traced()
 async def update_comment_by_id(
     user_id: int,
     post_id: int,
@@ -182,10 +341,13 @@ async def update_comment_by_id(
     async with get_db_session() as session:
         session.add(comment)
         await session.commit()
-        await session.refresh(comment)
-        return comment
 
+    publish_invalidation("comments", f"id:{comment_id}", f"post:{post_id}")
 
+    return comment
+
+
+@traced()
 async def delete_comment_by_id(
     user_id: int,
     post_id: int,
@@ -232,4 +394,5 @@ async def delete_comment_by_id(
     async with get_db_session() as session:
         await session.delete(comment)
         await session.commit()
-        return
+
+    publish_invalidation("comments", f"id:{comment_id}", f"post:{post_id}")
@@ -1,19 +1,65 @@
+import settings
+from datetime import datetime
+from typing import Any
+from typing import AsyncIterator
+from typing import NamedTuple
+from typing import Optional
 from database import get_db_session
+from database import reserve_ids
 from sqlalchemy import select
+from sqlalchemy import insert
+from sqlalchemy import update
+from sqlalchemy import delete
+from sqlalchemy.exc import SQLAlchemyError
+from pydantic import ValidationError
 from loguru import logger
 from fastapi import HTTPException
 
 
 from app.auth.services.universal import get_user_by_id
+from app.common.schema.bulk import BulkItemResult
 from app.post.models.posts import Post
 from app.post.schema.posts import CreatePostRequest
 from app.post.schema.posts import UpdatePostRequest
+from app.utils.stream_records import RecordError
+from app.utils.stream_records import chunked
+from app.utils.stream_records import format_validation_error
+from app.utils.invalidation import publish_invalidation
+from app.utils.cache import get_cache
+from app.utils.tracing import traced
 
 
+class PostMeta(NamedTuple):
+    """
+    The columns of a post that existence and ownership checks need.
+    """
+
+    user_id: Optional[int]
+    updated_at: datetime
+
+
+class PostRow(NamedTuple):
+    """
+    A post as the read paths return it: a plain tuple of the columns the
+    responses need, instead of an instrumented ORM instance.
+    """
+
+    id: int
+    title: str
+    content: str
+    user_id: Optional[int]
+    created_at: datetime
+    updated_at: datetime
+
+
+POST_ROW_COLUMNS = tuple(getattr(Post, field) for field in PostRow._fields)
+
+
+@traced()
 async def select_all_posts(
     limit: int = 50,
     offset: int = 0,
-) -> list[Post]:
+) -> list[PostRow]:
     """
     Retrieve a list of all posts with pagination.
 
@@ -22,7 +68,7 @@ async def select_all_posts(
         offset (int): The number of posts to skip before starting to collect the result set. Defaults to 0.
 
     Returns:
-        list[Post]: A list of all post objects.
+        list[PostRow]: A list of all posts.
 
     Logs:
         Logs the retrieval of all posts with the specified limit and offset.
@@ -30,16 +76,21 @@ async def select_all_posts(
 
     logger.info(f'Select all posts with limit={limit}, offset={offset}')
 
-    async with get_db_session() as session:
-        statement = select(Post).offset(offset).limit(limit)
-        result = await session.execute(statement)
-        posts = result.scalars().all()
-        return posts
+    async def load():
+        async with get_db_session() as session:
+            statement = select(*POST_ROW_COLUMNS).offset(offset).limit(limit)
+            result = await session.execute(statement)
+            return [PostRow(*row) for row in result]
 
+    cache = get_cache("post_lists", settings.CACHE_LIST_TTL_SECONDS, "posts", clear_on_invalidation=True)
 
+    return await cache.get_or_load(f"{limit}:{offset}", load)
+
+
+@traced()
 async def select_post_by_id(
     post_id: int,
-) -> Post:
+) -> Optional[PostRow]:
     """
     Retrieve a post by its ID.
 
@@ -47,7 +98,7 @@ async def select_post_by_id(
         post_id (int): The ID of the post to retrieve.
 
     Returns:
-        Post: The post object if the post exists, None otherwise.
+        Optional[PostRow]: The post if the post exists, None otherwise.
 
     Logs:
         Logs the retrieval attempt of a post by its ID.
@@ -55,13 +106,71 @@ async def select_post_by_id(
 
     logger.info(f'Select post by post_id={post_id}')
 
-    async with get_db_session() as session:
-        statement = select(Post).where(Post.id == post_id)
-        result = await session.execute(statement)
-        post = result.scalars().first()
-        return post
+    async def load():
+        async with get_db_session() as session:
+            statement = select(*POST_ROW_COLUMNS).where(Post.id == post_id)
+            row = (await session.execute(statement)).first()
+            return PostRow(*row) if row else None
+
+    return await get_cache("posts", settings.CACHE_POST_TTL_SECONDS, "posts").get_or_load(f"id:{post_id}", load)
+
+
+@traced()
+async def select_post_meta_by_id(
+    post_id: int,
+) -> Optional[PostMeta]:
+    """
+    Retrieve the owner and last update time of a post by its ID.
+
+    Use it instead of select_post_by_id when only the existence or the owner
+    of the post matters: it is cached apart from the posts, and filled by a
+    query that leaves out the title and content.
+
+    Args:
+        post_id (int): The ID of the post.
+
+    Returns:
+        Optional[PostMeta]: The metadata if the post exists, None otherwise.
+    """
+
+    async def load():
+        async with get_db_session() as session:
+            statement = select(Post.user_id, Post.updated_at).where(Post.id == post_id)
+            row = (await session.execute(statement)).first()
+            return PostMeta(*row) if row else None
+
+    return await get_cache("post_meta", settings.CACHE_POST_TTL_SECONDS, "posts").get_or_load(f"id:{post_id}", load)
+
+
+async def _check_post_owner(
+    user_id: int,
+    post_id: int,
+) -> None:
 
+    user = await get_user_by_id(user_id)
+
+    if not user:
+        raise HTTPException(
+            status_code=404,
+            detail=f'User with user_id={user_id} not found'
+        )
 
+    post_meta = await select_post_meta_by_id(post_id)
+
+    if not post_meta:
+        raise HTTPException(
+            status_code=404,
+            detail=f'Post with post_id={post_id} not found'
+        )
+
+    if post_meta.user_id != user_id:
+        raise HTTPException(
+            status_code=403,
+            detail=f'Current user with user_id={user_id} is not the owner of the post with post_id={post_id}'
+        )
+
+
+@traced()
 async def create_new_post(
     user_id: int,
     request: CreatePostRequest,
@@ -93,15 +202,115 @@ async def create_new_post(
         post = Post(title=request.title, content=request.content, user_id=user_id)
         session.add(post)
         await session.commit()
-        await session.refresh(post)
-        return post
 
+    publish_invalidation("posts", f"id:{post.id}")
+
+    return post
+
+
+@traced()
+async def bulk_create_posts(
+    user_id: int,
+    records: AsyncIterator[tuple[int, Any]],
+) -> list[BulkItemResult]:
+    """
+    Create many posts for one author.
+
+    The author is checked once, then records are validated and inserted in
+    chunks of settings.BULK_CHUNK_SIZE with one multi-row INSERT per chunk, so
+    only one chunk of post content is held in memory at a time. The ids of a
+    chunk are reserved from the sequence first and inserted with its rows, so
+    each record is matched to its own id. A failing chunk is rolled back on
+    its own and does not affect the others.
+
+    Args:
+        user_id (int): The ID of the author of the posts.
+        records (AsyncIterator[tuple[int, Any]]): The indexed records to create.
+
+    Returns:
+        list[BulkItemResult]: One result per record, in upload order.
 
+    Raises:
+        HTTPException: If the user with the given ID is not found.
+    """
+
+    logger.info(f'Bulk create posts with user_id={user_id}')
+
+    user = await get_user_by_id(user_id)
+
+    if not user:
+        raise HTTPException(
+            status_code=404,
+            detail=f'User with user_id={user_id} not found'
+        )
+
+    results = []
+
+    async for chunk in chunked(records, settings.BULK_CHUNK_SIZE):
+
+        rows = []
+        row_indexes = []
+
+        for index, record in chunk:
+
+            if isinstance(record, RecordError):
+                results.append(BulkItemResult.construct(index=index, success=False, id=None, error=str(record)))
+                continue
+
+            try:
+                request = CreatePostRequest.parse_obj(record)
+            except ValidationError as e:
+                results.append(BulkItemResult.construct(index=index, success=False, id=None, error=format_validation_error(e)))
+                continue
+
+            rows.append({
+                "title": request.title,
+                "content": request.content,
+                "user_id": user_id,
+            })
+            row_indexes.append(index)
+
+        if not rows:
+            continue
+
+        try:
+            async with get_db_session() as session:
+                post_ids = await reserve_ids(session, Post.id, len(rows))
+                for row, post_id in zip(rows, post_ids):
+                    row["id"] = post_id
+                statement = insert(Post).values(rows)
+                await session.execute(statement)
+                await session.commit()
+        except SQLAlchemyError as e:
+
+            logger.error(f'Bulk create posts chunk failed: {e}')
+
+            results.extend(
+                BulkItemResult.construct(index=index, success=False, id=None, error='Database error')
+                for index in row_indexes
+            )
+            continue
+
+        logger.info(f'Bulk created {len(post_ids)} posts with user_id={user_id}')
+
+        publish_invalidation("posts", *(f"id:{post_id}" for post_id in post_ids))
+
+        results.extend(
+            BulkItemResult.construct(index=index, success=True, id=post_id, error=None)
+            for index, post_id in zip(row_indexes, post_ids)
+        )
+
+    results.sort(key=lambda item: item.index)
+
+    return results
+
+
+@traced()
 async def update_post_by_id(
     user_id: int,
     post_id: int,
     request: UpdatePostRequest,
-) -> Post:
+) -> PostRow:
     """
     Update a post with the given post id.
 
@@ -110,7 +319,7 @@ async def update_post_by_id(
         request (UpdatePostRequest): The request containing the title and content to update.
 
     Returns:
-        Post: The updated post object after being saved to the database.
+        PostRow: The updated post.
 
     Raises:
         HTTPException: If the post with the given id is not found.
@@ -121,38 +330,45 @@ async def update_post_by_id(
 
     logger.info(f'Update post by post_id={post_id}, user_id={user_id}, title={request.title}, content={request.content}')
 
-    user = await get_user_by_id(user_id)
+    await _check_post_owner(user_id, post_id)
 
-    if not user:
-        raise HTTPException(
-            status_code=404,
-            detail=f'User with user_id={user_id} not found'
-        )
+    values = {}
 
-    post = await select_post_by_id(post_id)
+    if request.title:
+        values["title"] = request.title
 
-    if post.user_id != user_id:
-        raise HTTPException(
-            status_code=403,
-            detail=f'Current user with user_id={user_id} is not the owner of the post with post_id={post_id}'
-        )
+    if request.content:
+        values["content"] = request.content
+
+    if not values:
+        return await select_post_by_id(post_id)
+
+    # The owner is checked again in the statement, in case the cached
+    # metadata is stale.
+    statement = (
+        update(Post)
+        .where(Post.id == post_id, Post.user_id == user_id)
+        .values(**values)
+        .returning(*POST_ROW_COLUMNS)
+        .execution_options(synchronize_session=False)
+    )
 
-    if not post:
+    async with get_db_session() as session:
+        row = (await session.execute(statement)).first()
+        await session.commit()
+
+    if not row:
         raise HTTPException(
             status_code=404,
             detail=f'Post with post_id={post_id} not found'
         )
 
-    post.title = request.title or post.title
-    post.content = request.content or post.content
+    publish_invalidation("posts", f"id:{post_id}")
 
-    async with get_db_session() as session:
-        session.add(post)
-        await session.commit()
-        await session.refresh(post)
-        return post
+    return PostRow(*row)
 
 
+@traced()
 async def delete_post_by_id(
     user_id: int,
     post_id: int,
@@ -172,29 +388,18 @@ async def delete_post_by_id(
 
     logger.info(f'Delete post by post_id={post_id}, user_id={user_id}')
 
-    user = await get_user_by_id(user_id)
-
-    if not user:
-        raise HTTPException(
-            status_code=404,
-            detail=f'User with user_id={user_id} not found'
-        )
-
-    post = await select_post_by_id(post_id)
-
-    if post.user_id != user_id:
-        raise HTTPException(
-            status_code=403,
-            detail=f'Current user with user_id={user_id} is not the owner of the post with post_id={post_id}'
-        )
+    await _check_post_owner(user_id, post_id)
 
-    if not post:
-        raise HTTPException(
-            status_code=404,
-            detail=f'Post with post_id={post_id} not found'
-        )
+    # Comments go with the post through the foreign key.
+    statement = (
+        delete(Post)
+        .where(Post.id == post_id, Post.user_id == user_id)
+        .execution_options(synchronize_session=False)
+    )
 
     async with get_db_session() as session:
-        await session.delete(post)
+        await session.execute(statement)
         await session.commit()
-        return
+
+    publish_invalidation("posts", f"id:{post_id}")
+    publish_invalidation("comments", f"post:{post_id}")
@@ -0,0 +1,505 @@
+import settings
+import asyncio
+import pickle
+import sys
+import time
+from abc import ABC
+from abc import abstractmethod
+from collections import OrderedDict
+from typing import Any
+from typing import Awaitable
+from typing import Callable
+from typing import Iterable
+from typing import Optional
+from loguru import logger
+
+
+from app.utils.invalidation import get_invalidation_bus
+from app.utils.metrics import CACHE_MEMORY_BYTES
+from app.utils.metrics import CACHE_REQUESTS
+from app.utils.metrics import SINGLE_FLIGHT_CALLS
+from app.utils.redis_client import RedisError
+from app.utils.redis_client import get_redis_client
+from app.utils.single_flight import SingleFlight
+
+
+MISSING = object()
+
+
+def estimate_size(value: Any) -> int:
+    """
+    Estimate the memory held by a value and the containers and slots it holds.
+
+    Args:
+        value (Any): The value.
+
+    Returns:
+        int: The estimate, in bytes.
+    """
+
+    size = sys.getsizeof(value)
+
+    if isinstance(value, dict):
+        size += sum(estimate_size(key) + estimate_size(item) for key, item in value.items())
+    elif isinstance(value, (list, tuple, set, frozenset)):
+        size += sum(estimate_size(item) for item in value)
+    elif hasattr(value, "__slots__") and not isinstance(value, tuple):
+        size += sum(estimate_size(getattr(value, name, None)) for name in value.__slots__)
+
+    return size
+
+
+class CacheBackend(ABC):
+    """
+    Storage for cache entries.
+
+    Keys are strings prefixed with the name of their cache. Values must be
+    treated as immutable once stored: the in-process backend hands out the
+    stored object itself.
+    """
+
+    # Whether every worker sees the same entries.
+    shared = False
+
+    @abstractmethod
+    async def get_many(self, keys: list[str]) -> list[Any]:
+        """
+        Get several entries.
+
+        Args:
+            keys (list[str]): The keys to get.
+
+        Returns:
+            list[Any]: The values, in order, with MISSING for absent or expired keys.
+        """
+
+    @abstractmethod
+    async def set_many(self, items: dict[str, Any], ttl_seconds: float) -> None:
+        pass
+
+    @abstractmethod
+    async def delete_many(self, keys: list[str]) -> None:
+        pass
+
+    @abstractmethod
+    async def clear(self, prefix: str) -> None:
+        pass
+
+    @abstractmethod
+    def invalidate(self, keys: Optional[list[str]], prefix: str) -> None:
+        """
+        Drop keys, or every key with prefix when keys is None, without waiting.
+        """
+
+    def memory_usage(self, prefix: str) -> Optional[int]:
+        return None
+
+
+class MemoryCacheBackend(CacheBackend):
+    """
+    Keep entries in process memory, bounded to max_entries.
+
+    Entries are kept in least-recently-used order so that the coldest entry
+    is evicted when the limit is reached. Their size is estimated when they
+    are stored, to report the memory used by each cache.
+    """
+
+    def __init__(self, max_entries: int = 50000):
+        self.max_entries = max_entries
+        self._entries: OrderedDict = OrderedDict()
+        self._bytes: dict[str, int] = {}
+
+    async def get_many(self, keys: list[str]) -> list[Any]:
+
+        now = time.monotonic()
+        values = []
+
+        for key in keys:
+
+            entry = self._entries.get(key)
+
+            if entry is None:
+                values.append(MISSING)
+            elif entry[0] <= now:
+                self._remove(key)
+                values.append(MISSING)
+            else:
+                self._entries.move_to_end(key)
+                values.append(entry[1])
+
+        return values
+
+    async def set_many(self, items: dict[str, Any], ttl_seconds: float) -> None:
+
+        expires_at = time.monotonic() + ttl_seconds
+
+        for key, value in items.items():
+
+            if key in self._entries:
+                self._remove(key)
+
+            size = estimate_size(value)
+            self._entries[key] = (expires_at, value, size)
+            self._account(key, size)
+
+        while len(self._entries) > self.max_entries:
+            self._remove(next(iter(self._entries)))
+
+    async def delete_many(self, keys: list[str]) -> None:
+        self.invalidate(keys, "")
+
+    async def clear(self, prefix: str) -> None:
+        self.invalidate(None, prefix)
+
+    def invalidate(self, keys: Optional[list[str]], prefix: str) -> None:
+
+        if keys is None:
+            keys = [key for key in self._entries if key.startswith(prefix)]
+
+        for key in keys:
+            if key in self._entries:
+                self._remove(key)
+
+    def memory_usage(self, prefix: str) -> Optional[int]:
+        return self._bytes.get(prefix.rstrip(":"), 0)
+
+    def _remove(self, key: str) -> None:
+        _, _, size = self._entries.pop(key)
+        self._account(key, -size)
+
+    def _account(self, key: str, size: int) -> None:
+
+        name = key.split(":", 1)[0]
+        total = self._bytes.get(name, 0) + size
+
+        self._bytes[name] = total
+        CACHE_MEMORY_BYTES.set(total, name)
+
+
+class RedisCacheBackend(CacheBackend):
+    """
+    Keep entries in a Redis-protocol server shared by all workers.
+
+    Values are pickled, so only trusted servers may be used.
+    """
+
+    shared = True
+
+    def __init__(self):
+        # The loop only keeps weak references to tasks, so pending
+        # invalidations are kept here until they are done.
+        self._invalidations: set[asyncio.Task] = set()
+
+    async def get_many(self, keys: list[str]) -> list[Any]:
+
+        replies = await get_redis_client().mget(keys)
+
+        return [MISSING if reply is None else pickle.loads(reply) for reply in replies]
+
+    async def set_many(self, items: dict[str, Any], ttl_seconds: float) -> None:
+
+        ttl_ms = max(int(ttl_seconds * 1000), 1)
+
+        async with get_redis_client().pipeline(transaction=False) as pipeline:
+            for key, value in items.items():
+                pipeline.set(key, pickle.dumps(value, pickle.HIGHEST_PROTOCOL), px=ttl_ms)
+            await pipeline.execute()
+
+    async def delete_many(self, keys: list[str]) -> None:
+        if keys:
+            await get_redis_client().delete(*keys)
+
+    async def clear(self, prefix: str) -> None:
+
+        client = get_redis_client()
+        cursor = 0
+
+        while True:
+            cursor, keys = await client.scan(cursor, match=f"{prefix}*", count=1000)
+            if keys:
+                await client.delete(*keys)
+            if not cursor:
+                return
+
+    def invalidate(self, keys: Optional[list[str]], prefix: str) -> None:
+        task = asyncio.get_running_loop().create_task(self._invalidate(keys, prefix))
+        self._invalidations.add(task)
+        task.add_done_callback(self._invalidations.discard)
+
+    async def _invalidate(self, keys: Optional[list[str]], prefix: str) -> None:
+
+        try:
+            if keys is None:
+                await self.clear(prefix)
+            else:
+                await self.delete_many(keys)
+        except RedisError as e:
+            logger.error(f'Could not invalidate cache entries with prefix {prefix}: {e}')
+
+
+class Cache:
+    """
+    A named cache of values with a TTL, on top of the process-wide backend.
+
+    Misses are loaded through single-flight, so concurrent misses of a key
+    cost one load; this is the only coalescing layer of the cached reads. Backend errors are logged and treated as misses: the
+    cache never makes a read fail.
+
+    A cache follows one namespace of the invalidation bus. Invalidated keys
+    are dropped, or every key when the cache holds derived values, such as
+    listings, that any write of the namespace may change. Every invalidation
+    bumps a generation, and a load that was running meanwhile returns its
+    value without storing it, since it may have read the data from before
+    the write.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        ttl_seconds: float,
+        namespace: Optional[str] = None,
+        clear_on_invalidation: bool = False,
+        backend: Optional[CacheBackend] = None,
+    ):
+        self.name = name
+        self.ttl_seconds = ttl_seconds
+        self.clear_on_invalidation = clear_on_invalidation
+        self.backend = backend or get_cache_backend()
+        self.prefix = f"{name}:"
+        self.hits = 0
+        self.misses = 0
+        self.errors = 0
+        self._single_flight = SingleFlight()
+        self._generation = 0
+
+        if namespace:
+            get_invalidation_bus().subscribe(namespace, self._on_invalidation)
+
+    async def get(self, key, default: Any = None) -> Any:
+
+        value = (await self._get_many([key]))[0]
+
+        return default if value is MISSING else value
+
+    async def get_many(self, keys: Iterable) -> dict:
+        """
+        Get several entries in one backend round trip.
+
+        Args:
+            keys (Iterable): The keys to get.
+
+        Returns:
+            dict: The values found, by key.
+        """
+
+        keys = list(keys)
+        values = await self._get_many(keys)
+
+        return {key: value for key, value in zip(keys, values) if value is not MISSING}
+
+    async def set(self, key, value: Any, ttl_seconds: float = None) -> None:
+        await self.set_many({key: value}, ttl_seconds)
+
+    async def set_many(self, items: dict, ttl_seconds: float = None) -> None:
+
+        if not settings.CACHE_ENABLED or not items:
+            return
+
+        try:
+            await self.backend.set_many(
+                {f"{self.prefix}{key}": value for key, value in items.items()},
+                ttl_seconds or self.ttl_seconds,
+            )
+        except RedisError as e:
+            self.errors += 1
+            logger.error(f'Could not write cache {self.name}: {e}')
+
+    async def delete(self, *keys) -> None:
+
+        try:
+            await self.backend.delete_many([f"{self.prefix}{key}" for key in keys])
+        except RedisError as e:
+            self.errors += 1
+            logger.error(f'Could not delete from cache {self.name}: {e}')
+
+    async def clear(self) -> None:
+
+        try:
+            await self.backend.clear(self.prefix)
+        except RedisError as e:
+            self.errors += 1
+            logger.error(f'Could not clear cache {self.name}: {e}')
+
+    async def get_or_load(
+        self,
+        key,
+        loader: Callable[[], Awaitable[Any]],
+        ttl_seconds: float = None,
+    ) -> Any:
+        """
+        Get a value, loading and storing it on a miss.
+
+        Concurrent loads of a key share one call of loader, even when
+        settings.CACHE_ENABLED is off and nothing is stored.
+
+        Args:
+            key: The key of the value.
+            loader (Callable[[], Awaitable[Any]]): Loads the value. None is
+                returned as is but not stored.
+            ttl_seconds (float, optional): The TTL of a loaded value.
+                Defaults to the TTL of the cache.
+
+        Returns:
+            Any: The cached or loaded value.
+        """
+
+        if not settings.CACHE_ENABLED:
+            return await self._load(key, loader)
+
+        value = (await self._get_many([key]))[0]
+
+        if value is not MISSING:
+            return value
+
+        async def load():
+
+            generation = self._generation
+            value = await loader()
+
+            if value is not None and generation == self._generation:
+                await self.set(key, value, ttl_seconds)
+
+            return value
+
+        return await self._load(key, load)
+
+    async def _load(self, key, loader: Callable[[], Awaitable[Any]]) -> Any:
+
+        SINGLE_FLIGHT_CALLS.inc(self.name, "shared" if key in self._single_flight else "executed")
+
+        return await self._single_flight.do(key, loader)
+
+    def stats(self) -> dict:
+
+        requests = self.hits + self.misses
+
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "errors": self.errors,
+            "hit_ratio": round(self.hits / requests, 4) if requests else None,
+            "memory_bytes": self.backend.memory_usage(self.prefix),
+            "loads_shared": self._single_flight.shared,
+        }
+
+    async def _get_many(self, keys: list) -> list:
+
+        if not settings.CACHE_ENABLED or not keys:
+            return [MISSING] * len(keys)
+
+        try:
+            values = await self.backend.get_many([f"{self.prefix}{key}" for key in keys])
+        except RedisError as e:
+            self.errors += 1
+            logger.error(f'Could not read cache {self.name}: {e}')
+            values = [MISSING] * len(keys)
+
+        hits = sum(value is not MISSING for value in values)
+        self.hits += hits
+        self.misses += len(keys) - hits
+
+        if hits:
+            CACHE_REQUESTS.inc(self.name, "hit", amount=hits)
+        if hits < len(keys):
+            CACHE_REQUESTS.inc(self.name, "miss", amount=len(keys) - hits)
+
+        return values
+
+    def _on_invalidation(self, keys: Optional[frozenset]) -> None:
+
+        self._generation += 1
+
+        if keys is None or self.clear_on_invalidation:
+            self.backend.invalidate(None, self.prefix)
+        else:
+            self.backend.invalidate([f"{self.prefix}{key}" for key in keys], self.prefix)
+
+
+_cache_backend: Optional[CacheBackend] = None
+_caches: dict[str, Cache] = {}
+
+
+def get_cache_backend() -> CacheBackend:
+    """
+    Get the process-wide cache backend selected by settings.CACHE_BACKEND.
+
+    Returns:
+        CacheBackend: The shared backend.
+    """
+
+    global _cache_backend
+
+    if _cache_backend is None:
+
+        if settings.CACHE_BACKEND == "redis":
+            _cache_backend = RedisCacheBackend()
+        else:
+            _cache_backend = MemoryCacheBackend(settings.CACHE_MAX_ENTRIES)
+
+    return _cache_backend
+
+
+def get_cache(
+    name: str,
+    ttl_seconds: float = None,
+    namespace: Optional[str] = None,
+    clear_on_invalidation: bool = False,
+) -> Cache:
+    """
+    Get the cache with the given name, creating it on first use.
+
+    Args:
+        name (str): The name of the cache, also the prefix of its keys.
+        ttl_seconds (float, optional): The default TTL of its entries.
+            Defaults to settings.CACHE_DEFAULT_TTL_SECONDS.
+        namespace (Optional[str], optional): The invalidation namespace it follows.
+        clear_on_invalidation (bool, optional): Whether any invalidation of
+            the namespace drops every entry. Defaults to False.
+
+    Returns:
+        Cache: The cache.
+    """
+
+    cache = _caches.get(name)
+
+    if cache is None:
+        cache = _caches[name] = Cache(
+            name,
+            ttl_seconds or settings.CACHE_DEFAULT_TTL_SECONDS,
+            namespace,
+            clear_on_invalidation,
+        )
+
+    return cache
+
+
+def register_cache(name: str, cache) -> None:
+    """
+    Include a cache that is not built on Cache in cache_stats.
+
+    Args:
+        name (str): The name of the cache.
+        cache: The cache, with a stats() method.
+    """
+    _caches[name] = cache
+
+
+def cache_stats() -> dict[str, dict]:
+    """
+    Get the hit ratio and memory use of every cache.
+
+    Returns:
+        dict[str, dict]: The statistics of each cache, by name.
+    """
+    return {name: cache.stats() for name, cache in _caches.items()}
+
@@ -0,0 +1,215 @@
+import settings
+import asyncio
+import time
+from typing import Awaitable
+from typing import Callable
+from typing import Optional
+from sqlalchemy import text
+from loguru import logger
+
+
+from database import async_engine
+
+
+class LoopLagMonitor:
+    """
+    Measures how late the event loop wakes up a task that sleeps on a timer.
+
+    A stalled loop (blocking calls, CPU-bound work) delays every timer, so
+    the overshoot of a periodic sleep is a direct measure of how long
+    requests wait before they are even looked at. The highest lag since the
+    previous readiness probe is reported, so short stalls are not missed.
+    """
+
+    def __init__(self, interval_seconds: float):
+        self.interval_seconds = interval_seconds
+        self.lag = 0.0
+        self.max_lag = 0.0
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run(), name="loop_lag_monitor")
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    def pop_max_lag(self) -> float:
+        max_lag, self.max_lag = max(self.max_lag, self.lag), self.lag
+        return max_lag
+
+    async def _run(self) -> None:
+
+        loop = asyncio.get_running_loop()
+
+        while True:
+            expected = loop.time() + self.interval_seconds
+            await asyncio.sleep(self.interval_seconds)
+            self.lag = max(loop.time() - expected, 0.0)
+            self.max_lag = max(self.max_lag, self.lag)
+
+
+loop_lag_monitor = LoopLagMonitor(settings.HEALTH_LOOP_LAG_INTERVAL_SECONDS)
+
+
+class CachedCheck:
+    """
+    A dependency check whose result is reused for ttl_seconds.
+
+    Concurrent probes share a single in-flight check, and every check is
+    bounded by timeout_seconds, so probes never pile up on a slow
+    dependency.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        probe: Callable[[], Awaitable[None]],
+        ttl_seconds: float,
+        timeout_seconds: float,
+    ):
+        self.name = name
+        self.probe = probe
+        self.ttl_seconds = ttl_seconds
+        self.timeout_seconds = timeout_seconds
+        self._result: Optional[dict] = None
+        self._checked_at = 0.0
+        self._lock: Optional[asyncio.Lock] = None
+
+    async def run(self) -> dict:
+
+        if self._result is not None and time.monotonic() - self._checked_at < self.ttl_seconds:
+            return self._result
+
+        # Created lazily so that it belongs to the running event loop.
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+
+        async with self._lock:
+
+            if self._result is not None and time.monotonic() - self._checked_at < self.ttl_seconds:
+                return self._result
+
+            started = time.perf_counter()
+
+            try:
+                await asyncio.wait_for(self.probe(), self.timeout_seconds)
+                result = {"ok": True}
+            except asyncio.TimeoutError:
+                result = {"ok": False, "error": f"Timed out after {self.timeout_seconds}s"}
+            except Exception as e:
+                result = {"ok": False, "error": str(e)}
+
+            result["duration_ms"] = round((time.perf_counter() - started) * 1000, 2)
+
+            if not result["ok"]:
+                logger.warning(f'Health check {self.name} failed: {result["error"]}')
+
+            self._result = result
+            self._checked_at = time.monotonic()
+
+            return result
+
+
+async def _probe_database() -> None:
+
+    async with async_engine.connect() as connection:
+        await connection.execute(text("SELECT 1"))
+
+
+async def _probe_smtp() -> None:
+
+    reader, writer = await asyncio.open_connection(settings.SMTP_HOST, settings.SMTP_PORT)
+
+    try:
+        banner = await reader.readline()
+        if not banner.startswith(b"220"):
+            raise ConnectionError(f"Unexpected SMTP banner: {banner[:100]!r}")
+        writer.write(b"QUIT\r\n")
+        await writer.drain()
+    finally:
+        writer.close()
+
+
+database_check = CachedCheck(
+    "database",
+    _probe_database,
+    settings.HEALTH_CHECK_CACHE_SECONDS,
+    settings.HEALTH_CHECK_TIMEOUT_SECONDS,
+)
+smtp_check = CachedCheck(
+    "smtp",
+    _probe_smtp,
+    settings.HEALTH_CHECK_CACHE_SECONDS,
+    settings.HEALTH_CHECK_TIMEOUT_SECONDS,
+)
+
+
+def check_pool_headroom() -> dict:
+    """
+    Check that the DB pool can still hand out settings.HEALTH_MIN_POOL_HEADROOM connections.
+
+    Returns:
+        dict: The check result with the pool usage.
+    """
+
+    pool = async_engine.pool
+    capacity = settings.POSTGRES_POOL_SIZE + settings.POSTGRES_MAX_OVERFLOW
+    checked_out = pool.checkedout()
+    headroom = capacity - checked_out
+
+    return {
+        "ok": headroom >= settings.HEALTH_MIN_POOL_HEADROOM,
+        "checked_out": checked_out,
+        "capacity": capacity,
+        "headroom": headroom,
+    }
+
+
+def check_loop_lag() -> dict:
+    """
+    Check that the event loop has not stalled for more than settings.HEALTH_MAX_LOOP_LAG_SECONDS.
+
+    Returns:
+        dict: The check result with the highest lag since the previous check.
+    """
+
+    lag = loop_lag_monitor.pop_max_lag()
+
+    return {
+        "ok": lag <= settings.HEALTH_MAX_LOOP_LAG_SECONDS,
+        "lag_ms": round(lag * 1000, 2),
+    }
+
+
+async def check_readiness() -> tuple[bool, dict]:
+    """
+    Run every readiness check.
+
+    The pool check runs first: when the pool is exhausted, the database
+    probe would only queue for a connection, so it is not attempted.
+
+    Returns:
+        tuple[bool, dict]: Whether the replica is ready, and each check result by name.
+    """
+
+    checks = {
+        "pool": check_pool_headroom(),
+        "event_loop": check_loop_lag(),
+    }
+
+    probes = []
+    if checks["pool"]["ok"]:
+        probes.append(database_check)
+    else:
+        checks["database"] = {"ok": False, "error": "Skipped, no pool headroom"}
+    if settings.HEALTH_CHECK_SMTP:
+        probes.append(smtp_check)
+
+    for check, result in zip(probes, await asyncio.gather(*(check.run() for check in probes))):
+        checks[check.name] = result
+
+    return all(result["ok"] for result in checks.values()), checks
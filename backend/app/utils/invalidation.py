@@ -0,0 +1,226 @@
+import settings
+import asyncio
+import os
+from typing import Callable
+from typing import Optional
+import asyncpg
+import orjson
+from sqlalchemy import text
+from loguru import logger
+
+
+from database import async_engine
+
+
+# PostgreSQL rejects NOTIFY payloads of 8000 bytes or more.
+MAX_PAYLOAD_BYTES = 7900
+
+
+InvalidationHandler = Callable[[Optional[frozenset]], None]
+
+
+class InvalidationBus:
+    """
+    Propagates cache invalidations to every worker and replica through
+    PostgreSQL LISTEN/NOTIFY.
+
+    Caches subscribe to a namespace ("users", "posts", ...) with a handler
+    that receives the invalidated keys, or None when the whole namespace
+    must be dropped. Write paths publish after their commit: local handlers
+    run at once, so the writer reads its own writes, and the keys are
+    queued for settings.INVALIDATION_COALESCE_SECONDS so that a burst of
+    writes costs a single NOTIFY.
+
+    Notifications are received on a dedicated connection outside the pool.
+    Whenever it (re)connects, every namespace is dropped, since
+    notifications sent while it was down are lost.
+    """
+
+    def __init__(
+        self,
+        channel: str,
+        coalesce_seconds: float,
+        reconnect_seconds: float,
+        keepalive_seconds: float,
+    ):
+        self.channel = channel
+        self.coalesce_seconds = coalesce_seconds
+        self.reconnect_seconds = reconnect_seconds
+        self.keepalive_seconds = keepalive_seconds
+        self.sender_id = f"{os.getpid()}-{os.urandom(4).hex()}"
+        self._handlers: dict[str, list[InvalidationHandler]] = {}
+        self._pending: dict[str, Optional[set]] = {}
+        self._flush_task: Optional[asyncio.Task] = None
+        self._listen_task: Optional[asyncio.Task] = None
+
+    def subscribe(self, namespace: str, handler: InvalidationHandler) -> None:
+        self._handlers.setdefault(namespace, []).append(handler)
+
+    def publish(self, namespace: str, *keys) -> None:
+        """
+        Invalidate keys of a namespace on every node.
+
+        Call it after the write has been committed, or other nodes could
+        reload the old value before the commit lands.
+
+        Args:
+            namespace (str): The namespace of the keys.
+            *keys: The invalidated keys. None at all invalidates the whole namespace.
+        """
+
+        keys = frozenset(str(key) for key in keys) or None
+
+        self._dispatch(namespace, keys)
+
+        if self._listen_task is None:
+            return
+
+        if keys is None or namespace in self._pending and self._pending[namespace] is None:
+            self._pending[namespace] = None
+        else:
+            self._pending.setdefault(namespace, set()).update(keys)
+
+        if self._flush_task is None:
+            self._flush_task = asyncio.create_task(self._flush(), name="invalidation_flush")
+
+    def flush_all(self) -> None:
+        """
+        Drop every subscribed namespace on this node.
+        """
+
+        for namespace in self._handlers:
+            self._dispatch(namespace, None)
+
+    def start(self) -> None:
+        if self._listen_task is None:
+            self._listen_task = asyncio.create_task(self._listen(), name="invalidation_listener")
+
+    async def stop(self) -> None:
+
+        if self._flush_task is not None:
+            await asyncio.gather(self._flush_task, return_exceptions=True)
+
+        if self._listen_task is not None:
+            self._listen_task.cancel()
+            await asyncio.gather(self._listen_task, return_exceptions=True)
+            self._listen_task = None
+
+    def _dispatch(self, namespace: str, keys: Optional[frozenset]) -> None:
+
+        for handler in self._handlers.get(namespace, ()):
+            try:
+                handler(keys)
+            except Exception as e:
+                logger.error(f'Invalidation handler of namespace {namespace} failed: {e}')
+
+    def _encode(self, pending: dict[str, Optional[set]]) -> str:
+
+        payload = orjson.dumps({
+            "sender": self.sender_id,
+            "keys": {namespace: None if keys is None else sorted(keys) for namespace, keys in pending.items()},
+        })
+
+        if len(payload) > MAX_PAYLOAD_BYTES:
+            payload = orjson.dumps({"sender": self.sender_id, "keys": dict.fromkeys(pending)})
+
+        return payload.decode()
+
+    async def _flush(self) -> None:
+
+        try:
+            await asyncio.sleep(self.coalesce_seconds)
+        finally:
+            pending, self._pending = self._pending, {}
+            self._flush_task = None
+
+        try:
+            async with async_engine.connect() as connection:
+                await connection.execute(text("SELECT pg_notify(:channel, :payload)"), {
+                    "channel": self.channel,
+                    "payload": self._encode(pending),
+                })
+                await connection.commit()
+        except Exception as e:
+            logger.error(f'Could not publish invalidations of {", ".join(pending)}: {e}')
+
+    def _on_notification(self, connection, pid: int, channel: str, payload: str) -> None:
+
+        try:
+            message = orjson.loads(payload)
+        except orjson.JSONDecodeError:
+            logger.warning(f'Ignoring malformed invalidation: {payload[:100]!r}')
+            return
+
+        if message.get("sender") == self.sender_id:
+            return
+
+        for namespace, keys in message.get("keys", {}).items():
+            self._dispatch(namespace, None if keys is None else frozenset(keys))
+
+    async def _listen(self) -> None:
+
+        dsn = async_engine.url.set(drivername="postgresql").render_as_string(hide_password=False)
+
+        while True:
+
+            connection = None
+
+            try:
+                connection = await asyncpg.connect(dsn)
+                lost = asyncio.Event()
+                connection.add_termination_listener(lambda _: lost.set())
+                await connection.add_listener(self.channel, self._on_notification)
+
+                logger.info(f'Listening for cache invalidations on channel {self.channel}')
+
+                self.flush_all()
+
+                while not lost.is_set():
+                    try:
+                        await asyncio.wait_for(lost.wait(), self.keepalive_seconds)
+                    except asyncio.TimeoutError:
+                        await asyncio.wait_for(connection.execute("SELECT 1"), self.keepalive_seconds)
+            except Exception as e:
+                logger.warning(f'Cache invalidation listener failed: {e}')
+            finally:
+                if connection is not None and not connection.is_closed():
+                    await connection.close(timeout=1)
+
+            logger.warning(f'Cache invalidation listener disconnected, reconnecting in {self.reconnect_seconds}s')
+
+            await asyncio.sleep(self.reconnect_seconds)
+
+
+_invalidation_bus: Optional[InvalidationBus] = None
+
+
+def get_invalidation_bus() -> InvalidationBus:
+    """
+    Get the process-wide cache invalidation bus.
+
+    Returns:
+        InvalidationBus: The shared bus.
+    """
+
+    global _invalidation_bus
+
+    if _invalidation_bus is None:
+        _invalidation_bus = InvalidationBus(
+            settings.INVALIDATION_CHANNEL,
+            settings.INVALIDATION_COALESCE_SECONDS,
+            settings.INVALIDATION_RECONNECT_SECONDS,
+            settings.INVALIDATION_KEEPALIVE_SECONDS,
+        )
+
+    return _invalidation_bus
+
+
+def publish_invalidation(namespace: str, *keys) -> None:
+    """
+    Invalidate cached keys of a namespace on every node, after a commit.
+
+    Args:
+        namespace (str): The namespace of the keys.
+        *keys: The invalidated keys. None at all invalidates the whole namespace.
+    """
+    get_invalidation_bus().publish(namespace, *keys)
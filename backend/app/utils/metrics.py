@@ -0,0 +1,450 @@
+import settings
+import bisect
+import fcntl
+import os
+import time
+import orjson
+from typing import Callable
+from typing import Optional
+from loguru import logger
+
+
+from database import async_engine
+
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class _Metric:
+    """
+    Base class of the metrics of the registry.
+
+    Values are kept in a plain dict keyed by the tuple of label values. The
+    app runs on a single event loop thread, so updates need no lock.
+    """
+
+    type = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: dict = {}
+        REGISTRY.append(self)
+
+    def dump(self) -> dict:
+        return dict(self._values)
+
+
+class Counter(_Metric):
+    """
+    A value that only goes up.
+    """
+
+    type = "counter"
+
+    def inc(self, *labels, amount: float = 1) -> None:
+        self._values[labels] = self._values.get(labels, 0) + amount
+
+
+class Gauge(_Metric):
+    """
+    A value that goes up and down, or is read from callback at collection time.
+    """
+
+    type = "gauge"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: tuple = (),
+        callback: Callable[[], Optional[float]] = None,
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.callback = callback
+
+    def inc(self, *labels, amount: float = 1) -> None:
+        self._values[labels] = self._values.get(labels, 0) + amount
+
+    def dec(self, *labels, amount: float = 1) -> None:
+        self._values[labels] = self._values.get(labels, 0) - amount
+
+    def set(self, value: float, *labels) -> None:
+        self._values[labels] = value
+
+    def dump(self) -> dict:
+
+        if self.callback is None:
+            return dict(self._values)
+
+        try:
+            value = self.callback()
+        except Exception as e:
+            logger.warning(f'Could not collect gauge {self.name}: {e}')
+            return {}
+
+        return {} if value is None else {(): value}
+
+
+class Histogram(_Metric):
+    """
+    Counts observations into cumulative buckets, Prometheus style.
+
+    Each label set holds one list: the per-bucket counts (the last one being
+    +Inf), then the sum and the count of observations. Buckets are made
+    cumulative only when exported.
+    """
+
+    type = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: tuple = (),
+        buckets: tuple = DEFAULT_BUCKETS,
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, *labels) -> None:
+
+        counts = self._values.get(labels)
+        if counts is None:
+            counts = self._values[labels] = [0] * (len(self.buckets) + 3)
+
+        counts[bisect.bisect_left(self.buckets, value)] += 1
+        counts[-2] += value
+        counts[-1] += 1
+
+    def dump(self) -> dict:
+        return {labels: list(counts) for labels, counts in self._values.items()}
+
+
+REGISTRY: list[_Metric] = []
+
+
+HTTP_REQUESTS = Counter(
+    "http_requests_total",
+    "HTTP requests handled, by method, route template and status code.",
+    ("method", "route", "status"),
+)
+HTTP_REQUEST_DURATION = Histogram(
+    "http_request_duration_seconds",
+    "HTTP request latency, by method and route template.",
+    ("method", "route"),
+)
+HTTP_REQUESTS_IN_FLIGHT = Gauge(
+    "http_requests_in_flight",
+    "HTTP requests currently being handled.",
+)
+DB_POOL_SIZE = Gauge(
+    "db_pool_size",
+    "Connections the database pool keeps open.",
+    callback=lambda: async_engine.pool.size(),
+)
+DB_POOL_CHECKED_OUT = Gauge(
+    "db_pool_checked_out",
+    "Database connections currently in use.",
+    callback=lambda: async_engine.pool.checkedout(),
+)
+DB_POOL_OVERFLOW = Gauge(
+    "db_pool_overflow",
+    "Database connections open beyond the pool size.",
+    callback=lambda: max(async_engine.pool.overflow(), 0),
+)
+PASSWORD_HASH_OPERATIONS = Counter(
+    "password_hash_operations_total",
+    "Password hashes computed or verified, by operation.",
+    ("operation",),
+)
+OTP_QR_RENDERS = Counter(
+    "otp_qr_renders_total",
+    "OTP QR codes rendered.",
+)
+EMAILS_SENT = Counter(
+    "emails_sent_total",
+    "Emails handed to the SMTP server, by outcome.",
+    ("outcome",),
+)
+JWT_DECODES = Counter(
+    "jwt_decodes_total",
+    "JWT tokens decoded, by outcome.",
+    ("outcome",),
+)
+CACHE_REQUESTS = Counter(
+    "cache_requests_total",
+    "Cache lookups, by cache and result (hit or miss).",
+    ("cache", "result"),
+)
+CACHE_MEMORY_BYTES = Gauge(
+    "cache_memory_bytes",
+    "Estimated memory held by the in-process entries of each cache.",
+    ("cache",),
+)
+SCHEDULER_JOB_RUNS = Counter(
+    "scheduler_job_runs_total",
+    "Scheduled job runs, by job and outcome (success, failure or skipped).",
+    ("job", "outcome"),
+)
+SCHEDULER_JOB_DURATION = Histogram(
+    "scheduler_job_duration_seconds",
+    "Scheduled job run duration, by job.",
+    ("job",),
+    buckets=(0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0, 30.0, 60.0, 300.0),
+)
+SINGLE_FLIGHT_CALLS = Counter(
+    "single_flight_calls_total",
+    "Cache loads, by cache and whether they executed or shared a load in flight.",
+    ("cache", "result"),
+)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labelnames: tuple, labels: tuple, extra: str = "") -> str:
+
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(labelnames, labels)]
+    if extra:
+        pairs.append(extra)
+
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+
+    if value == int(value):
+        return str(int(value))
+
+    return repr(float(value))
+
+
+def render(values: dict[str, dict]) -> str:
+    """
+    Render metric values in the Prometheus text exposition format.
+
+    Args:
+        values (dict[str, dict]): The values of each metric, by metric name.
+
+    Returns:
+        str: The exposition text.
+    """
+
+    lines = []
+
+    for metric in REGISTRY:
+
+        lines.append(f"# HELP {metric.name} {metric.documentation}")
+        lines.append(f"# TYPE {metric.name} {metric.type}")
+
+        for labels, value in sorted(values.get(metric.name, {}).items()):
+
+            if metric.type != "histogram":
+                lines.append(f"{metric.name}{_format_labels(metric.labelnames, labels)} {_format_value(value)}")
+                continue
+
+            cumulative = 0
+            for bound, count in zip(metric.buckets + (float("inf"),), value):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                bucket_labels = _format_labels(metric.labelnames, labels, f'le="{le}"')
+                lines.append(f"{metric.name}_bucket{bucket_labels} {cumulative}")
+
+            lines.append(f"{metric.name}_sum{_format_labels(metric.labelnames, labels)} {_format_value(value[-2])}")
+            lines.append(f"{metric.name}_count{_format_labels(metric.labelnames, labels)} {value[-1]}")
+
+    return "\n".join(lines) + "\n"
+
+
+def collect() -> dict[str, dict]:
+    """
+    Collect the current values of every metric of this process.
+
+    Returns:
+        dict[str, dict]: The values of each metric, by metric name.
+    """
+    return {metric.name: metric.dump() for metric in REGISTRY}
+
+
+AGGREGATE_SNAPSHOT = "exited.json"
+
+
+_snapshot_name: Optional[tuple[int, str]] = None
+
+
+def _process_start_time(pid: int) -> Optional[str]:
+
+    try:
+        with open(f"/proc/{pid}/stat", "rb") as file:
+            stat = file.read()
+    except OSError:
+        return None
+
+    # The command name may hold spaces, so fields are counted from its closing
+    # parenthesis: the start time is field 22, the 20th after it.
+    return stat.rsplit(b")", 1)[1].split()[19].decode()
+
+
+def _snapshot_path() -> str:
+
+    global _snapshot_name
+
+    pid = os.getpid()
+
+    # The name holds the start time of the process, so a new worker that
+    # reuses the pid of an exited one never overwrites its snapshot.
+    if _snapshot_name is None or _snapshot_name[0] != pid:
+        started = _process_start_time(pid) or str(time.time_ns())
+        _snapshot_name = (pid, f"{pid}-{started}.json")
+
+    return os.path.join(settings.METRICS_MULTIPROCESS_DIR, _snapshot_name[1])
+
+
+def _has_exited(name: str, stale: bool) -> bool:
+
+    pid, _, started = name[:-len(".json")].partition("-")
+
+    if not pid.isdigit() or not started:
+        return True
+
+    if _process_start_time(os.getpid()) is None:
+        # Without /proc, a worker is taken for exited once its snapshot is stale.
+        return stale
+
+    return _process_start_time(int(pid)) != started
+
+
+def _read_snapshot(path: str) -> dict[str, dict]:
+
+    with open(path, "rb") as file:
+        snapshot = orjson.loads(file.read())
+
+    return {
+        name: {tuple(labels): value for labels, value in samples}
+        for name, samples in snapshot.items()
+    }
+
+
+def _write_snapshot(path: str, values: dict[str, dict]) -> None:
+
+    snapshot = {
+        name: [[list(labels), value] for labels, value in metric_values.items()]
+        for name, metric_values in values.items()
+    }
+
+    temporary_path = f"{path}.tmp"
+
+    with open(temporary_path, "wb") as file:
+        file.write(orjson.dumps(snapshot))
+
+    os.replace(temporary_path, path)
+
+
+async def write_metrics_snapshot() -> None:
+    """
+    Write the metrics of this process to settings.METRICS_MULTIPROCESS_DIR.
+
+    Every worker does this periodically so that any of them can serve the
+    metrics of all of them.
+    """
+
+    os.makedirs(settings.METRICS_MULTIPROCESS_DIR, exist_ok=True)
+
+    _write_snapshot(_snapshot_path(), collect())
+
+
+def _merge(total: dict[str, dict], values: dict[str, dict], include_gauges: bool) -> None:
+
+    types = {metric.name: metric.type for metric in REGISTRY}
+
+    for name, metric_values in values.items():
+
+        metric_type = types.get(name)
+        if metric_type is None or (metric_type == "gauge" and not include_gauges):
+            continue
+
+        merged = total.setdefault(name, {})
+
+        for labels, value in metric_values.items():
+            current = merged.get(labels)
+            if current is None:
+                merged[labels] = list(value) if metric_type == "histogram" else value
+            elif metric_type == "histogram":
+                merged[labels] = [a + b for a, b in zip(current, value)]
+            else:
+                merged[labels] = current + value
+
+
+async def render_metrics() -> str:
+    """
+    Render the metrics of this process, or of every worker when
+    settings.METRICS_MULTIPROCESS_DIR is set.
+
+    The counters and histograms of workers that have exited are folded into
+    one aggregate snapshot and their own snapshots deleted, so that totals
+    never go down and the directory does not grow with worker restarts.
+    Gauges of a worker are dropped once its snapshot is older than three
+    flush intervals. The directory is emptied by start-service.sh, so that
+    totals start over with each deployment.
+
+    Returns:
+        str: The exposition text.
+    """
+
+    if not settings.METRICS_MULTIPROCESS_DIR:
+        return render(collect())
+
+    await write_metrics_snapshot()
+
+    directory = settings.METRICS_MULTIPROCESS_DIR
+    aggregate_path = os.path.join(directory, AGGREGATE_SNAPSHOT)
+    total: dict[str, dict] = {}
+    stale_before = time.time() - 3 * settings.METRICS_FLUSH_INTERVAL_SECONDS
+
+    # Workers folding exited snapshots at the same time would count them twice.
+    with open(os.path.join(directory, ".lock"), "wb") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+
+        try:
+            exited = _read_snapshot(aggregate_path)
+        except FileNotFoundError:
+            exited = {}
+        except (OSError, orjson.JSONDecodeError) as e:
+            logger.warning(f'Could not read metrics snapshot {aggregate_path}: {e}')
+            exited = {}
+
+        folded = []
+
+        with os.scandir(directory) as entries:
+            for entry in entries:
+
+                if not entry.name.endswith(".json") or entry.name == AGGREGATE_SNAPSHOT:
+                    continue
+
+                try:
+                    values = _read_snapshot(entry.path)
+                    is_live = entry.stat().st_mtime >= stale_before
+                except (OSError, orjson.JSONDecodeError) as e:
+                    logger.warning(f'Could not read metrics snapshot {entry.path}: {e}')
+                    continue
+
+                if entry.path != _snapshot_path() and _has_exited(entry.name, not is_live):
+                    _merge(exited, values, include_gauges=False)
+                    folded.append(entry.path)
+                else:
+                    _merge(total, values, include_gauges=is_live)
+
+        if folded:
+            _write_snapshot(aggregate_path, exited)
+            for path in folded:
+                os.remove(path)
+
+    _merge(total, exited, include_gauges=False)
+
+    return render(total)
@@ -0,0 +1,228 @@
+import settings
+import math
+import time
+from abc import ABC
+from abc import abstractmethod
+from collections import OrderedDict
+from typing import Optional
+from fastapi import HTTPException
+from fastapi import Request
+from loguru import logger
+
+
+from app.utils.redis_client import RedisError
+from app.utils.redis_client import get_redis_client
+
+
+class RateLimitBackend(ABC):
+    """
+    Storage for sliding-window rate limit counters.
+
+    The sliding window is approximated from the count of the current fixed
+    window plus the count of the previous one, weighted by how much of the
+    previous window still overlaps the sliding window. That needs two
+    integers per key, whatever the request rate.
+    """
+
+    @abstractmethod
+    async def hit(self, key: str, limit: int, window_seconds: int) -> float:
+        """
+        Record one request for key and check it against limit.
+
+        Args:
+            key (str): The rate limit key.
+            limit (int): The number of requests allowed per window.
+            window_seconds (int): The window length in seconds.
+
+        Returns:
+            float: 0 if the request is allowed, otherwise the number of
+            seconds after which the client may retry.
+        """
+
+
+def _retry_after(
+    previous_count: int,
+    current_count: int,
+    limit: int,
+    window_seconds: int,
+    elapsed: float,
+) -> float:
+
+    weight = (window_seconds - elapsed) / window_seconds
+    estimate = previous_count * weight + current_count
+
+    if estimate <= limit:
+        return 0.0
+
+    if current_count > limit:
+        return window_seconds - elapsed
+
+    # Time until the previous window has slid out far enough.
+    needed_weight = (limit - current_count) / previous_count
+    return max(window_seconds - elapsed - needed_weight * window_seconds, 0.001)
+
+
+class MemoryRateLimitBackend(RateLimitBackend):
+    """
+    Keep counters in process memory, bounded to max_keys entries.
+
+    Keys are kept in least-recently-used order so that the oldest key is
+    evicted when the limit is reached. Counts are per worker process.
+    """
+
+    def __init__(self, max_keys: int = 100000):
+        self.max_keys = max_keys
+        self._entries: OrderedDict = OrderedDict()
+
+    async def hit(self, key: str, limit: int, window_seconds: int) -> float:
+
+        now = time.monotonic()
+        window = int(now // window_seconds)
+        elapsed = now - window * window_seconds
+
+        entry = self._entries.get(key)
+
+        if entry is None or entry[0] < window - 1:
+            entry = [window, 0, 0]
+        elif entry[0] == window - 1:
+            entry = [window, entry[2], 0]
+
+        entry[2] += 1
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+
+        while len(self._entries) > self.max_keys:
+            self._entries.popitem(last=False)
+
+        return _retry_after(entry[1], entry[2], limit, window_seconds, elapsed)
+
+
+class RedisRateLimitBackend(RateLimitBackend):
+    """
+    Keep counters in a Redis-protocol server shared by all workers.
+
+    Each key uses one counter per fixed window, expiring after two windows.
+    """
+
+    async def hit(self, key: str, limit: int, window_seconds: int) -> float:
+
+        now = time.time()
+        window = int(now // window_seconds)
+        elapsed = now - window * window_seconds
+
+        current_key = f"rate_limit:{key}:{window}"
+        previous_key = f"rate_limit:{key}:{window - 1}"
+
+        async with get_redis_client().pipeline(transaction=False) as pipeline:
+            pipeline.incr(current_key)
+            pipeline.expire(current_key, window_seconds * 2)
+            pipeline.get(previous_key)
+            current_count, _, previous_count = await pipeline.execute()
+
+        return _retry_after(int(previous_count or 0), current_count, limit, window_seconds, elapsed)
+
+
+_rate_limit_backend: Optional[RateLimitBackend] = None
+
+
+def get_rate_limit_backend() -> RateLimitBackend:
+    """
+    Get the process-wide rate limit backend selected by settings.RATE_LIMIT_BACKEND.
+
+    Returns:
+        RateLimitBackend: The shared backend.
+    """
+
+    global _rate_limit_backend
+
+    if _rate_limit_backend is None:
+
+        if settings.RATE_LIMIT_BACKEND == "redis":
+            _rate_limit_backend = RedisRateLimitBackend()
+        else:
+            _rate_limit_backend = MemoryRateLimitBackend(settings.RATE_LIMIT_MAX_KEYS)
+
+    return _rate_limit_backend
+
+
+class RateLimiter:
+    """
+    FastAPI dependency limiting requests per client IP and per username.
+
+    Add it to the route's dependencies so it runs before the endpoint does
+    any database or hashing work. The username is read from the query or
+    path parameter named "username" when present.
+    """
+
+    def __init__(
+        self,
+        scope: str,
+        ip_limit: int,
+        username_limit: int,
+        window_seconds: int = None,
+    ):
+        self.scope = scope
+        self.ip_limit = ip_limit
+        self.username_limit = username_limit
+        self.window_seconds = window_seconds or settings.RATE_LIMIT_WINDOW_SECONDS
+
+    async def __call__(self, request: Request) -> None:
+        """
+        Check the request against the limits of this scope.
+
+        Args:
+            request (Request): The incoming request.
+
+        Raises:
+            HTTPException: If the client IP or the username is over its limit.
+        """
+
+        if not settings.RATE_LIMIT_ENABLED:
+            return
+
+        checks = [(f"{self.scope}:ip:{self.get_client_ip(request)}", self.ip_limit)]
+
+        username = request.path_params.get("username") or request.query_params.get("username")
+        if username:
+            checks.append((f"{self.scope}:username:{username.lower()}", self.username_limit))
+
+        backend = get_rate_limit_backend()
+
+        for key, limit in checks:
+
+            try:
+                retry_after = await backend.hit(key, limit, self.window_seconds)
+            except RedisError as e:
+
+                logger.error(f'Rate limit backend unavailable, allowing request: {e}')
+
+                return
+
+            if retry_after:
+
+                logger.warning(f'Rate limit exceeded for {key}')
+
+                raise HTTPException(
+                    status_code=429,
+                    detail='Too many requests, please try again later',
+                    headers={"Retry-After": str(math.ceil(retry_after))},
+                )
+
+    @staticmethod
+    def get_client_ip(request: Request) -> str:
+        """
+        Get the IP address of the client that sent the request.
+
+        Args:
+            request (Request): The incoming request.
+
+        Returns:
+            str: The client IP address.
+        """
+
+        if settings.RATE_LIMIT_TRUST_FORWARDED_FOR:
+            forwarded_for = request.headers.get("x-forwarded-for")
+            if forwarded_for:
+                return forwarded_for.split(",", 1)[0].strip()
+
+        return request.client.host if request.client else "unknown"
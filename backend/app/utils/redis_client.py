@@ -0,0 +1,48 @@
+import settings
+from typing import Optional
+from redis.asyncio import BlockingConnectionPool
+from redis.asyncio import Redis
+from redis.exceptions import RedisError
+
+
+_redis_client: Optional[Redis] = None
+
+
+def get_redis_client() -> Redis:
+    """
+    Get the process-wide Redis client configured by settings.REDIS_URL.
+
+    Connections come from a pool of settings.REDIS_POOL_SIZE. Connecting,
+    including AUTH and SELECT, each command and waiting for a free
+    connection are all bounded by settings.REDIS_TIMEOUT_SECONDS, and every
+    failure is raised as a RedisError.
+
+    Returns:
+        Redis: The shared client.
+    """
+
+    global _redis_client
+
+    if _redis_client is None:
+        pool = BlockingConnectionPool.from_url(
+            settings.REDIS_URL,
+            max_connections=settings.REDIS_POOL_SIZE,
+            timeout=settings.REDIS_TIMEOUT_SECONDS,
+            socket_timeout=settings.REDIS_TIMEOUT_SECONDS,
+            socket_connect_timeout=settings.REDIS_TIMEOUT_SECONDS,
+        )
+        _redis_client = Redis(connection_pool=pool)
+
+    return _redis_client
+
+
+async def close_redis_client() -> None:
+    """
+    Close the connections of the shared client, if it was ever used.
+    """
+
+    global _redis_client
+
+    if _redis_client is not None:
+        await _redis_client.connection_pool.disconnect()
+        _redis_client = None
@@ -3,6 +3,10 @@ from pathlib import Path
 from jinja2 import Template
 
 
+from app.utils.server_timing import timed
+
+
+@timed("template")
 def render_html_template(*, path_file_template: str, context: dict[str, Any]) -> str:
     """
     Render an HTML template from a file with the provided context.
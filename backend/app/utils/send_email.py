@@ -3,6 +3,11 @@ import emails
 from loguru import logger
 
 
+from app.utils.metrics import EMAILS_SENT
+from app.utils.tracing import SPAN_KIND_CLIENT
+from app.utils.tracing import start_span
+
+
 async def send_email(
     *,
     email_to: str,
@@ -42,4 +47,7 @@ async def send_email(
     if settings.SMTP_PASSWORD:
         smtp_options["password"] = settings.SMTP_PASSWORD
 
-    message.send(to=email_to, smtp=smtp_options)
+    with start_span("smtp.send", SPAN_KIND_CLIENT, {"net.peer.name": settings.SMTP_HOST}):
+        response = message.send(to=email_to, smtp=smtp_options)
+
+    EMAILS_SENT.inc("sent" if response.success else "failed")
@@ -0,0 +1,164 @@
+import asyncio
+import functools
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable
+from typing import Iterator
+from typing import Optional
+from sqlalchemy import event
+
+
+from database import async_engine
+
+
+_timings: ContextVar[Optional[dict]] = ContextVar("server_timings", default=None)
+
+
+def start_server_timing() -> dict:
+    """
+    Start accounting the phases of the current request.
+
+    The accumulator is a plain dict shared by reference, so time recorded in
+    threadpool dependencies or SQLAlchemy greenlets, which run in copies of
+    the request context, lands in the same place.
+
+    Returns:
+        dict: The accumulator, mapping each phase to [seconds, count].
+    """
+
+    timings = {}
+    _timings.set(timings)
+
+    return timings
+
+
+def stop_server_timing() -> None:
+    """
+    Stop accounting the phases of the current request.
+    """
+    _timings.set(None)
+
+
+def record_timing(phase: str, seconds: float) -> None:
+    """
+    Add time to a phase of the current request, if it is being accounted.
+
+    Args:
+        phase (str): The phase name, e.g. "db".
+        seconds (float): The time spent.
+    """
+
+    timings = _timings.get()
+
+    if timings is not None:
+        entry = timings.get(phase)
+        if entry is None:
+            timings[phase] = [seconds, 1]
+        else:
+            entry[0] += seconds
+            entry[1] += 1
+
+
+@contextmanager
+def timing(phase: str) -> Iterator[None]:
+    """
+    Account the time spent in a block of code to a phase.
+
+    Args:
+        phase (str): The phase name.
+    """
+
+    if _timings.get() is None:
+        yield
+        return
+
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_timing(phase, time.perf_counter() - started)
+
+
+def timed(phase: str) -> Callable:
+    """
+    Decorate a function so that its calls are accounted to a phase.
+
+    Args:
+        phase (str): The phase name.
+
+    Returns:
+        Callable: The decorator.
+    """
+
+    def decorator(func: Callable) -> Callable:
+
+        if asyncio.iscoroutinefunction(func):
+
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                with timing(phase):
+                    return await func(*args, **kwargs)
+
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with timing(phase):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def format_server_timing(timings: dict, total: float) -> str:
+    """
+    Format the phases of a request as a Server-Timing header value.
+
+    Phases may overlap: auth, for instance, includes the query that loads
+    the user.
+
+    Args:
+        timings (dict): The accumulator returned by start_server_timing.
+        total (float): The time until the response started, in seconds.
+
+    Returns:
+        str: The header value.
+    """
+
+    metrics = [
+        f'{phase};dur={seconds * 1000:.2f};desc="{count}x"'
+        for phase, (seconds, count) in timings.items()
+    ]
+    metrics.append(f"total;dur={total * 1000:.2f}")
+
+    return ", ".join(metrics)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if _timings.get() is not None:
+        context._server_timing_started = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+
+    started = getattr(context, "_server_timing_started", None)
+
+    if started is not None:
+        context._server_timing_started = None
+        record_timing("db", time.perf_counter() - started)
+
+
+def instrument_db_timing() -> None:
+    """
+    Account the execution time of every SQL statement to the "db" phase.
+    """
+
+    engine = async_engine.sync_engine
+
+    if event.contains(engine, "before_cursor_execute", _before_cursor_execute):
+        return
+
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
@@ -0,0 +1,67 @@
+import asyncio
+import functools
+from typing import Any
+from typing import Awaitable
+from typing import Callable
+from typing import Hashable
+
+
+class SingleFlight:
+    """
+    Runs at most one call per key at a time.
+
+    Concurrent callers with the same key wait for the call already in flight
+    and share its result, or its exception. Nothing is kept once the call
+    completes, so results are never staler than a call of their own.
+
+    The call runs in a task of its own, which every caller awaits shielded:
+    cancelling any caller, including the one that started the call, only
+    cancels that caller, and the others still get the result.
+
+    The app runs on a single event loop thread, so no lock is needed.
+    """
+
+    def __init__(self):
+        self._calls: dict[Hashable, asyncio.Task] = {}
+        self.calls = 0
+        self.shared = 0
+
+    @property
+    def in_flight(self) -> int:
+        return len(self._calls)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._calls
+
+    async def do(self, key: Hashable, func: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Call func, or wait for the call already in flight for key.
+
+        Args:
+            key (Hashable): The key identifying identical calls.
+            func (Callable[[], Awaitable[Any]]): The call to make.
+
+        Returns:
+            Any: The result of the call.
+        """
+
+        task = self._calls.get(key)
+
+        if task is not None:
+            self.shared += 1
+        else:
+            self.calls += 1
+            task = asyncio.create_task(func())
+            self._calls[key] = task
+            task.add_done_callback(functools.partial(self._finish, key))
+
+        return await asyncio.shield(task)
+
+    def _finish(self, key: Hashable, task: asyncio.Task) -> None:
+
+        if self._calls.get(key) is task:
+            del self._calls[key]
+
+        # Retrieve it, so that no "exception never retrieved" is logged when every caller was cancelled.
+        if not task.cancelled():
+            task.exception()
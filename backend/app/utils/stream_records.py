@@ -0,0 +1,353 @@
+import settings
+import csv
+import orjson
+from typing import Any
+from typing import AsyncIterator
+from typing import Union
+from fastapi import HTTPException
+from fastapi import Request
+from pydantic import ValidationError
+from loguru import logger
+
+
+NDJSON_CONTENT_TYPES = (
+    "application/x-ndjson",
+    "application/ndjson",
+    "application/jsonl",
+)
+
+
+CSV_CONTENT_TYPES = (
+    "text/csv",
+    "application/csv",
+)
+
+
+class RecordError(Exception):
+    """
+    Stands in for a record of a bulk upload that could not be parsed.
+
+    It is yielded in place of the record so that callers can report it as a
+    per-item failure instead of aborting the whole upload.
+    """
+
+
+def format_validation_error(error: ValidationError) -> str:
+    """
+    Flatten a pydantic validation error into a single line.
+
+    Args:
+        error (ValidationError): The validation error.
+
+    Returns:
+        str: The flattened error message.
+    """
+
+    return "; ".join(
+        f"{'.'.join(str(loc) for loc in item['loc'])}: {item['msg']}"
+        for item in error.errors()
+    )
+
+
+async def iter_lines(request: Request) -> AsyncIterator[Union[str, RecordError]]:
+    """
+    Iterate over the lines of a streamed request body.
+
+    Only the current, incomplete line is kept in memory between chunks, and
+    at most settings.BULK_MAX_RECORD_BYTES of it.
+
+    Args:
+        request (Request): The incoming request.
+
+    Yields:
+        Union[str, RecordError]: Each non-empty line of the body, without the
+        line terminator, or a RecordError if the line is not valid UTF-8 or
+        is too long.
+    """
+
+    async for line in _iter_raw_lines(request):
+
+        if isinstance(line, RecordError):
+            yield line
+            continue
+
+        line = line.strip()
+        if line:
+            yield _decode_line(line)
+
+
+async def _iter_raw_lines(request: Request) -> AsyncIterator[Union[bytes, RecordError]]:
+
+    max_bytes = settings.BULK_MAX_RECORD_BYTES
+    too_long = RecordError(f'Line exceeds the limit of {max_bytes} bytes')
+    pending = b""
+    # Whether the rest of a line that was too long is being dropped.
+    skipping = False
+
+    async for chunk in request.stream():
+        pending += chunk
+        *lines, pending = pending.split(b"\n")
+
+        for line in lines:
+
+            if skipping:
+                skipping = False
+                continue
+
+            yield line if len(line) <= max_bytes else too_long
+
+        if len(pending) > max_bytes:
+
+            if not skipping:
+                yield too_long
+
+            pending = b""
+            skipping = True
+
+    if pending and not skipping:
+        yield pending
+
+
+def _decode_line(line: bytes) -> Union[str, RecordError]:
+
+    try:
+        return line.decode("utf-8")
+    except UnicodeDecodeError as e:
+        return RecordError(f'Invalid UTF-8: {e}')
+
+
+async def iter_request_records(
+    request: Request,
+    max_items: int,
+) -> AsyncIterator[tuple[int, Any]]:
+    """
+    Iterate over the records of a bulk upload.
+
+    NDJSON and CSV bodies are parsed line by line as they stream in; the
+    first CSV row is the header and names the fields of each record, and
+    quoted CSV fields may span lines. Lines and CSV rows longer than
+    settings.BULK_MAX_RECORD_BYTES are reported as RecordError. If there
+    are more than max_items records, one RecordError stands for all of the
+    extra ones and the rest of the body is not read, so that the records
+    before them, which may already be stored, are still reported.
+
+    Any other body must be a JSON array of at most
+    settings.BULK_MAX_BODY_BYTES, which is parsed in one go: it is rejected
+    as a whole, before any record is yielded, if it has more than max_items
+    records.
+
+    Args:
+        request (Request): The incoming request.
+        max_items (int): The maximum number of records accepted.
+
+    Yields:
+        tuple[int, Any]: The index of each record and the record itself, or a
+        RecordError if the record could not be parsed.
+
+    Raises:
+        HTTPException: If the body is not a JSON array, NDJSON stream or CSV
+            file, or is a JSON array that is too large or contains more than
+            max_items records.
+    """
+
+    content_type = request.headers.get("content-type", "").split(";", 1)[0].strip().lower()
+
+    if content_type in NDJSON_CONTENT_TYPES:
+        records = _iter_ndjson(request)
+    elif content_type in CSV_CONTENT_TYPES:
+        records = _iter_csv(request)
+    else:
+        records = _iter_json_array(request, max_items)
+
+    index = 0
+    async for record in records:
+
+        if index == max_items:
+
+            logger.error(f'Bulk upload exceeds max_items={max_items}')
+
+            yield index, RecordError(f'Bulk upload exceeds the limit of {max_items} items; the rest of it was not read')
+            await records.aclose()
+            break
+
+        yield index, record
+        index += 1
+
+
+async def _iter_ndjson(request: Request) -> AsyncIterator[Any]:
+
+    async for line in iter_lines(request):
+
+        if isinstance(line, RecordError):
+            yield line
+            continue
+
+        try:
+            yield orjson.loads(line)
+        except orjson.JSONDecodeError as e:
+            yield RecordError(f'Invalid JSON: {e}')
+
+
+async def _iter_csv_rows(request: Request) -> AsyncIterator[Union[str, RecordError]]:
+
+    # A line ends a row only when the row has an even number of quotes so far;
+    # otherwise the line break is part of a quoted field and the row goes on.
+    lines = []
+    size = 0
+    quotes = 0
+
+    async for line in _iter_raw_lines(request):
+
+        if isinstance(line, RecordError):
+            lines = []
+            size = 0
+            quotes = 0
+            yield line
+            continue
+
+        lines.append(line)
+        size += len(line) + 1
+        quotes += line.count(b'"')
+
+        if quotes % 2 and size <= settings.BULK_MAX_RECORD_BYTES:
+            continue
+
+        row = b"\n".join(lines).strip()
+        unterminated = quotes % 2
+        lines = []
+        size = 0
+        quotes = 0
+
+        if unterminated:
+            yield RecordError(f'CSV row exceeds the limit of {settings.BULK_MAX_RECORD_BYTES} bytes')
+        elif row:
+            yield _decode_line(row)
+
+    if lines:
+        yield RecordError('Unterminated quoted CSV field')
+
+
+async def _iter_csv(request: Request) -> AsyncIterator[Any]:
+
+    header = None
+
+    async for row in _iter_csv_rows(request):
+
+        if not isinstance(row, RecordError):
+            try:
+                values = next(csv.reader([row]))
+            except csv.Error as e:
+                row = RecordError(f'Invalid CSV row: {e}')
+
+        if isinstance(row, RecordError):
+
+            if header is None:
+                raise HTTPException(
+                    status_code=400,
+                    detail=f'Invalid CSV header: {row}'
+                )
+
+            yield row
+            continue
+
+        if header is None:
+            header = [name.strip().lstrip("\ufeff") for name in values]
+            continue
+
+        if len(values) != len(header):
+            yield RecordError(f'Expected {len(header)} CSV columns, got {len(values)}')
+            continue
+
+        yield {name: value for name, value in zip(header, values) if value != ""}
+
+
+async def _read_body(request: Request, max_bytes: int) -> bytes:
+
+    content_length = request.headers.get("content-length", "")
+
+    if content_length.isdigit() and int(content_length) > max_bytes:
+        _raise_body_too_large(max_bytes)
+
+    body = bytearray()
+
+    async for chunk in request.stream():
+        body += chunk
+
+        if len(body) > max_bytes:
+            _raise_body_too_large(max_bytes)
+
+    return bytes(body)
+
+
+def _raise_body_too_large(max_bytes: int) -> None:
+
+    logger.error(f'Bulk upload exceeds max_bytes={max_bytes}')
+
+    raise HTTPException(
+        status_code=413,
+        detail=f'Bulk upload JSON body exceeds the limit of {max_bytes} bytes; send larger uploads as NDJSON or CSV'
+    )
+
+
+async def _iter_json_array(request: Request, max_items: int) -> AsyncIterator[Any]:
+
+    body = await _read_body(request, settings.BULK_MAX_BODY_BYTES)
+
+    try:
+        records = orjson.loads(body)
+    except orjson.JSONDecodeError as e:
+
+        logger.error(f'Invalid JSON body: {e}')
+
+        raise HTTPException(
+            status_code=400,
+            detail=f'Invalid JSON body: {e}'
+        )
+
+    if not isinstance(records, list):
+        raise HTTPException(
+            status_code=400,
+            detail='Request body must be a JSON array, an NDJSON stream or a CSV file'
+        )
+
+    if len(records) > max_items:
+
+        logger.error(f'Bulk upload exceeds max_items={max_items}')
+
+        raise HTTPException(
+            status_code=413,
+            detail=f'Bulk upload exceeds the limit of {max_items} items'
+        )
+
+    del body
+
+    for record in records:
+        yield record
+
+
+async def chunked(
+    records: AsyncIterator[Any],
+    size: int,
+) -> AsyncIterator[list[Any]]:
+    """
+    Group an async iterator into lists of at most size items.
+
+    Args:
+        records (AsyncIterator[Any]): The items to group.
+        size (int): The maximum size of each group.
+
+    Yields:
+        list[Any]: The next group of items.
+    """
+
+    chunk = []
+
+    async for record in records:
+        chunk.append(record)
+
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+
+    if chunk:
+        yield chunk
@@ -0,0 +1,414 @@
+import settings
+import asyncio
+import functools
+import os
+import random
+import re
+import time
+import urllib.request
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable
+from typing import Iterator
+from typing import Optional
+import orjson
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from loguru import logger
+
+
+from database import async_engine
+
+
+SPAN_KIND_INTERNAL = 1
+SPAN_KIND_SERVER = 2
+SPAN_KIND_CLIENT = 3
+
+STATUS_OK = 1
+STATUS_ERROR = 2
+
+
+TRACEPARENT_PATTERN = re.compile(r"^00-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})$")
+
+
+class Span:
+    """
+    One timed operation of a sampled trace.
+    """
+
+    __slots__ = (
+        "trace_id",
+        "span_id",
+        "parent_id",
+        "name",
+        "kind",
+        "start_ns",
+        "end_ns",
+        "attributes",
+        "status",
+        "status_message",
+    )
+
+    def __init__(
+        self,
+        name: str,
+        trace_id: str,
+        parent_id: Optional[str] = None,
+        kind: int = SPAN_KIND_INTERNAL,
+        attributes: dict = None,
+    ):
+        self.trace_id = trace_id
+        self.span_id = os.urandom(8).hex()
+        self.parent_id = parent_id
+        self.name = name
+        self.kind = kind
+        self.start_ns = time.time_ns()
+        self.end_ns = None
+        self.attributes = attributes or {}
+        self.status = STATUS_OK
+        self.status_message = ""
+
+    def set_error(self, error: BaseException) -> None:
+        self.status = STATUS_ERROR
+        self.status_message = f"{type(error).__name__}: {error}"
+
+    def end(self) -> None:
+        self.end_ns = time.time_ns()
+        _export_queue.append(self)
+
+    def traceparent(self) -> str:
+        return f"00-{self.trace_id}-{self.span_id}-01"
+
+    def to_otlp(self) -> dict:
+
+        span = {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "name": self.name,
+            "kind": self.kind,
+            "startTimeUnixNano": str(self.start_ns),
+            "endTimeUnixNano": str(self.end_ns),
+            "attributes": [
+                {"key": key, "value": _otlp_value(value)}
+                for key, value in self.attributes.items()
+            ],
+            "status": {"code": self.status, "message": self.status_message},
+        }
+
+        if self.parent_id:
+            span["parentSpanId"] = self.parent_id
+
+        return span
+
+
+def _otlp_value(value) -> dict:
+
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+
+    return {"stringValue": str(value)}
+
+
+_current_span: ContextVar[Optional[Span]] = ContextVar("current_span", default=None)
+_export_queue: deque = deque(maxlen=settings.TRACING_MAX_QUEUE_SIZE)
+
+
+def get_current_span() -> Optional[Span]:
+    """
+    Get the innermost open span of the current request, if it is sampled.
+
+    Returns:
+        Optional[Span]: The current span, or None outside a sampled trace.
+    """
+    return _current_span.get()
+
+
+def parse_traceparent(value: Optional[str]) -> Optional[tuple[str, str, bool]]:
+    """
+    Parse a W3C traceparent header.
+
+    Args:
+        value (Optional[str]): The raw header value.
+
+    Returns:
+        Optional[tuple[str, str, bool]]: The trace id, the parent span id and
+        whether the caller sampled the trace, or None if the header is
+        missing or malformed.
+    """
+
+    if not value:
+        return None
+
+    match = TRACEPARENT_PATTERN.match(value.strip().lower())
+    if not match:
+        return None
+
+    trace_id, parent_id, flags = match.groups()
+    if trace_id == "0" * 32 or parent_id == "0" * 16:
+        return None
+
+    return trace_id, parent_id, bool(int(flags, 16) & 1)
+
+
+def start_trace(name: str, traceparent: Optional[str] = None, attributes: dict = None) -> Optional[Span]:
+    """
+    Start the root span of a request, if the request is sampled.
+
+    A request continues the trace of its caller when it carries a valid
+    traceparent header, and follows the caller's sampling decision.
+    Otherwise a new trace is sampled with probability
+    settings.TRACING_SAMPLE_RATE.
+
+    Args:
+        name (str): The name of the root span.
+        traceparent (Optional[str], optional): The incoming traceparent header.
+        attributes (dict, optional): The attributes of the root span.
+
+    Returns:
+        Optional[Span]: The root span, made current, or None if not sampled.
+    """
+
+    parent = parse_traceparent(traceparent)
+
+    if parent:
+        trace_id, parent_id, sampled = parent
+    else:
+        trace_id, parent_id = os.urandom(16).hex(), None
+        sampled = random.random() < settings.TRACING_SAMPLE_RATE
+
+    if not sampled:
+        return None
+
+    span = Span(name, trace_id, parent_id, SPAN_KIND_SERVER, attributes)
+    _current_span.set(span)
+
+    return span
+
+
+def end_trace(span: Span) -> None:
+    """
+    End the root span of a request and leave its trace.
+
+    Args:
+        span (Span): The root span returned by start_trace.
+    """
+
+    _current_span.set(None)
+    span.end()
+
+
+@contextmanager
+def start_span(name: str, kind: int = SPAN_KIND_INTERNAL, attributes: dict = None) -> Iterator[Optional[Span]]:
+    """
+    Time a block of code as a child of the current span.
+
+    Outside a sampled trace this does nothing and yields None.
+
+    Args:
+        name (str): The name of the span.
+        kind (int, optional): The OpenTelemetry span kind. Defaults to internal.
+        attributes (dict, optional): The attributes of the span.
+
+    Yields:
+        Optional[Span]: The span, or None if the trace is not sampled.
+    """
+
+    parent = _current_span.get()
+
+    if parent is None:
+        yield None
+        return
+
+    span = Span(name, parent.trace_id, parent.span_id, kind, attributes)
+    token = _current_span.set(span)
+
+    try:
+        yield span
+    except BaseException as e:
+        span.set_error(e)
+        raise
+    finally:
+        _current_span.reset(token)
+        span.end()
+
+
+def traced(name: str = None) -> Callable:
+    """
+    Decorate a function so that every call is timed as a span.
+
+    The wrapped function keeps its signature, so it can still be used as a
+    FastAPI dependency.
+
+    Args:
+        name (str, optional): The name of the span. Defaults to the qualified
+            name of the function.
+
+    Returns:
+        Callable: The decorator.
+    """
+
+    def decorator(func: Callable) -> Callable:
+
+        span_name = name or f"{func.__module__}.{func.__qualname__}"
+
+        if asyncio.iscoroutinefunction(func):
+
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                if _current_span.get() is None:
+                    return await func(*args, **kwargs)
+                with start_span(span_name):
+                    return await func(*args, **kwargs)
+
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if _current_span.get() is None:
+                return func(*args, **kwargs)
+            with start_span(span_name):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+
+    parent = _current_span.get()
+
+    if parent is not None:
+        context._trace_span = Span(
+            statement.split(None, 1)[0].upper() if statement else "SQL",
+            parent.trace_id,
+            parent.span_id,
+            SPAN_KIND_CLIENT,
+            {"db.system": "postgresql", "db.statement": statement[:1000]},
+        )
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+
+    span = getattr(context, "_trace_span", None)
+
+    if span is not None:
+        context._trace_span = None
+        span.attributes["db.rows"] = cursor.rowcount
+        span.end()
+
+
+def _handle_error(exception_context):
+
+    context = exception_context.execution_context
+    span = getattr(context, "_trace_span", None)
+
+    if span is not None:
+        context._trace_span = None
+        span.set_error(exception_context.original_exception)
+        span.end()
+
+
+def _before_commit(session):
+
+    parent = _current_span.get()
+
+    if parent is not None:
+        session.info["trace_commit_span"] = Span("COMMIT", parent.trace_id, parent.span_id, SPAN_KIND_CLIENT)
+
+
+def _after_commit(session):
+
+    span = session.info.pop("trace_commit_span", None)
+
+    if span is not None:
+        span.end()
+
+
+def _after_rollback(session):
+
+    span = session.info.pop("trace_commit_span", None)
+
+    if span is not None:
+        span.status = STATUS_ERROR
+        span.status_message = "Rolled back"
+        span.end()
+
+
+def instrument_sqlalchemy() -> None:
+    """
+    Record every SQL statement and session commit of a sampled trace as a span.
+    """
+
+    engine = async_engine.sync_engine
+
+    if event.contains(engine, "before_cursor_execute", _before_cursor_execute):
+        return
+
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+    event.listen(engine, "handle_error", _handle_error)
+    event.listen(Session, "before_commit", _before_commit)
+    event.listen(Session, "after_commit", _after_commit)
+    event.listen(Session, "after_rollback", _after_rollback)
+
+
+def _post(url: str, body: bytes) -> None:
+
+    request = urllib.request.Request(url, data=body, headers={"Content-Type": "application/json"}, method="POST")
+
+    with urllib.request.urlopen(request, timeout=5):
+        pass
+
+
+async def export_spans() -> int:
+    """
+    Export the finished spans as OTLP/JSON.
+
+    Spans are appended, one export request per line, to
+    settings.TRACING_EXPORT_FILE, and/or posted to the OTLP/HTTP endpoint
+    settings.TRACING_OTLP_ENDPOINT. When the queue overflows between two
+    exports, the oldest spans are dropped.
+
+    Returns:
+        int: The number of spans exported.
+    """
+
+    spans = []
+    while _export_queue:
+        spans.append(_export_queue.popleft())
+
+    if not spans:
+        return 0
+
+    body = orjson.dumps({
+        "resourceSpans": [{
+            "resource": {
+                "attributes": [
+                    {"key": "service.name", "value": {"stringValue": settings.TRACING_SERVICE_NAME}},
+                    {"key": "process.pid", "value": {"intValue": str(os.getpid())}},
+                ],
+            },
+            "scopeSpans": [{
+                "scope": {"name": __name__},
+                "spans": [span.to_otlp() for span in spans],
+            }],
+        }],
+    })
+
+    if settings.TRACING_EXPORT_FILE:
+        with open(settings.TRACING_EXPORT_FILE, "ab") as file:
+            file.write(body + b"\n")
+
+    if settings.TRACING_OTLP_ENDPOINT:
+        try:
+            await asyncio.to_thread(_post, settings.TRACING_OTLP_ENDPOINT, body)
+        except OSError as e:
+            logger.warning(f'Could not export {len(spans)} spans to {settings.TRACING_OTLP_ENDPOINT}: {e}')
+
+    return len(spans)
@@ -0,0 +1,66 @@
+from typing import Awaitable
+from typing import Callable
+from fastapi import Response
+from fastapi.responses import ORJSONResponse
+from pydantic import BaseModel
+
+
+from app.utils.cache import Cache
+from app.utils.server_timing import timed
+from app.utils.tracing import traced
+
+
+@traced("serialize")
+@timed("serialize")
+def typed_response(
+    model: BaseModel,
+    status_code: int = 200,
+) -> ORJSONResponse:
+    """
+    Serialize an already-typed response model with orjson.
+
+    FastAPI re-validates whatever an endpoint returns against its
+    response_model and runs it through jsonable_encoder. Returning a Response
+    skips both steps, so endpoints build their model once (from_orm for
+    items, construct for the envelope) and hand it over here.
+
+    Args:
+        model (BaseModel): The response model to serialize.
+        status_code (int, optional): The HTTP status code. Defaults to 200.
+
+    Returns:
+        ORJSONResponse: The serialized response.
+    """
+
+    return ORJSONResponse(content=model.dict(), status_code=status_code)
+
+
+async def cached_response(
+    cache: Cache,
+    key,
+    render: Callable[[], Awaitable[Response]],
+) -> Response:
+    """
+    Serve a response from the encoded bytes kept in a cache.
+
+    On a miss, render builds the response, once per key however many
+    requests miss together, and its body is stored. A hit skips the
+    database, the response models and the JSON encoding altogether.
+    Exceptions raised by render, such as a 404, are not cached.
+
+    Args:
+        cache (Cache): The cache of encoded bodies.
+        key: The key of the response, built from its route parameters.
+        render (Callable[[], Awaitable[Response]]): Builds the response.
+
+    Returns:
+        Response: The response.
+    """
+
+    async def load() -> bytes:
+        response = await render()
+        return response.body
+
+    body = await cache.get_or_load(key, load)
+
+    return Response(content=body, media_type=ORJSONResponse.media_type)
@@ -0,0 +1,40 @@
+"""
+Pick the bcrypt cost that fits a login latency budget on this machine.
+
+Run it on the deployment hardware and set PASSWORD_BCRYPT_ROUNDS to the
+suggested value. Existing hashes are upgraded (or downgraded) to the new
+cost the next time their owner logs in.
+
+Usage:
+    python -m benchmarks.bcrypt_calibration --target-ms 250
+"""
+import argparse
+
+
+from app.auth.utils.password_manager import calibrate_bcrypt_rounds
+
+
+def main() -> None:
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--target-ms", type=float, default=250.0, help="Latency budget of one hash")
+    parser.add_argument("--min-rounds", type=int, default=10)
+    parser.add_argument("--max-rounds", type=int, default=16)
+    parser.add_argument("--samples", type=int, default=3)
+    args = parser.parse_args()
+
+    rounds, timings = calibrate_bcrypt_rounds(args.target_ms, args.min_rounds, args.max_rounds, args.samples)
+
+    print(f"{'rounds':<8}{'ms/hash':>10}")
+    for cost, milliseconds in timings.items():
+        marker = "  <- chosen" if cost == rounds else ""
+        print(f"{cost:<8}{milliseconds:>10.1f}{marker}")
+
+    if timings[rounds] > args.target_ms:
+        print(f"\nEven {rounds} rounds exceed {args.target_ms:.0f} ms; consider faster hardware or a lower --min-rounds.")
+
+    print(f"\nPASSWORD_BCRYPT_ROUNDS={rounds}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+"""
+Benchmark bulk inserts against the one-row-per-request path.
+
+Needs a migrated database and the usual environment variables. Posts and
+comments are created for the default admin user and deleted again
+afterwards.
+
+Usage:
+    python -m benchmarks.bulk_insert --items 5000
+"""
+import argparse
+import asyncio
+import time
+
+
+import settings
+from database import get_db_session
+from sqlalchemy import delete
+
+
+from app.auth.services.universal import get_user_by_username
+from app.post.models.posts import Post
+from app.post.schema.comments import CreateCommentRequest
+from app.post.schema.posts import CreatePostRequest
+from app.post.services.comments import bulk_create_comments
+from app.post.services.comments import create_new_comment
+from app.post.services.posts import bulk_create_posts
+from app.post.services.posts import create_new_post
+
+
+def make_records(count: int, tag: str) -> list[dict]:
+
+    return [
+        {"title": f"[bench-{tag}] post {i}", "content": "Lorem ipsum dolor sit amet. " * 20}
+        for i in range(count)
+    ]
+
+
+async def aiter_records(records: list[dict]):
+
+    for index, record in enumerate(records):
+        yield index, record
+
+
+async def cleanup(user_id: int) -> None:
+
+    async with get_db_session() as session:
+        await session.execute(delete(Post).where(Post.user_id == user_id, Post.title.like("[bench-%")))
+        await session.commit()
+
+
+def report(name: str, count: int, seconds: float) -> None:
+
+    print(f"{name:<24}{count:>8}{seconds:>10.2f}{count / seconds:>12.0f}")
+
+
+async def bench_posts(user_id: int, items: int, single_items: int) -> None:
+
+    records = make_records(single_items, "single")
+    started = time.perf_counter()
+    for record in records:
+        await create_new_post(user_id, CreatePostRequest(**record))
+    report("posts one by one", single_items, time.perf_counter() - started)
+
+    records = make_records(items, "bulk")
+    started = time.perf_counter()
+    results = await bulk_create_posts(user_id, aiter_records(records))
+    assert all(result.success for result in results)
+    report("posts bulk", items, time.perf_counter() - started)
+
+
+async def bench_comments(user_id: int, items: int, single_items: int) -> None:
+
+    post = await create_new_post(user_id, CreatePostRequest(title="[bench-comments] post", content="Comment thread"))
+
+    started = time.perf_counter()
+    for i in range(single_items):
+        await create_new_comment(user_id, post.id, CreateCommentRequest(text=f"comment {i}"))
+    report("comments one by one", single_items, time.perf_counter() - started)
+
+    records = [{"text": f"comment {i}", "user_id": user_id} for i in range(items)]
+    started = time.perf_counter()
+    results = await bulk_create_comments(user_id, post.id, aiter_records(records))
+    assert all(result.success for result in results)
+    report("comments bulk", items, time.perf_counter() - started)
+
+
+async def run(items: int, single_items: int) -> None:
+
+    user = await get_user_by_username(settings.ADMIN_DEFAULT_USERNAME)
+
+    print(f"{'path':<24}{'items':>8}{'seconds':>10}{'items/s':>12}")
+
+    try:
+        await bench_posts(user.id, items, single_items)
+        await bench_comments(user.id, items, single_items)
+    finally:
+        await cleanup(user.id)
+
+
+def main() -> None:
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--items", type=int, default=5000)
+    parser.add_argument("--single-items", type=int, default=200)
+    args = parser.parse_args()
+
+    asyncio.run(run(args.items, args.single_items))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,168 @@
+"""
+Benchmark the CPU cost versus bytes saved of response compression.
+
+By default the payloads are built with the real response schemas of
+``GET /api/posts?limit=100`` and ``GET /api/users``. Pass ``--url`` (and
+``--token`` for admin-only endpoints) to benchmark the bodies returned by a
+running server instead.
+
+Usage:
+    python -m benchmarks.compression
+    python -m benchmarks.compression --url http://localhost:5000/api/posts?limit=100
+"""
+import argparse
+import json
+import random
+import statistics
+import string
+import time
+import urllib.request
+import zlib
+from datetime import datetime
+
+
+from app.auth.schema.auth import UserResponse
+from app.auth.schema.users import GetAllUsersResponse
+from app.post.schema.posts import GetAllPostsResponse
+from app.post.schema.posts import PostResponse
+
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+VOCABULARY = []
+
+
+def _words(count: int) -> str:
+
+    if not VOCABULARY:
+        VOCABULARY.extend(
+            "".join(random.choices(string.ascii_lowercase, k=random.randint(2, 10)))
+            for _ in range(2000)
+        )
+
+    return " ".join(random.choices(VOCABULARY, k=count))
+
+
+def build_posts_payload(limit: int = 100, words_per_post: int = 300) -> bytes:
+
+    now = datetime.now()
+    response = GetAllPostsResponse(
+        success=True,
+        message="Get all posts successfully",
+        posts=[
+            PostResponse(
+                id=i,
+                title=_words(8),
+                content=_words(words_per_post),
+                updated_at=now,
+                created_at=now,
+            )
+            for i in range(limit)
+        ],
+    )
+    return response.json().encode()
+
+
+def build_users_payload(count: int = 500) -> bytes:
+
+    now = datetime.now()
+    response = GetAllUsersResponse(
+        success=True,
+        message="Get all users successful",
+        users=[
+            UserResponse(
+                id=i,
+                name=_words(2),
+                age=random.randint(18, 80),
+                username=f"user_{i}",
+                email=f"user_{i}@example.com",
+                is_admin=False,
+                created_at=now,
+                updated_at=now,
+                is_enable_otp=bool(i % 2),
+                is_logged_out=bool(i % 3),
+            )
+            for i in range(count)
+        ],
+    )
+    return response.json().encode()
+
+
+def fetch_payload(url: str, token: str = None) -> bytes:
+
+    request = urllib.request.Request(url, headers={"Accept-Encoding": "identity"})
+    if token:
+        request.add_header("Authorization", f"Bearer {token}")
+
+    with urllib.request.urlopen(request) as response:
+        return response.read()
+
+
+def codecs() -> list:
+
+    result = [
+        (f"gzip-{level}", lambda data, level=level: zlib.compress(data, level))
+        for level in (1, 6, 9)
+    ]
+
+    if brotli is not None:
+        result += [
+            (f"br-{quality}", lambda data, quality=quality: brotli.compress(data, quality=quality))
+            for quality in (1, 4, 6, 11)
+        ]
+
+    return result
+
+
+def bench(name: str, payload: bytes, repeat: int) -> None:
+
+    print(f"\n{name}: {len(payload) / 1024:.1f} KiB uncompressed")
+    print(f"{'codec':<10}{'size KiB':>10}{'ratio':>8}{'saved':>8}{'ms':>9}{'MiB/s':>9}")
+
+    for codec_name, compress in codecs():
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            compressed = compress(payload)
+            timings.append(time.perf_counter() - started)
+
+        seconds = statistics.median(timings)
+        print(
+            f"{codec_name:<10}"
+            f"{len(compressed) / 1024:>10.1f}"
+            f"{len(payload) / len(compressed):>8.1f}"
+            f"{1 - len(compressed) / len(payload):>8.0%}"
+            f"{seconds * 1000:>9.2f}"
+            f"{len(payload) / seconds / 2 ** 20:>9.0f}"
+        )
+
+
+def main() -> None:
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", action="append", default=[], help="Benchmark the body of this endpoint")
+    parser.add_argument("--token", default=None, help="Bearer token for authenticated endpoints")
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    random.seed(0)
+
+    if args.url:
+        payloads = [(url, fetch_payload(url, args.token)) for url in args.url]
+    else:
+        payloads = [
+            ("GET /api/posts?limit=100", build_posts_payload()),
+            ("GET /api/users (500 users)", build_users_payload()),
+        ]
+
+    for name, payload in payloads:
+        json.loads(payload)
+        bench(name, payload, args.repeat)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+"""
+Count the SQL statements and time of one login, before and after the
+single-load login pipeline.
+
+The previous pipeline is replayed step by step: authentication_user,
+update_user, OtpHandler.generate_otp_qr_code_base64 and encode_token, each
+loading the user again. Needs a migrated database and the usual
+environment variables. A throwaway user is created and deleted again.
+
+Usage:
+    python -m benchmarks.login_queries --rounds 20
+"""
+import argparse
+import asyncio
+import statistics
+import time
+from datetime import timedelta
+
+
+from database import async_engine
+from database import get_db_session
+from sqlalchemy import delete
+from sqlalchemy import event
+
+
+from app.auth.models.users import User
+from app.auth.services.login import login_with_password
+from app.auth.services.universal import add_user_with_password_hash
+from app.auth.services.universal import authentication_user
+from app.auth.services.universal import update_user
+from app.auth.utils.auth_handler import AuthHandler
+from app.auth.utils.otp_handler import OtpHandler
+from app.auth.utils.password_manager import PasswordManager
+
+
+USERNAME = "bench_login_user"
+PASSWORD = "bench-login-password"
+
+
+class StatementCounter:
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, *args) -> None:
+        self.count += 1
+
+
+async def legacy_login() -> None:
+
+    user = await authentication_user(USERNAME, PASSWORD)
+    await update_user(user.username, is_logged_out=False)
+
+    if not user.is_enable_otp:
+        await OtpHandler().generate_otp_qr_code_base64(user.username)
+
+    await AuthHandler().encode_token(
+        username=user.username,
+        access_token_expires=timedelta(minutes=10),
+        otp_expires=timedelta(minutes=0),
+    )
+
+
+async def single_load_login() -> None:
+
+    user, _ = await login_with_password(USERNAME, PASSWORD)
+
+    await AuthHandler().encode_token(
+        username=user.username,
+        access_token_expires=timedelta(minutes=10),
+        otp_expires=timedelta(minutes=0),
+        user=user,
+    )
+
+
+async def log_out() -> None:
+
+    await update_user(USERNAME, is_logged_out=True)
+
+
+async def measure(name: str, login, rounds: int, counter: StatementCounter) -> None:
+
+    statements = []
+    timings = []
+
+    for _ in range(rounds):
+        await log_out()
+
+        counter.count = 0
+        started = time.perf_counter()
+        await login()
+        timings.append(time.perf_counter() - started)
+        statements.append(counter.count)
+
+    print(f"{name:<12}{statistics.mean(statements):>12.1f}{statistics.median(timings) * 1000:>12.1f}")
+
+
+async def run(rounds: int) -> None:
+
+    await add_user_with_password_hash(User(
+        name="Bench Login",
+        age=20,
+        username=USERNAME,
+        email=f"{USERNAME}@example.com",
+        password=PasswordManager().get_password_hash(PASSWORD),
+    ))
+
+    counter = StatementCounter()
+    event.listen(async_engine.sync_engine, "before_cursor_execute", counter)
+
+    print(f"{'pipeline':<12}{'queries':>12}{'median ms':>12}")
+
+    try:
+        await measure("legacy", legacy_login, rounds, counter)
+        await measure("single-load", single_load_login, rounds, counter)
+    finally:
+        event.remove(async_engine.sync_engine, "before_cursor_execute", counter)
+
+        async with get_db_session() as session:
+            await session.execute(delete(User).where(User.username == USERNAME))
+            await session.commit()
+
+
+def main() -> None:
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rounds", type=int, default=20)
+    args = parser.parse_args()
+
+    asyncio.run(run(args.rounds))
+
+
+if __name__ == "__main__":
+    main()
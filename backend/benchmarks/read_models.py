@@ -0,0 +1,135 @@
+"""
+Compare the memory and time of large listings loaded as ORM instances
+and as column-projected read models.
+
+Each variant runs in its own process against an in-memory SQLite copy of
+the schema, so that its peak RSS is not polluted by the other one. The
+previous path selects whole entities (every column, instrumented
+instances); the current path selects the columns of PostRow or
+UserSnapshot into named tuples.
+
+Usage:
+    python -m benchmarks.read_models --rows 100000
+"""
+import argparse
+import gc
+import multiprocessing
+import resource
+import time
+import tracemalloc
+from datetime import datetime
+
+
+from sqlalchemy import create_engine
+from sqlalchemy import insert
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+
+from database import Base
+from app.auth.models.users import User
+from app.auth.utils.user_cache import USER_SNAPSHOT_COLUMNS
+from app.auth.utils.user_cache import UserSnapshot
+from app.post.models.posts import Post
+from app.post.services.posts import POST_ROW_COLUMNS
+from app.post.services.posts import PostRow
+
+
+def seed(engine, rows: int) -> None:
+
+    now = datetime.now()
+
+    with engine.begin() as connection:
+        connection.execute(insert(User), [
+            {
+                "name": f"User {i}",
+                "age": 30,
+                "username": f"user{i}",
+                "email": f"user{i}@example.com",
+                "password": "$2b$12$" + "x" * 53,
+                "is_admin": False,
+                "is_enable_otp": True,
+                "otp_secret": "JBSWY3DPEHPK3PXP" * 2,
+                "otp_recovery": [f"{i:08d}{j:02d}" for j in range(10)],
+                "is_logged_out": False,
+                "created_at": now,
+                "updated_at": now,
+            }
+            for i in range(rows)
+        ])
+        connection.execute(insert(Post), [
+            {
+                "title": f"Post title {i}",
+                "content": "Lorem ipsum dolor sit amet. " * 40,
+                "user_id": i + 1,
+                "created_at": now,
+                "updated_at": now,
+            }
+            for i in range(rows)
+        ])
+
+
+def load_entities(session: Session, model) -> list:
+    return session.execute(select(model)).scalars().all()
+
+
+def load_read_models(session: Session, columns: tuple, read_model) -> list:
+    return [read_model(*row) for row in session.execute(select(*columns))]
+
+
+VARIANTS = {
+    "posts orm": lambda session: load_entities(session, Post),
+    "posts rows": lambda session: load_read_models(session, POST_ROW_COLUMNS, PostRow),
+    "users orm": lambda session: load_entities(session, User),
+    "users rows": lambda session: load_read_models(session, USER_SNAPSHOT_COLUMNS, UserSnapshot),
+}
+
+
+def run_variant(name: str, rows: int, results) -> None:
+
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    seed(engine, rows)
+    gc.collect()
+
+    rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    tracemalloc.start()
+    started = time.perf_counter()
+
+    with Session(engine) as session:
+        loaded = VARIANTS[name](session)
+
+    elapsed = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    rss_after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    assert len(loaded) == rows
+
+    # ru_maxrss is in KiB on Linux.
+    results[name] = (elapsed, peak, (rss_after - rss_before) * 1024)
+
+
+def main() -> None:
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=100000)
+    args = parser.parse_args()
+
+    context = multiprocessing.get_context("spawn")
+    results = context.Manager().dict()
+
+    for name in VARIANTS:
+        process = context.Process(target=run_variant, args=(name, args.rows, results))
+        process.start()
+        process.join()
+
+    print(f"{args.rows}-row listing")
+    print(f"{'variant':<12}{'ms':>10}{'us/row':>10}{'peak MiB':>10}{'RSS MiB':>10}")
+    for name in VARIANTS:
+        elapsed, peak, rss = results[name]
+        print(f"{name:<12}{elapsed * 1000:>10.1f}{elapsed / args.rows * 1e6:>10.2f}{peak / 2**20:>10.1f}{rss / 2**20:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+"""
+Benchmark the per-item cost of serializing list responses.
+
+Compares the previous path (field-by-field PostResponse construction,
+envelope validation, FastAPI re-validation against response_model,
+jsonable_encoder and stdlib json) with the typed_response path
+(from_orm items, constructed envelope, orjson) on 100-item listings.
+
+Usage:
+    python -m benchmarks.serialization
+"""
+import argparse
+import asyncio
+import statistics
+import time
+from datetime import datetime
+from types import SimpleNamespace
+
+
+from fastapi.responses import JSONResponse
+from fastapi.routing import serialize_response
+from fastapi.utils import create_model_field
+
+
+from app.post.schema.posts import GetAllPostsResponse
+from app.post.schema.posts import PostResponse
+from app.utils.typed_response import typed_response
+
+
+def build_rows(count: int) -> list:
+
+    now = datetime.now()
+
+    return [
+        SimpleNamespace(
+            id=i,
+            title=f"Post title {i}",
+            content="Lorem ipsum dolor sit amet. " * 40,
+            user_id=1,
+            created_at=now,
+            updated_at=now,
+        )
+        for i in range(count)
+    ]
+
+
+RESPONSE_FIELD = create_model_field(name="Response_get_all_posts", type_=GetAllPostsResponse, mode="serialization")
+
+
+async def legacy_path(posts: list) -> bytes:
+
+    response = GetAllPostsResponse(
+        success=True,
+        message='Get all posts successfully',
+        posts=[
+            PostResponse(
+                id=post.id,
+                title=post.title,
+                content=post.content,
+                updated_at=post.updated_at,
+                created_at=post.created_at,
+            )
+            for post in posts
+        ]
+    )
+    content = await serialize_response(field=RESPONSE_FIELD, response_content=response)
+    return JSONResponse(content).body
+
+
+async def typed_path(posts: list) -> bytes:
+
+    response = GetAllPostsResponse.construct(
+        success=True,
+        message='Get all posts successfully',
+        posts=[PostResponse.from_orm(post) for post in posts],
+    )
+    return typed_response(response).body
+
+
+async def measure(path, posts: list, repeat: int) -> float:
+
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        await path(posts)
+        timings.append(time.perf_counter() - started)
+
+    return statistics.median(timings)
+
+
+async def run(count: int, repeat: int) -> None:
+
+    posts = build_rows(count)
+
+    legacy = await measure(legacy_path, posts, repeat)
+    typed = await measure(typed_path, posts, repeat)
+
+    print(f"{count}-item listing, median of {repeat} runs")
+    print(f"{'path':<8}{'total ms':>10}{'us/item':>10}")
+    print(f"{'legacy':<8}{legacy * 1000:>10.2f}{legacy / count * 1e6:>10.1f}")
+    print(f"{'typed':<8}{typed * 1000:>10.2f}{typed / count * 1e6:>10.1f}")
+    print(f"per-item cost reduced by {1 - typed / legacy:.0%}")
+
+
+def main() -> None:
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--items", type=int, default=100)
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+
+    asyncio.run(run(args.items, args.repeat))
+
+
+if __name__ == "__main__":
+    main()
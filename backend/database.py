@@ -1,6 +1,10 @@
 import settings
+import asyncio
 from loguru import logger
 from contextlib import asynccontextmanager
+from sqlalchemy import delete
+from sqlalchemy import func
+from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.ext.asyncio import create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
@@ -9,9 +13,16 @@ from sqlalchemy.orm import sessionmaker
 
 session = "placeholder"
 
+# Timestamps are filled with LOCALTIMESTAMP by the database and compared
+# with datetime.now() by the app, so sessions use the time zone of the app.
+connect_args = {"server_settings": {"timezone": settings.POSTGRES_TIMEZONE}}
+
 async_engine = create_async_engine(
     settings.SQLALCHEMY_DATABASE_URL,
     echo=False,
+    pool_size=settings.POSTGRES_POOL_SIZE,
+    max_overflow=settings.POSTGRES_MAX_OVERFLOW,
+    connect_args=connect_args,
 )
 
 
@@ -53,4 +64,88 @@ async def get_db():
         yield session
 
 
+async def reserve_ids(session: AsyncSession, column, count: int) -> list[int]:
+    """
+    Take count values from the sequence of a serial primary key column.
+
+    Rows inserted with these ids set explicitly are matched to their ids by
+    the caller, instead of relying on the order of the rows RETURNING gives.
+
+    Args:
+        session (AsyncSession): The session to take the values in.
+        column: The serial column, e.g. Post.id.
+        count (int): The number of ids to take.
+
+    Returns:
+        list[int]: The ids, unused by any other row.
+    """
+
+    sequence = func.pg_get_serial_sequence(column.table.name, column.name)
+    statement = select(func.nextval(sequence)).select_from(func.generate_series(1, count))
+    result = await session.execute(statement)
+
+    return result.scalars().all()
+
+
+
+async def purge_in_batches(
+    model,
+    condition,
+    batch_size: int = None,
+    pause_seconds: float = None,
+) -> int:
+    """
+    Delete the rows of model matching condition in batches.
+
+    Each batch of at most batch_size rows is deleted in its own short
+    transaction, with a pause in between, so that a purge never holds locks
+    or connections for long. Rows locked by another transaction are skipped
+    until the next purge.
+
+    Args:
+        model: The mapped class, whose primary key is id.
+        condition: The WHERE clause of the rows to delete.
+        batch_size (int, optional): The maximum number of rows per DELETE.
+            Defaults to settings.MAINTENANCE_DELETE_BATCH_SIZE.
+        pause_seconds (float, optional): The pause between batches.
+            Defaults to settings.MAINTENANCE_BATCH_PAUSE_SECONDS.
+
+    Returns:
+        int: The number of rows deleted.
+    """
+
+    batch_size = batch_size or settings.MAINTENANCE_DELETE_BATCH_SIZE
+    pause_seconds = settings.MAINTENANCE_BATCH_PAUSE_SECONDS if pause_seconds is None else pause_seconds
+
+    logger.info(f'Purge {model.__tablename__} with batch_size={batch_size}')
+
+    batch = (
+        select(model.id)
+        .where(condition)
+        .limit(batch_size)
+        .with_for_update(skip_locked=True)
+        .scalar_subquery()
+    )
+    statement = (
+        delete(model)
+        .where(model.id.in_(batch))
+        .execution_options(synchronize_session=False)
+    )
+
+    deleted = 0
+
+    while True:
+
+        async with get_db_session() as session:
+            result = await session.execute(statement)
+            await session.commit()
+
+        deleted += result.rowcount
+
+        if result.rowcount < batch_size:
+            return deleted
+
+        await asyncio.sleep(pause_seconds)
+
+
 Base = declarative_base()
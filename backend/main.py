@@ -1,16 +1,31 @@
 import settings
 import uvicorn
 from fastapi import FastAPI
+from fastapi.responses import ORJSONResponse
+from fastapi.responses import PlainTextResponse
+from fastapi.responses import Response
+from fastapi import Request
 from fastapi.middleware.cors import CORSMiddleware
 from loguru import logger
 
 
 from utils.lifespan import lifespan
+from utils.compression import CompressionMiddleware
+from utils.metrics_middleware import MetricsMiddleware
+from utils.tracing_middleware import TracingMiddleware
+from utils.server_timing_middleware import ServerTimingMiddleware
+from app.utils.metrics import CONTENT_TYPE as METRICS_CONTENT_TYPE
+from app.utils.metrics import render_metrics
+from app.utils.tracing import instrument_sqlalchemy
+from app.utils.server_timing import instrument_db_timing
+from app.utils.health import check_readiness
+from app.auth.utils.jwt_keys import get_key_ring
 from index_router import index_router
 
 
 app = FastAPI(
-    lifespan=lifespan
+    lifespan=lifespan,
+    default_response_class=ORJSONResponse,
 )
 
 
@@ -23,6 +38,32 @@ app.add_middleware(
 )
 
 
+if settings.COMPRESSION_ENABLED:
+    app.add_middleware(
+        CompressionMiddleware,
+        minimum_size=settings.COMPRESSION_MINIMUM_SIZE,
+        compressible_types=tuple(settings.COMPRESSION_CONTENT_TYPES),
+        gzip_level=settings.COMPRESSION_GZIP_LEVEL,
+        brotli_quality=settings.COMPRESSION_BROTLI_QUALITY,
+        enable_brotli=settings.COMPRESSION_BROTLI_ENABLED,
+    )
+
+
+if settings.SERVER_TIMING_ENABLED:
+    instrument_db_timing()
+    app.add_middleware(ServerTimingMiddleware)
+
+
+if settings.TRACING_ENABLED:
+    instrument_sqlalchemy()
+    app.add_middleware(TracingMiddleware)
+
+
+# Added last so that it is the outermost middleware and times the others too.
+if settings.METRICS_ENABLED:
+    app.add_middleware(MetricsMiddleware)
+
+
 app.include_router(index_router, prefix="/api")
 
 
@@ -31,6 +72,46 @@ def root():
     return {"message": "Hello World"}
 
 
+@app.get("/healthz", include_in_schema=False)
+async def healthz():
+    return ORJSONResponse({"status": "ok"})
+
+
+@app.get("/readyz", include_in_schema=False)
+async def readyz():
+
+    ready, checks = await check_readiness()
+
+    return ORJSONResponse(
+        {"status": "ok" if ready else "unavailable", "checks": checks},
+        status_code=200 if ready else 503,
+    )
+
+
+if settings.JWT_KEYS_DIR:
+
+    @app.get("/.well-known/jwks.json", include_in_schema=False)
+    async def jwks(request: Request):
+
+        key_ring = get_key_ring()
+        headers = {
+            "Cache-Control": f"public, max-age={settings.JWKS_MAX_AGE_SECONDS}",
+            "ETag": key_ring.jwks_etag,
+        }
+
+        if key_ring.jwks_etag in request.headers.get("if-none-match", ""):
+            return Response(status_code=304, headers=headers)
+
+        return Response(key_ring.jwks, media_type="application/json", headers=headers)
+
+
+if settings.METRICS_ENABLED:
+
+    @app.get("/metrics", include_in_schema=False)
+    async def metrics():
+        return PlainTextResponse(await render_metrics(), media_type=METRICS_CONTENT_TYPE)
+
+
 if __name__ == "__main__":
 
     logger.info(f"Starting application with FASTAPI_ENVIRONMENT={settings.FASTAPI_ENVIRONMENT}")
@@ -9,6 +9,7 @@ from environs import Env
 from database import Base
 from app.auth.models.users import User
 from app.auth.models.users import ResetPassword
+from app.auth.models.users import RefreshToken
 from app.post.models.posts import Post
 from app.post.models.comments import Comment
 
@@ -0,0 +1,32 @@
+"""hash reset password tokens
+
+Revision ID: 4bed4c791daa
+Revises: e6d9e52cf851
+Create Date: 2026-10-19 09:12:44.318502
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '4bed4c791daa'
+down_revision: Union[str, None] = 'e6d9e52cf851'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Pending secrets are bcrypt hashes that can no longer be looked up.
+    op.execute("UPDATE reset_password SET secret = NULL")
+    op.add_column('reset_password', sa.Column('expires_at', sa.DateTime(), nullable=True))
+    op.create_index(op.f('ix_reset_password_expires_at'), 'reset_password', ['expires_at'], unique=False)
+    op.create_index(op.f('ix_reset_password_secret'), 'reset_password', ['secret'], unique=True)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_reset_password_secret'), table_name='reset_password')
+    op.drop_index(op.f('ix_reset_password_expires_at'), table_name='reset_password')
+    op.drop_column('reset_password', 'expires_at')
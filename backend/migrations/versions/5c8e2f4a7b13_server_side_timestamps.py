@@ -0,0 +1,53 @@
+"""server side timestamps
+
+Revision ID: 5c8e2f4a7b13
+Revises: 9d1f3a7c2e58
+Create Date: 2026-10-19 17:05:12.904311
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5c8e2f4a7b13'
+down_revision: Union[str, None] = '9d1f3a7c2e58'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+TABLES = ('users', 'reset_password', 'refresh_tokens', 'posts', 'comments')
+
+
+def upgrade() -> None:
+    # An UPDATE that sets updated_at itself keeps its value.
+    op.execute("""
+        CREATE FUNCTION set_updated_at() RETURNS trigger AS $$
+        BEGIN
+            IF NEW.updated_at IS NOT DISTINCT FROM OLD.updated_at THEN
+                NEW.updated_at := LOCALTIMESTAMP;
+            END IF;
+            RETURN NEW;
+        END;
+        $$ LANGUAGE plpgsql
+    """)
+
+    for table in TABLES:
+        op.alter_column(table, 'created_at', server_default=sa.text('LOCALTIMESTAMP'))
+        op.alter_column(table, 'updated_at', server_default=sa.text('LOCALTIMESTAMP'))
+        op.execute(f"""
+            CREATE TRIGGER {table}_set_updated_at
+            BEFORE UPDATE ON {table}
+            FOR EACH ROW EXECUTE PROCEDURE set_updated_at()
+        """)
+
+
+def downgrade() -> None:
+    for table in reversed(TABLES):
+        op.execute(f"DROP TRIGGER {table}_set_updated_at ON {table}")
+        op.alter_column(table, 'updated_at', server_default=None)
+        op.alter_column(table, 'created_at', server_default=None)
+
+    op.execute("DROP FUNCTION set_updated_at()")
@@ -8,8 +8,9 @@ os.environ['TZ'] = 'Asia/Ho_Chi_Minh'
 time.tzset()
 
 
+LOG_DIR = "logging"
 log_file_format = "{time:YYYY-MM-DD}.log"
-logger.add(f"logging/{log_file_format}", rotation="00:00", retention="7 days", enqueue=True)
+logger.add(f"{LOG_DIR}/{log_file_format}", rotation="00:00", retention="7 days", enqueue=True)
 
 
 env = Env()
@@ -30,7 +31,18 @@ RESET_PASSWORD_EXPIRED_MINUTES = env.int("RESET_PASSWORD_EXPIRED_MINUTES")
 JWT_SECRET = env.str("JWT_SECRET")
 JWT_ALGORITHM = env.str("JWT_ALGORITHM")
 ACCESS_TOKEN_EXPIRE_MINUTES = env.int("ACCESS_TOKEN_EXPIRE_MINUTES")
+JWT_KEYS_DIR = env.str("JWT_KEYS_DIR", default="")
+JWT_SIGNING_KEY_ID = env.str("JWT_SIGNING_KEY_ID", default="")
+JWKS_MAX_AGE_SECONDS = env.int("JWKS_MAX_AGE_SECONDS", default=300)
 OTP_EXPIRE_MINUTES = env.int("OTP_EXPIRE_MINUTES")
+OTP_VALID_WINDOW = env.int("OTP_VALID_WINDOW", default=0)
+OTP_REPLAY_BACKEND = env.str("OTP_REPLAY_BACKEND", default="memory")
+OTP_REPLAY_MAX_KEYS = env.int("OTP_REPLAY_MAX_KEYS", default=100000)
+
+
+RESET_PASSWORD_TOKEN_KEY = env.str("RESET_PASSWORD_TOKEN_KEY", default="")
+REFRESH_TOKEN_KEY = env.str("REFRESH_TOKEN_KEY", default="")
+REFRESH_TOKEN_EXPIRE_DAYS = env.int("REFRESH_TOKEN_EXPIRE_DAYS", default=14)
 
 
 POSTGRES_HOST = env.str("POSTGRES_HOST", default="localhost")
@@ -40,6 +52,9 @@ POSTGRES_PASSWORD = env.str("POSTGRES_PASSWORD", default="postgres")
 POSTGRES_DB = env.str("POSTGRES_DB", default="postgres")
 SQLALCHEMY_DATABASE_URL = f"postgresql+asyncpg://{POSTGRES_USER}:{POSTGRES_PASSWORD}@{POSTGRES_HOST}:{POSTGRES_PORT}/{POSTGRES_DB}"
 SQLALCHEMY_DATABASE_URL = env.str("SQLALCHEMY_DATABASE_URL", default=SQLALCHEMY_DATABASE_URL)
+POSTGRES_POOL_SIZE = env.int("POSTGRES_POOL_SIZE", default=5)
+POSTGRES_MAX_OVERFLOW = env.int("POSTGRES_MAX_OVERFLOW", default=10)
+POSTGRES_TIMEZONE = env.str("POSTGRES_TIMEZONE", default=os.environ["TZ"])
 
 
 logger.info(f">>> POSTGRES_USER = {POSTGRES_USER}")
@@ -56,6 +71,100 @@ EMAILS_FROM_NAME = env.str("EMAILS_FROM_NAME", default="Vũ Văn Nghĩa - Authen
 EMAILS_FROM_EMAIL = env.str("EMAILS_FROM_EMAIL", default="no-reply.vu.van.nghia@mailhog.com")
 
 
+BULK_CHUNK_SIZE = env.int("BULK_CHUNK_SIZE", default=500)
+BULK_MAX_ITEMS = env.int("BULK_MAX_ITEMS", default=50000)
+BULK_MAX_BODY_BYTES = env.int("BULK_MAX_BODY_BYTES", default=64 * 1024 * 1024)
+BULK_MAX_RECORD_BYTES = env.int("BULK_MAX_RECORD_BYTES", default=1024 * 1024)
+PASSWORD_HASH_WORKERS = env.int("PASSWORD_HASH_WORKERS", default=os.cpu_count() or 1)
+
+
+PASSWORD_HASH_SCHEMES = env.list("PASSWORD_HASH_SCHEMES", default=["bcrypt"])
+PASSWORD_BCRYPT_ROUNDS = env.int("PASSWORD_BCRYPT_ROUNDS", default=12)
+PASSWORD_BCRYPT_MIN_ROUNDS = env.int("PASSWORD_BCRYPT_MIN_ROUNDS", default=PASSWORD_BCRYPT_ROUNDS)
+PASSWORD_BCRYPT_MAX_ROUNDS = env.int("PASSWORD_BCRYPT_MAX_ROUNDS", default=PASSWORD_BCRYPT_ROUNDS)
+
+
+REDIS_URL = env.str("REDIS_URL", default="redis://localhost:6379/0")
+REDIS_POOL_SIZE = env.int("REDIS_POOL_SIZE", default=10)
+REDIS_TIMEOUT_SECONDS = env.float("REDIS_TIMEOUT_SECONDS", default=1)
+
+
+CACHE_ENABLED = env.bool("CACHE_ENABLED", default=True)
+CACHE_BACKEND = env.str("CACHE_BACKEND", default="memory")
+CACHE_MAX_ENTRIES = env.int("CACHE_MAX_ENTRIES", default=50000)
+CACHE_DEFAULT_TTL_SECONDS = env.float("CACHE_DEFAULT_TTL_SECONDS", default=60)
+CACHE_USER_TTL_SECONDS = env.float("CACHE_USER_TTL_SECONDS", default=300)
+CACHE_USER_MAX_ENTRIES = env.int("CACHE_USER_MAX_ENTRIES", default=10000)
+CACHE_POST_TTL_SECONDS = env.float("CACHE_POST_TTL_SECONDS", default=300)
+CACHE_LIST_TTL_SECONDS = env.float("CACHE_LIST_TTL_SECONDS", default=10)
+CACHE_RESPONSE_TTL_SECONDS = env.float("CACHE_RESPONSE_TTL_SECONDS", default=5)
+INVALIDATION_ENABLED = env.bool("INVALIDATION_ENABLED", default=True)
+INVALIDATION_CHANNEL = env.str("INVALIDATION_CHANNEL", default="cache_invalidation")
+INVALIDATION_COALESCE_SECONDS = env.float("INVALIDATION_COALESCE_SECONDS", default=0.05)
+INVALIDATION_RECONNECT_SECONDS = env.float("INVALIDATION_RECONNECT_SECONDS", default=5)
+INVALIDATION_KEEPALIVE_SECONDS = env.float("INVALIDATION_KEEPALIVE_SECONDS", default=30)
+
+
+RATE_LIMIT_ENABLED = env.bool("RATE_LIMIT_ENABLED", default=True)
+RATE_LIMIT_BACKEND = env.str("RATE_LIMIT_BACKEND", default="memory")
+RATE_LIMIT_MAX_KEYS = env.int("RATE_LIMIT_MAX_KEYS", default=100000)
+RATE_LIMIT_WINDOW_SECONDS = env.int("RATE_LIMIT_WINDOW_SECONDS", default=60)
+RATE_LIMIT_TRUST_FORWARDED_FOR = env.bool("RATE_LIMIT_TRUST_FORWARDED_FOR", default=False)
+RATE_LIMIT_LOGIN_PER_IP = env.int("RATE_LIMIT_LOGIN_PER_IP", default=30)
+RATE_LIMIT_LOGIN_PER_USERNAME = env.int("RATE_LIMIT_LOGIN_PER_USERNAME", default=10)
+RATE_LIMIT_PASSWORD_RESET_PER_IP = env.int("RATE_LIMIT_PASSWORD_RESET_PER_IP", default=10)
+RATE_LIMIT_PASSWORD_RESET_PER_USERNAME = env.int("RATE_LIMIT_PASSWORD_RESET_PER_USERNAME", default=3)
+
+
+SCHEDULER_ENABLED = env.bool("SCHEDULER_ENABLED", default=True)
+SCHEDULER_JITTER_SECONDS = env.float("SCHEDULER_JITTER_SECONDS", default=30)
+MAINTENANCE_RESET_TOKEN_INTERVAL_SECONDS = env.int("MAINTENANCE_RESET_TOKEN_INTERVAL_SECONDS", default=3600)
+MAINTENANCE_REFRESH_TOKEN_INTERVAL_SECONDS = env.int("MAINTENANCE_REFRESH_TOKEN_INTERVAL_SECONDS", default=3600)
+MAINTENANCE_LOG_PRUNE_INTERVAL_SECONDS = env.int("MAINTENANCE_LOG_PRUNE_INTERVAL_SECONDS", default=86400)
+MAINTENANCE_DELETE_BATCH_SIZE = env.int("MAINTENANCE_DELETE_BATCH_SIZE", default=1000)
+MAINTENANCE_BATCH_PAUSE_SECONDS = env.float("MAINTENANCE_BATCH_PAUSE_SECONDS", default=0.1)
+LOG_RETENTION_DAYS = env.int("LOG_RETENTION_DAYS", default=7)
+
+
+METRICS_ENABLED = env.bool("METRICS_ENABLED", default=True)
+METRICS_MULTIPROCESS_DIR = env.str("METRICS_MULTIPROCESS_DIR", default="")
+METRICS_FLUSH_INTERVAL_SECONDS = env.float("METRICS_FLUSH_INTERVAL_SECONDS", default=10)
+
+
+TRACING_ENABLED = env.bool("TRACING_ENABLED", default=False)
+TRACING_SAMPLE_RATE = env.float("TRACING_SAMPLE_RATE", default=0.01)
+TRACING_SERVICE_NAME = env.str("TRACING_SERVICE_NAME", default="backend")
+TRACING_EXPORT_FILE = env.str("TRACING_EXPORT_FILE", default="")
+TRACING_OTLP_ENDPOINT = env.str("TRACING_OTLP_ENDPOINT", default="")
+TRACING_EXPORT_INTERVAL_SECONDS = env.float("TRACING_EXPORT_INTERVAL_SECONDS", default=5)
+TRACING_MAX_QUEUE_SIZE = env.int("TRACING_MAX_QUEUE_SIZE", default=10000)
+
+
+SERVER_TIMING_ENABLED = env.bool("SERVER_TIMING_ENABLED", default=False)
+
+
+HEALTH_CHECK_TIMEOUT_SECONDS = env.float("HEALTH_CHECK_TIMEOUT_SECONDS", default=1.0)
+HEALTH_CHECK_CACHE_SECONDS = env.float("HEALTH_CHECK_CACHE_SECONDS", default=2.0)
+HEALTH_MIN_POOL_HEADROOM = env.int("HEALTH_MIN_POOL_HEADROOM", default=1)
+HEALTH_MAX_LOOP_LAG_SECONDS = env.float("HEALTH_MAX_LOOP_LAG_SECONDS", default=0.5)
+HEALTH_LOOP_LAG_INTERVAL_SECONDS = env.float("HEALTH_LOOP_LAG_INTERVAL_SECONDS", default=0.5)
+HEALTH_CHECK_SMTP = env.bool("HEALTH_CHECK_SMTP", default=False)
+
+
+COMPRESSION_ENABLED = env.bool("COMPRESSION_ENABLED", default=True)
+COMPRESSION_MINIMUM_SIZE = env.int("COMPRESSION_MINIMUM_SIZE", default=1024)
+COMPRESSION_GZIP_LEVEL = env.int("COMPRESSION_GZIP_LEVEL", default=6)
+COMPRESSION_BROTLI_ENABLED = env.bool("COMPRESSION_BROTLI_ENABLED", default=True)
+COMPRESSION_BROTLI_QUALITY = env.int("COMPRESSION_BROTLI_QUALITY", default=4)
+COMPRESSION_CONTENT_TYPES = env.list("COMPRESSION_CONTENT_TYPES", default=[
+    "application/json",
+    "text/html",
+    "text/plain",
+    "text/css",
+    "application/javascript",
+])
+
+
 ADMIN_DEFAULT_NAME = env.str("ADMIN_DEFAULT_NAME", default="admin_name")
 ADMIN_DEFAULT_AGE = env.int("ADMIN_DEFAULT_AGE", default=20)
 ADMIN_DEFAULT_USERNAME = env.str("ADMIN_DEFAULT_USERNAME", default="admin_username")
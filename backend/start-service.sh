@@ -4,4 +4,10 @@ bash /wait-for-it.sh ${POSTGRES_HOST}:${POSTGRES_PORT-5432} -- echo ">>> ${POSTG
 
 cd /app
 alembic upgrade head
+
+# Metrics snapshots of a previous run must not add to the totals of this one.
+if [ -n "${METRICS_MULTIPROCESS_DIR}" ]; then
+    rm -rf "${METRICS_MULTIPROCESS_DIR:?}"
+fi
+
 python main.py
@@ -0,0 +1,14 @@
+import os
+import sys
+
+
+# settings reads these when first imported; the tests need no real services.
+os.environ.setdefault("ISSUER_NAME", "tests")
+os.environ.setdefault("JWT_SECRET", "tests-jwt-secret")
+os.environ.setdefault("JWT_ALGORITHM", "HS256")
+os.environ.setdefault("ACCESS_TOKEN_EXPIRE_MINUTES", "5")
+os.environ.setdefault("OTP_EXPIRE_MINUTES", "30")
+os.environ.setdefault("RESET_PASSWORD_EXPIRED_MINUTES", "10")
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
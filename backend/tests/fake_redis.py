@@ -0,0 +1,149 @@
+import asyncio
+import fnmatch
+import time
+from typing import Optional
+
+
+class FakeRedisServer:
+    """
+    A local server speaking enough of the Redis protocol (RESP2) for the
+    commands the app sends: GET, SET with PX, EX and NX, MGET, DEL, SCAN,
+    INCRBY and EXPIRE, plus the handshake of redis-py.
+
+    Set fail to make every command answer with an error reply, to test how
+    callers fall through when Redis is unavailable.
+    """
+
+    def __init__(self):
+        self.data: dict[bytes, tuple[bytes, Optional[float]]] = {}
+        self.commands: list[tuple] = []
+        self.fail = False
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._handlers: set[asyncio.Task] = set()
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.sockets[0].getsockname()[:2]
+        return f"redis://{host}:{port}/0"
+
+    async def start(self) -> "FakeRedisServer":
+        self._server = await asyncio.start_server(self._handle, "127.0.0.1", 0)
+        return self
+
+    async def stop(self) -> None:
+
+        self._server.close()
+
+        for task in self._handlers:
+            task.cancel()
+        await asyncio.gather(*self._handlers, return_exceptions=True)
+
+        await self._server.wait_closed()
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+
+        task = asyncio.current_task()
+        self._handlers.add(task)
+
+        try:
+            while True:
+                command = await self._read_command(reader)
+                if command is None:
+                    return
+                self.commands.append(command)
+                writer.write(self._execute(command))
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError, asyncio.CancelledError):
+            pass
+        finally:
+            self._handlers.discard(task)
+            writer.close()
+
+    async def _read_command(self, reader: asyncio.StreamReader) -> Optional[tuple]:
+
+        line = await reader.readline()
+
+        if not line:
+            return None
+
+        args = []
+        for _ in range(int(line[1:-2])):
+            length = int((await reader.readline())[1:-2])
+            args.append((await reader.readexactly(length + 2))[:-2])
+
+        return tuple(args)
+
+    def _get(self, key: bytes) -> Optional[bytes]:
+
+        entry = self.data.get(key)
+
+        if entry is None:
+            return None
+
+        value, expires_at = entry
+
+        if expires_at is not None and expires_at <= time.monotonic():
+            del self.data[key]
+            return None
+
+        return value
+
+    def _execute(self, command: tuple) -> bytes:
+
+        name = command[0].upper()
+        args = command[1:]
+
+        if name in (b"CLIENT", b"SELECT", b"AUTH", b"PING"):
+            return b"+OK\r\n"
+
+        if self.fail:
+            return b"-ERR fake failure\r\n"
+
+        if name == b"GET":
+            return _bulk(self._get(args[0]))
+
+        if name == b"MGET":
+            return b"*%d\r\n" % len(args) + b"".join(_bulk(self._get(key)) for key in args)
+
+        if name == b"SET":
+            options = [arg.upper() for arg in args[2:]]
+            if b"NX" in options and self._get(args[0]) is not None:
+                return b"$-1\r\n"
+            expires_at = None
+            if b"PX" in options:
+                expires_at = time.monotonic() + int(args[2 + options.index(b"PX") + 1]) / 1000
+            if b"EX" in options:
+                expires_at = time.monotonic() + int(args[2 + options.index(b"EX") + 1])
+            self.data[args[0]] = (args[1], expires_at)
+            return b"+OK\r\n"
+
+        if name == b"DEL":
+            deleted = sum(self._get(key) is not None and self.data.pop(key) is not None for key in args)
+            return b":%d\r\n" % deleted
+
+        if name == b"SCAN":
+            options = [arg.upper() for arg in args[1:]]
+            pattern = args[1 + options.index(b"MATCH") + 1].decode() if b"MATCH" in options else "*"
+            keys = [key for key in list(self.data) if self._get(key) is not None and fnmatch.fnmatchcase(key.decode(), pattern)]
+            return b"*2\r\n$1\r\n0\r\n*%d\r\n" % len(keys) + b"".join(_bulk(key) for key in keys)
+
+        if name == b"INCRBY":
+            value = int(self._get(args[0]) or 0) + int(args[1])
+            self.data[args[0]] = (str(value).encode(), self.data.get(args[0], (None, None))[1])
+            return b":%d\r\n" % value
+
+        if name == b"EXPIRE":
+            if self._get(args[0]) is None:
+                return b":0\r\n"
+            self.data[args[0]] = (self.data[args[0]][0], time.monotonic() + int(args[1]))
+            return b":1\r\n"
+
+        return b"-ERR unknown command '%s'\r\n" % name
+
+
+def _bulk(value: Optional[bytes]) -> bytes:
+
+    if value is None:
+        return b"$-1\r\n"
+
+    return b"$%d\r\n%s\r\n" % (len(value), value)
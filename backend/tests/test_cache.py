@@ -0,0 +1,187 @@
+import asyncio
+import pytest
+
+
+import settings
+from app.utils.cache import MISSING
+from app.utils.cache import Cache
+from app.utils.cache import CacheBackend
+from app.utils.cache import MemoryCacheBackend
+from app.utils.cache import RedisCacheBackend
+from app.utils.metrics import SINGLE_FLIGHT_CALLS
+from app.utils.redis_client import close_redis_client
+from fake_redis import FakeRedisServer
+
+
+@pytest.fixture
+def fake_redis_url(monkeypatch):
+    """
+    Start a fake Redis server for the test and point settings.REDIS_URL at it.
+
+    The test body is a coroutine function taking the server, run on its own
+    event loop together with the server.
+    """
+
+    def run(test):
+
+        async def main():
+            server = await FakeRedisServer().start()
+            monkeypatch.setattr(settings, "REDIS_URL", server.url)
+            try:
+                await test(server)
+            finally:
+                await close_redis_client()
+                await server.stop()
+
+        asyncio.run(main())
+
+    return run
+
+
+def test_backend_is_abstract():
+    with pytest.raises(TypeError):
+        CacheBackend()
+
+
+async def check_backend(backend: CacheBackend) -> None:
+
+    await backend.set_many({"a:1": {"v": 1}, "a:2": [2], "b:1": "b"}, ttl_seconds=60)
+
+    assert await backend.get_many(["a:1", "a:9", "a:2"]) == [{"v": 1}, MISSING, [2]]
+
+    await backend.set_many({"a:short": 1}, ttl_seconds=0.05)
+    assert await backend.get_many(["a:short"]) == [1]
+    await asyncio.sleep(0.1)
+    assert await backend.get_many(["a:short"]) == [MISSING]
+
+    await backend.delete_many(["a:2"])
+    assert await backend.get_many(["a:2"]) == [MISSING]
+
+    await backend.clear("a:")
+    assert await backend.get_many(["a:1", "b:1"]) == [MISSING, "b"]
+
+
+def test_memory_backend():
+    asyncio.run(check_backend(MemoryCacheBackend()))
+
+
+def test_memory_backend_evicts_least_recently_used():
+
+    async def test():
+        backend = MemoryCacheBackend(max_entries=2)
+        await backend.set_many({"a:1": 1, "a:2": 2}, ttl_seconds=60)
+        await backend.get_many(["a:1"])
+        await backend.set_many({"a:3": 3}, ttl_seconds=60)
+        assert await backend.get_many(["a:1", "a:2", "a:3"]) == [1, MISSING, 3]
+
+    asyncio.run(test())
+
+
+def test_redis_backend(fake_redis_url):
+
+    async def test(server):
+        await check_backend(RedisCacheBackend())
+
+    fake_redis_url(test)
+
+
+def test_cache_get_or_load_and_get_many():
+
+    async def test():
+        cache = Cache("posts", 60, backend=MemoryCacheBackend())
+        loads = []
+
+        async def loader():
+            loads.append(1)
+            await asyncio.sleep(0.01)
+            return "post"
+
+        results = await asyncio.gather(*(cache.get_or_load("id:1", loader) for _ in range(5)))
+        assert results == ["post"] * 5
+        assert len(loads) == 1
+
+        assert await cache.get_or_load("id:1", loader) == "post"
+        assert len(loads) == 1
+
+        assert await cache.get_many(["id:1", "id:2"]) == {"id:1": "post"}
+
+    asyncio.run(test())
+
+
+def test_cache_falls_through_backend_errors(fake_redis_url):
+
+    async def test(server):
+        server.fail = True
+        cache = Cache("posts", 60, backend=RedisCacheBackend())
+
+        async def loader():
+            return "post"
+
+        assert await cache.get_or_load("id:1", loader) == "post"
+        assert await cache.get("id:1", "default") == "default"
+        await cache.clear()
+        assert cache.stats()["errors"] == 4
+
+        server.fail = False
+        await cache.set("id:1", "post")
+        assert await cache.get("id:1") == "post"
+
+    fake_redis_url(test)
+
+
+def test_cache_skips_loads_that_raced_with_an_invalidation():
+
+    async def test():
+        cache = Cache("posts", 60, backend=MemoryCacheBackend())
+
+        async def loader():
+            cache._on_invalidation(frozenset({"id:1"}))
+            return "stale"
+
+        assert await cache.get_or_load("id:1", loader) == "stale"
+        assert await cache.get("id:1") is None
+
+    asyncio.run(test())
+
+
+def test_redis_backend_keeps_pending_invalidations(fake_redis_url):
+
+    async def test(server):
+        backend = RedisCacheBackend()
+        await backend.set_many({"a:1": 1, "a:2": 2}, ttl_seconds=60)
+
+        backend.invalidate(["a:1"], "a:")
+        assert len(backend._invalidations) == 1
+
+        while backend._invalidations:
+            await asyncio.sleep(0.01)
+
+        assert await backend.get_many(["a:1", "a:2"]) == [MISSING, 2]
+
+    fake_redis_url(test)
+
+
+def test_cache_coalesces_loads_when_disabled(monkeypatch):
+
+    monkeypatch.setattr(settings, "CACHE_ENABLED", False)
+
+    async def test():
+        cache = Cache("disabled_posts", 60, backend=MemoryCacheBackend())
+        loads = []
+
+        async def loader():
+            loads.append(1)
+            await asyncio.sleep(0.01)
+            return "post"
+
+        results = await asyncio.gather(*(cache.get_or_load("id:1", loader) for _ in range(3)))
+
+        assert results == ["post"] * 3
+        assert len(loads) == 1
+        assert SINGLE_FLIGHT_CALLS.dump() == {
+            **SINGLE_FLIGHT_CALLS.dump(),
+            ("disabled_posts", "executed"): 1,
+            ("disabled_posts", "shared"): 2,
+        }
+
+    asyncio.run(test())
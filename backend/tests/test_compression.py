@@ -0,0 +1,75 @@
+import asyncio
+import gzip
+from starlette.datastructures import Headers
+
+
+from utils.compression import CompressionMiddleware
+
+
+def call(body: bytes, accept_encoding: str = "", content_type: str = "application/json", vary: str = "") -> tuple[Headers, bytes]:
+
+    async def app(scope, receive, send):
+
+        headers = [(b"content-type", content_type.encode()), (b"content-length", str(len(body)).encode())]
+        if vary:
+            headers.append((b"vary", vary.encode()))
+
+        await send({"type": "http.response.start", "status": 200, "headers": headers})
+        await send({"type": "http.response.body", "body": body, "more_body": False})
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    messages = []
+
+    async def send(message):
+        messages.append(message)
+
+    scope = {
+        "type": "http",
+        "method": "GET",
+        "path": "/",
+        "headers": [(b"accept-encoding", accept_encoding.encode())] if accept_encoding else [],
+    }
+
+    middleware = CompressionMiddleware(app, minimum_size=100, enable_brotli=False)
+    asyncio.run(middleware(scope, receive, send))
+
+    return Headers(raw=messages[0]["headers"]), b"".join(m.get("body", b"") for m in messages[1:])
+
+
+def test_large_body_is_compressed_and_varies():
+
+    body = b'{"a": "' + b"x" * 200 + b'"}'
+    headers, sent = call(body, "gzip")
+
+    assert headers["content-encoding"] == "gzip"
+    assert headers["vary"] == "Accept-Encoding"
+    assert gzip.decompress(sent) == body
+
+
+def test_small_body_is_not_compressed_but_varies():
+
+    headers, sent = call(b"{}", "gzip")
+
+    assert "content-encoding" not in headers
+    assert headers["vary"] == "Accept-Encoding"
+    assert sent == b"{}"
+
+
+def test_identity_response_varies_when_client_does_not_accept_compression():
+
+    body = b"x" * 200
+    headers, sent = call(body, content_type="text/plain", vary="Origin")
+
+    assert "content-encoding" not in headers
+    assert headers["vary"] == "Origin, Accept-Encoding"
+    assert sent == body
+
+
+def test_non_compressible_type_does_not_vary():
+
+    headers, sent = call(b"x" * 200, "gzip", content_type="image/png")
+
+    assert "vary" not in headers
+    assert "content-encoding" not in headers
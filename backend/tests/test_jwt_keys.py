@@ -0,0 +1,43 @@
+import pytest
+from cryptography.hazmat.primitives.asymmetric import ed25519
+
+
+from app.auth.utils.jwt_keys import KeyRing
+from app.auth.utils.jwt_keys import SigningKey
+
+
+def make_key(kid: str) -> SigningKey:
+    return SigningKey(kid, private_key=ed25519.Ed25519PrivateKey.generate())
+
+
+def test_single_private_key_signs():
+
+    old = make_key("old")
+    retired = SigningKey("retired", public_key=ed25519.Ed25519PrivateKey.generate().public_key())
+
+    key_ring = KeyRing([old, retired])
+
+    assert key_ring.signing_key is old
+
+
+def test_several_private_keys_require_a_signing_key_id():
+
+    old, new = make_key("old"), make_key("new")
+
+    with pytest.raises(ValueError):
+        KeyRing([old, new])
+
+    with pytest.raises(ValueError):
+        KeyRing([old, new], "missing")
+
+    assert KeyRing([old, new], "old").signing_key is old
+
+
+def test_tokens_of_either_key_verify_during_rotation():
+
+    old, new = make_key("old"), make_key("new")
+    before = KeyRing([old, new], "old")
+    after = KeyRing([old, new], "new")
+
+    assert after.decode(before.encode({"sub": "1"})) == {"sub": "1"}
+    assert before.decode(after.encode({"sub": "2"})) == {"sub": "2"}
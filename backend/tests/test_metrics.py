@@ -0,0 +1,43 @@
+import asyncio
+import os
+import orjson
+
+
+import settings
+from app.utils.metrics import AGGREGATE_SNAPSHOT
+from app.utils.metrics import EMAILS_SENT
+from app.utils.metrics import render_metrics
+
+
+def write_snapshot(directory, name: str, sent: int) -> None:
+    with open(os.path.join(directory, name), "wb") as file:
+        file.write(orjson.dumps({EMAILS_SENT.name: [[["success"], sent]]}))
+
+
+def sent_total(text: str) -> float:
+    return sum(
+        float(line.rsplit(" ", 1)[1])
+        for line in text.splitlines()
+        if line.startswith(f'{EMAILS_SENT.name}{{outcome="success"}}')
+    )
+
+
+def test_exited_workers_are_folded_into_one_snapshot(tmp_path, monkeypatch):
+
+    monkeypatch.setattr(settings, "METRICS_MULTIPROCESS_DIR", str(tmp_path))
+    own = EMAILS_SENT.dump().get(("success",), 0)
+
+    # A worker whose pid was reused, and a snapshot named by pid only.
+    write_snapshot(tmp_path, "1-0.json", 3)
+    write_snapshot(tmp_path, "99999999.json", 4)
+
+    assert sent_total(asyncio.run(render_metrics())) == own + 7
+
+    names = sorted(os.listdir(tmp_path))
+    assert AGGREGATE_SNAPSHOT in names
+    assert "1-0.json" not in names and "99999999.json" not in names
+
+    write_snapshot(tmp_path, "1-1.json", 5)
+
+    assert sent_total(asyncio.run(render_metrics())) == own + 12
+    assert sent_total(asyncio.run(render_metrics())) == own + 12
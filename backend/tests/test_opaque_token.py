@@ -0,0 +1,24 @@
+import settings
+
+
+from app.auth.utils.refresh_token import hash_refresh_token
+from app.auth.utils.reset_token import generate_reset_token
+from app.auth.utils.reset_token import hash_reset_token
+
+
+def test_token_kinds_have_distinct_keys():
+
+    token = generate_reset_token()
+
+    assert hash_reset_token(token) == hash_reset_token(token)
+    assert hash_reset_token(token) != hash_refresh_token(token)
+
+
+def test_explicit_key_overrides_the_derived_one(monkeypatch):
+
+    token = generate_reset_token()
+    derived = hash_reset_token(token)
+
+    monkeypatch.setattr(settings, "RESET_PASSWORD_TOKEN_KEY", "reset-key")
+
+    assert hash_reset_token(token) != derived
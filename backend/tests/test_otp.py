@@ -0,0 +1,78 @@
+import asyncio
+import time
+import pyotp
+import pytest
+
+
+from app.auth.utils.otp_handler import find_otp_time_step
+from app.auth.utils.otp_replay_cache import MemoryOtpReplayCache
+from app.auth.utils.otp_replay_cache import OtpReplayCache
+
+
+def test_find_otp_time_step():
+
+    totp = pyotp.TOTP(pyotp.random_base32())
+    now = time.time()
+    time_step = int(now // totp.interval)
+
+    assert find_otp_time_step(totp, totp.generate_otp(time_step), now) == time_step
+    assert find_otp_time_step(totp, totp.generate_otp(time_step + 5), now) is None
+
+
+@pytest.mark.parametrize("code", ["", "12345", "1234567", "abcdef", "١٢٣٤٥٦", "12345é"])
+def test_find_otp_time_step_rejects_malformed_codes(code):
+
+    totp = pyotp.TOTP(pyotp.random_base32())
+
+    assert find_otp_time_step(totp, code, time.time()) is None
+
+
+def test_replay_cache_is_abstract():
+    with pytest.raises(TypeError):
+        OtpReplayCache()
+
+
+def test_memory_replay_cache_rejects_replays():
+
+    async def test():
+        cache = MemoryOtpReplayCache()
+        assert await cache.mark_used(1, 100, 60)
+        assert not await cache.mark_used(1, 100, 60)
+        assert await cache.mark_used(2, 100, 60)
+
+    asyncio.run(test())
+
+
+def test_memory_replay_cache_purges_by_expiry_not_insertion_order(monkeypatch):
+
+    now = [1000.0]
+    monkeypatch.setattr(time, "monotonic", lambda: now[0])
+
+    async def test():
+        cache = MemoryOtpReplayCache()
+        assert await cache.mark_used(1, 101, 90)
+        # Older step, written later, expires first.
+        assert await cache.mark_used(2, 100, 30)
+
+        now[0] += 31
+        assert await cache.mark_used(3, 102, 90)
+        assert (2, 100) not in cache._entries
+        assert not await cache.mark_used(1, 101, 90)
+
+        now[0] += 60
+        assert await cache.mark_used(1, 101, 90)
+
+    asyncio.run(test())
+
+
+def test_memory_replay_cache_evicts_the_entry_expiring_first():
+
+    async def test():
+        cache = MemoryOtpReplayCache(max_keys=2)
+        assert await cache.mark_used(1, 101, 90)
+        assert await cache.mark_used(2, 100, 30)
+        assert await cache.mark_used(3, 102, 90)
+
+        assert set(cache._entries) == {(1, 101), (3, 102)}
+
+    asyncio.run(test())
@@ -0,0 +1,117 @@
+import asyncio
+import time
+import pytest
+from fastapi import HTTPException
+from fastapi import Request
+
+
+import settings
+from app.utils import rate_limiter
+from app.utils.rate_limiter import MemoryRateLimitBackend
+from app.utils.rate_limiter import RateLimiter
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """
+    Freeze time.monotonic at the start of a 60 second window; move it by
+    adding to clock[0].
+    """
+
+    now = [6000.0]
+    monkeypatch.setattr(time, "monotonic", lambda: now[0])
+
+    return now
+
+
+def hits(backend: MemoryRateLimitBackend, key: str, count: int, limit: int = 3) -> list[float]:
+
+    async def run():
+        return [await backend.hit(key, limit, 60) for _ in range(count)]
+
+    return asyncio.run(run())
+
+
+def test_allows_requests_under_the_limit(clock):
+
+    backend = MemoryRateLimitBackend()
+
+    assert hits(backend, "a", 3) == [0, 0, 0]
+    assert hits(backend, "a", 1) == [60]
+    assert hits(backend, "b", 1) == [0]
+
+
+def test_previous_window_decays_as_the_window_slides(clock):
+
+    backend = MemoryRateLimitBackend()
+
+    clock[0] += 10
+    assert hits(backend, "a", 3) == [0, 0, 0]
+
+    # Halfway through the next window, the 3 previous requests count for 1.5.
+    clock[0] += 80
+    allowed, limited = hits(backend, "a", 2)
+
+    assert allowed == 0
+    assert limited == pytest.approx(10)
+
+    # At the start of the next window, its 2 requests still count in full.
+    clock[0] += 30
+    allowed, limited = hits(backend, "a", 2)
+
+    assert allowed == 0
+    assert limited == pytest.approx(30)
+
+
+def test_counts_older_than_the_previous_window_are_dropped(clock):
+
+    backend = MemoryRateLimitBackend()
+
+    assert hits(backend, "a", 4)[-1] == 60
+
+    clock[0] += 125
+    assert hits(backend, "a", 3) == [0, 0, 0]
+
+
+def test_evicts_the_least_recently_used_key(clock):
+
+    backend = MemoryRateLimitBackend(max_keys=2)
+
+    hits(backend, "a", 3)
+    hits(backend, "b", 3)
+    hits(backend, "a", 1)
+    hits(backend, "c", 1)
+
+    assert list(backend._entries) == ["a", "c"]
+    assert hits(backend, "b", 1) == [0]
+
+
+def test_limiter_raises_429_with_retry_after(clock, monkeypatch):
+
+    monkeypatch.setattr(settings, "RATE_LIMIT_ENABLED", True)
+    monkeypatch.setattr(rate_limiter, "_rate_limit_backend", MemoryRateLimitBackend())
+
+    limiter = RateLimiter("login", ip_limit=2, username_limit=10, window_seconds=60)
+    request = Request({
+        "type": "http",
+        "method": "POST",
+        "path": "/",
+        "headers": [],
+        "query_string": b"username=alice",
+        "client": ("10.0.0.1", 1234),
+    })
+
+    async def run():
+        await limiter(request)
+        await limiter(request)
+
+        clock[0] += 20
+        with pytest.raises(HTTPException) as e:
+            await limiter(request)
+
+        return e.value
+
+    error = asyncio.run(run())
+
+    assert error.status_code == 429
+    assert error.headers == {"Retry-After": "40"}
@@ -0,0 +1,66 @@
+import asyncio
+import pytest
+
+
+from app.utils.single_flight import SingleFlight
+
+
+def test_concurrent_calls_share_one_execution():
+
+    async def test():
+        flights = SingleFlight()
+        calls = []
+
+        async def func():
+            calls.append(1)
+            await asyncio.sleep(0.01)
+            return "result"
+
+        results = await asyncio.gather(*(flights.do("key", func) for _ in range(3)))
+
+        assert results == ["result"] * 3
+        assert len(calls) == 1
+        assert (flights.calls, flights.shared, flights.in_flight) == (1, 2, 0)
+
+    asyncio.run(test())
+
+
+def test_exceptions_are_shared():
+
+    async def test():
+        flights = SingleFlight()
+
+        async def func():
+            await asyncio.sleep(0.01)
+            raise ValueError("failed")
+
+        results = await asyncio.gather(*(flights.do("key", func) for _ in range(2)), return_exceptions=True)
+
+        assert [type(result) for result in results] == [ValueError, ValueError]
+        assert "key" not in flights
+
+    asyncio.run(test())
+
+
+def test_cancelling_the_first_caller_does_not_cancel_the_others():
+
+    async def test():
+        flights = SingleFlight()
+
+        async def func():
+            await asyncio.sleep(0.02)
+            return "result"
+
+        leader = asyncio.create_task(flights.do("key", func))
+        await asyncio.sleep(0)
+        follower = asyncio.create_task(flights.do("key", func))
+        await asyncio.sleep(0)
+
+        leader.cancel()
+
+        with pytest.raises(asyncio.CancelledError):
+            await leader
+        assert await follower == "result"
+        assert flights.calls == 1
+
+    asyncio.run(test())
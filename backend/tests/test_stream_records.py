@@ -0,0 +1,145 @@
+import asyncio
+import pytest
+from fastapi import HTTPException
+from fastapi import Request
+
+
+from app.utils.stream_records import RecordError
+from app.utils.stream_records import iter_request_records
+
+
+def make_request(content_type: str, *chunks: bytes) -> Request:
+
+    messages = [{"type": "http.request", "body": chunk, "more_body": True} for chunk in chunks]
+    messages.append({"type": "http.request", "body": b"", "more_body": False})
+
+    async def receive():
+        return messages.pop(0)
+
+    scope = {
+        "type": "http",
+        "method": "POST",
+        "path": "/",
+        "headers": [(b"content-type", content_type.encode())],
+    }
+
+    return Request(scope, receive)
+
+
+def collect(request: Request, max_items: int = 10) -> list:
+
+    async def run():
+        return [item async for item in iter_request_records(request, max_items)]
+
+    return asyncio.run(run())
+
+
+def test_ndjson_records_split_across_chunks():
+
+    records = collect(make_request("application/x-ndjson", b'{"a": 1}\n{"a"', b': 2}\n\nnot json\n{"a": 3}'))
+
+    assert [index for index, _ in records] == [0, 1, 2, 3]
+    assert records[0][1] == {"a": 1}
+    assert records[1][1] == {"a": 2}
+    assert isinstance(records[2][1], RecordError)
+    assert records[3][1] == {"a": 3}
+
+
+def test_ndjson_invalid_utf8_is_a_record_error():
+
+    records = collect(make_request("application/x-ndjson", b'{"a": 1}\n"\xff"\n{"a": 3}\n'))
+
+    assert records[0][1] == {"a": 1}
+    assert "Invalid UTF-8" in str(records[1][1])
+    assert records[2][1] == {"a": 3}
+
+
+def test_ndjson_records_past_max_items_are_rejected():
+
+    body = b"".join(b'{"a": %d}\n' % i for i in range(4))
+    records = collect(make_request("application/x-ndjson", body), max_items=2)
+
+    assert [record for _, record in records[:2]] == [{"a": 0}, {"a": 1}]
+    assert records[2][0] == 2
+    assert "exceeds the limit" in str(records[2][1])
+    assert len(records) == 3
+
+
+def test_lines_over_max_record_bytes_are_rejected(monkeypatch):
+
+    import settings
+    monkeypatch.setattr(settings, "BULK_MAX_RECORD_BYTES", 16)
+
+    long_line = b'{"a": "' + b"x" * 40 + b'"}\n'
+    body = [b'{"a": 1}\n', long_line[:10], long_line[10:30], long_line[30:] + b'{"a": 2}\n', b'{"a": "' + b"y" * 20]
+    records = collect(make_request("application/x-ndjson", *body))
+
+    assert records[0][1] == {"a": 1}
+    assert "exceeds the limit of 16 bytes" in str(records[1][1])
+    assert records[2][1] == {"a": 2}
+    assert "exceeds the limit of 16 bytes" in str(records[3][1])
+    assert len(records) == 4
+
+
+def test_json_array_over_max_items_is_rejected_before_any_record():
+
+    request = make_request("application/json", b"[1, 2,", b" 3]")
+
+    async def run():
+        records = iter_request_records(request, 2)
+        with pytest.raises(HTTPException) as e:
+            await records.__anext__()
+        return e.value
+
+    assert asyncio.run(run()).status_code == 413
+
+
+def test_json_array_over_max_body_bytes_is_rejected(monkeypatch):
+
+    import settings
+    monkeypatch.setattr(settings, "BULK_MAX_BODY_BYTES", 8)
+
+    with pytest.raises(HTTPException) as e:
+        collect(make_request("application/json", b"[1, 2, 3,", b" 4]"))
+
+    assert e.value.status_code == 413
+
+
+def test_json_body_must_be_an_array():
+
+    with pytest.raises(HTTPException) as e:
+        collect(make_request("application/json", b'{"a": 1}'))
+
+    assert e.value.status_code == 400
+
+
+def test_csv_quoted_fields_may_span_lines():
+
+    body = b'name,bio\r\nalice,"line one\r\n\r\n  line ""two""\r\n"\r\nbob,plain\r\n'
+    records = collect(make_request("text/csv", body[:20], body[20:]))
+
+    assert records == [
+        (0, {"name": "alice", "bio": 'line one\r\n\r\n  line "two"\r\n'}),
+        (1, {"name": "bob", "bio": "plain"}),
+    ]
+
+
+def test_csv_row_errors_are_per_row():
+
+    body = b'name,bio\nalice\n\xff,x\nbob,plain\ncarol,"never closed\n'
+    records = collect(make_request("text/csv", body))
+
+    assert "Expected 2 CSV columns" in str(records[0][1])
+    assert "Invalid UTF-8" in str(records[1][1])
+    assert records[2][1] == {"name": "bob", "bio": "plain"}
+    assert "Unterminated" in str(records[3][1])
+
+
+def test_csv_rows_past_max_items_are_rejected():
+
+    body = b"name\n" + b"".join(b"user%d\n" % i for i in range(3))
+    records = collect(make_request("text/csv", body), max_items=2)
+
+    assert [record for _, record in records[:2]] == [{"name": "user0"}, {"name": "user1"}]
+    assert "exceeds the limit" in str(records[2][1])
+    assert len(records) == 3
@@ -0,0 +1,139 @@
+import time
+import pytest
+from datetime import datetime
+
+
+from app.auth.utils.user_cache import UserSnapshot
+from app.auth.utils.user_cache import UserSnapshotCache
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """
+    Freeze time.monotonic; move it by adding to clock[0].
+    """
+
+    now = [1000.0]
+    monkeypatch.setattr(time, "monotonic", lambda: now[0])
+
+    return now
+
+
+def make_user(user_id: int, username: str, name: str = "user") -> UserSnapshot:
+
+    now = datetime(2024, 1, 1)
+
+    return UserSnapshot(
+        id=user_id,
+        name=name,
+        age=30,
+        username=username,
+        email=f"{username}@example.com",
+        is_admin=False,
+        is_enable_otp=False,
+        is_logged_out=False,
+        created_at=now,
+        updated_at=now,
+    )
+
+
+def test_fill_is_stored(clock):
+
+    cache = UserSnapshotCache(max_entries=10, ttl_seconds=60)
+
+    version = cache.start_fill()
+    cache.finish_fill(version, make_user(1, "alice"))
+
+    assert cache.get_by_id(1).username == "alice"
+    assert cache.get_by_username("alice").id == 1
+
+
+def test_fill_finishing_after_put_is_dropped(clock):
+
+    cache = UserSnapshotCache(max_entries=10, ttl_seconds=60)
+
+    version = cache.start_fill()
+    cache.put(make_user(1, "alice", name="new"))
+    cache.finish_fill(version, make_user(1, "alice", name="old"))
+
+    assert cache.get_by_id(1).name == "new"
+    assert not cache._written
+
+
+def test_fill_finishing_after_put_of_the_username_is_dropped(clock):
+
+    cache = UserSnapshotCache(max_entries=10, ttl_seconds=60)
+
+    version = cache.start_fill()
+    cache.put(make_user(2, "alice"))
+    cache.finish_fill(version, make_user(1, "alice"))
+
+    assert cache.get_by_id(1) is None
+    assert cache.get_by_username("alice").id == 2
+
+
+def test_fill_finishing_after_invalidate_all_is_dropped(clock):
+
+    cache = UserSnapshotCache(max_entries=10, ttl_seconds=60)
+
+    version = cache.start_fill()
+    cache.invalidate(None)
+    cache.finish_fill(version, make_user(1, "alice"))
+
+    assert cache.get_by_id(1) is None
+
+    version = cache.start_fill()
+    cache.finish_fill(version, make_user(1, "alice"))
+
+    assert cache.get_by_id(1).username == "alice"
+
+
+def test_fill_of_another_user_is_kept(clock):
+
+    cache = UserSnapshotCache(max_entries=10, ttl_seconds=60)
+
+    version = cache.start_fill()
+    cache.invalidate(frozenset({"id:2", "username:bob"}))
+    cache.finish_fill(version, make_user(1, "alice"))
+
+    assert cache.get_by_id(1).username == "alice"
+
+
+def test_entries_expire_after_ttl(clock):
+
+    cache = UserSnapshotCache(max_entries=10, ttl_seconds=60)
+    cache.put(make_user(1, "alice"))
+
+    clock[0] += 59
+    assert cache.get_by_username("alice").id == 1
+
+    clock[0] += 1
+    assert cache.get_by_id(1) is None
+    assert cache.get_by_username("alice") is None
+    assert cache.stats()["entries"] == 0
+    assert cache.stats()["memory_bytes"] == 0
+
+
+def test_eviction_cleans_up_the_username_index(clock):
+
+    cache = UserSnapshotCache(max_entries=2, ttl_seconds=60)
+    cache.put(make_user(1, "alice"))
+    cache.put(make_user(2, "bob"))
+    cache.get_by_id(1)
+    cache.put(make_user(3, "carol"))
+
+    assert cache.get_by_id(2) is None
+    assert "bob" not in cache._ids_by_username
+    assert cache.get_by_username("alice").id == 1
+    assert cache.get_by_username("carol").id == 3
+
+
+def test_renamed_user_keeps_one_username(clock):
+
+    cache = UserSnapshotCache(max_entries=10, ttl_seconds=60)
+    cache.put(make_user(1, "alice"))
+    cache.put(make_user(1, "alicia"))
+
+    assert cache.get_by_username("alice") is None
+    assert cache.get_by_username("alicia").id == 1
+    assert cache.stats()["entries"] == 1
@@ -0,0 +1,265 @@
+import zlib
+from typing import Optional
+from loguru import logger
+from starlette.datastructures import Headers
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp
+from starlette.types import Message
+from starlette.types import Receive
+from starlette.types import Scope
+from starlette.types import Send
+
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - brotli is optional
+    brotli = None
+
+
+DEFAULT_COMPRESSIBLE_TYPES = (
+    "application/json",
+    "text/html",
+    "text/plain",
+    "text/css",
+    "application/javascript",
+)
+
+
+def parse_accept_encoding(value: str) -> dict[str, float]:
+    """
+    Parse an Accept-Encoding header into a mapping of coding to q-value.
+
+    Args:
+        value (str): The raw header value, e.g. "gzip;q=0.8, br".
+
+    Returns:
+        dict[str, float]: The accepted codings with their q-values.
+    """
+
+    codings = {}
+
+    for part in value.split(","):
+        name, _, params = part.strip().partition(";")
+        name = name.strip().lower()
+
+        if not name:
+            continue
+
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+
+        codings[name] = quality
+
+    return codings
+
+
+class _GzipEncoder:
+
+    name = "gzip"
+
+    def __init__(self, level: int):
+        self._compressor = zlib.compressobj(level, zlib.DEFLATED, zlib.MAX_WBITS | 16)
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.compress(data) + self._compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self, data: bytes = b"") -> bytes:
+        return self._compressor.compress(data) + self._compressor.flush(zlib.Z_FINISH)
+
+
+class _BrotliEncoder:
+
+    name = "br"
+
+    def __init__(self, quality: int):
+        self._compressor = brotli.Compressor(quality=quality)
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.process(data) + self._compressor.flush()
+
+    def finish(self, data: bytes = b"") -> bytes:
+        return self._compressor.process(data) + self._compressor.finish()
+
+
+class CompressionMiddleware:
+    """
+    Compress HTTP responses with brotli or gzip.
+
+    Small bodies and non-compressible content types are passed through
+    uncompressed. Every response of a compressible type gets
+    Vary: Accept-Encoding, compressed or not, so that a shared cache never
+    serves one client's variant to another. Single-message bodies are
+    compressed in one go and get an exact Content-Length; streamed bodies are
+    compressed chunk by chunk and flushed after every chunk, so nothing is
+    buffered across messages.
+    """
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        minimum_size: int = 1024,
+        compressible_types: tuple[str, ...] = DEFAULT_COMPRESSIBLE_TYPES,
+        gzip_level: int = 6,
+        brotli_quality: int = 4,
+        enable_brotli: bool = True,
+    ) -> None:
+        self.app = app
+        self.minimum_size = minimum_size
+        self.compressible_types = tuple(t.lower() for t in compressible_types)
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+        self.enable_brotli = enable_brotli and brotli is not None
+
+        if enable_brotli and brotli is None:
+            logger.warning("brotli is not installed, falling back to gzip compression only")
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        encoding = self.select_encoding(Headers(scope=scope).get("accept-encoding", ""))
+        responder = _CompressionResponder(self, encoding, send)
+        await self.app(scope, receive, responder)
+
+    def select_encoding(self, accept_encoding: str):
+        """
+        Pick the best supported coding the client accepts.
+
+        Args:
+            accept_encoding (str): The Accept-Encoding request header.
+
+        Returns:
+            str: "br", "gzip" or None when the response must stay identity.
+        """
+
+        if not accept_encoding:
+            return None
+
+        codings = parse_accept_encoding(accept_encoding)
+        wildcard = codings.get("*", 0.0)
+
+        if self.enable_brotli and codings.get("br", wildcard) > 0:
+            return "br"
+
+        if codings.get("gzip", wildcard) > 0:
+            return "gzip"
+
+        return None
+
+    def is_compressible(self, headers: Headers) -> bool:
+        """
+        Check whether a response may be compressed based on its headers.
+
+        Args:
+            headers (Headers): The response headers.
+
+        Returns:
+            bool: True if the response may be compressed, False otherwise.
+        """
+
+        if "content-encoding" in headers:
+            return False
+
+        content_type = headers.get("content-type", "").split(";", 1)[0].strip().lower()
+
+        return content_type.startswith(self.compressible_types)
+
+    def create_encoder(self, encoding: str):
+
+        if encoding == "br":
+            return _BrotliEncoder(self.brotli_quality)
+
+        return _GzipEncoder(self.gzip_level)
+
+
+class _CompressionResponder:
+
+    def __init__(self, middleware: CompressionMiddleware, encoding: Optional[str], send: Send) -> None:
+        self.middleware = middleware
+        self.encoding = encoding
+        self.send = send
+        self.start_message = None
+        self.encoder = None
+        self.passthrough = False
+
+    async def __call__(self, message: Message) -> None:
+
+        message_type = message["type"]
+
+        if message_type == "http.response.start":
+            self.start_message = message
+            compressible = self.middleware.is_compressible(Headers(raw=message["headers"]))
+
+            if compressible:
+                headers = MutableHeaders(raw=list(message["headers"]))
+                headers.add_vary_header("Accept-Encoding")
+                message["headers"] = headers.raw
+
+            self.passthrough = not compressible or self.encoding is None
+            return
+
+        if message_type != "http.response.body":
+            await self.send(message)
+            return
+
+        if self.passthrough:
+            await self._send_start()
+            await self.send(message)
+            return
+
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+
+        if self.encoder is None:
+
+            if not more_body:
+                await self._send_whole(body)
+                return
+
+            self.encoder = self.middleware.create_encoder(self.encoding)
+            self._prepare_headers(content_length=None)
+            await self._send_start()
+
+        if more_body:
+            chunk = self.encoder.compress(body)
+            if chunk:
+                await self.send({"type": "http.response.body", "body": chunk, "more_body": True})
+        else:
+            await self.send({"type": "http.response.body", "body": self.encoder.finish(body), "more_body": False})
+
+    async def _send_whole(self, body: bytes) -> None:
+
+        if len(body) < self.middleware.minimum_size:
+            await self._send_start()
+            await self.send({"type": "http.response.body", "body": body, "more_body": False})
+            return
+
+        compressed = self.middleware.create_encoder(self.encoding).finish(body)
+
+        self._prepare_headers(content_length=len(compressed))
+        await self._send_start()
+        await self.send({"type": "http.response.body", "body": compressed, "more_body": False})
+
+    def _prepare_headers(self, content_length) -> None:
+
+        headers = MutableHeaders(raw=list(self.start_message["headers"]))
+        self.start_message["headers"] = headers.raw
+        headers["Content-Encoding"] = self.encoding
+
+        if content_length is None:
+            del headers["Content-Length"]
+        else:
+            headers["Content-Length"] = str(content_length)
+
+    async def _send_start(self) -> None:
+
+        if self.start_message is not None:
+            message, self.start_message = self.start_message, None
+            await self.send(message)
@@ -1,7 +1,17 @@
+import settings
 from fastapi import FastAPI
 from contextlib import asynccontextmanager
 from loguru import logger
 from utils.startup import startup
+from utils.shutdown import shutdown
+from utils.maintenance import register_maintenance_jobs
+from utils.scheduler import get_scheduler
+from app.utils.metrics import write_metrics_snapshot
+from app.utils.tracing import export_spans
+from app.utils.health import loop_lag_monitor
+from app.auth.utils.jwt_keys import get_key_ring
+from app.utils.invalidation import get_invalidation_bus
+from app.utils.redis_client import close_redis_client
 
 
 @asynccontextmanager
@@ -10,6 +20,47 @@ async def lifespan(app: FastAPI):
     logger.info("Server is starting...")
 
     await startup()
+
+    # Load the JWT keys now, so that a broken key directory fails the start.
+    get_key_ring()
+
+    loop_lag_monitor.start()
+
+    if settings.INVALIDATION_ENABLED:
+        get_invalidation_bus().start()
+
+    scheduler = get_scheduler()
+    if settings.SCHEDULER_ENABLED:
+        register_maintenance_jobs(scheduler)
+    if settings.METRICS_ENABLED and settings.METRICS_MULTIPROCESS_DIR:
+        scheduler.add_job(
+            "write_metrics_snapshot",
+            write_metrics_snapshot,
+            interval_seconds=settings.METRICS_FLUSH_INTERVAL_SECONDS,
+            jitter_seconds=settings.METRICS_FLUSH_INTERVAL_SECONDS / 10,
+            leader_only=False,
+        )
+    if settings.TRACING_ENABLED:
+        scheduler.add_job(
+            "export_spans",
+            export_spans,
+            interval_seconds=settings.TRACING_EXPORT_INTERVAL_SECONDS,
+            jitter_seconds=settings.TRACING_EXPORT_INTERVAL_SECONDS / 10,
+            leader_only=False,
+        )
+    if scheduler.jobs:
+        scheduler.start()
+
     yield
 
     logger.info("Server is shutting down...")
+
+    await scheduler.stop()
+    await loop_lag_monitor.stop()
+    await get_invalidation_bus().stop()
+    await close_redis_client()
+    if settings.METRICS_ENABLED and settings.METRICS_MULTIPROCESS_DIR:
+        await write_metrics_snapshot()
+    if settings.TRACING_ENABLED:
+        await export_spans()
+    await shutdown()
@@ -0,0 +1,74 @@
+import settings
+import os
+import time
+from loguru import logger
+
+
+from app.auth.services.universal import purge_expired_reset_tokens
+from app.auth.services.refresh_tokens import purge_expired_refresh_tokens
+from utils.scheduler import Scheduler
+
+
+async def prune_log_files() -> int:
+    """
+    Delete rotated log files older than settings.LOG_RETENTION_DAYS.
+
+    Loguru only applies its retention when the process that owns a sink
+    rotates it, so files left behind by restarted or removed workers are
+    cleaned up here.
+
+    Returns:
+        int: The number of files deleted.
+    """
+
+    if not os.path.isdir(settings.LOG_DIR):
+        return 0
+
+    cutoff = time.time() - settings.LOG_RETENTION_DAYS * 86400
+    deleted = 0
+
+    with os.scandir(settings.LOG_DIR) as entries:
+        for entry in entries:
+
+            if not entry.is_file() or not entry.name.endswith((".log", ".log.gz", ".log.zip")):
+                continue
+
+            if entry.stat().st_mtime >= cutoff:
+                continue
+
+            try:
+                os.remove(entry.path)
+                deleted += 1
+            except OSError as e:
+                logger.warning(f'Could not delete log file {entry.path}: {e}')
+
+    return deleted
+
+
+def register_maintenance_jobs(scheduler: Scheduler) -> None:
+    """
+    Register the periodic maintenance jobs.
+
+    Args:
+        scheduler (Scheduler): The scheduler to register the jobs with.
+    """
+
+    scheduler.add_job(
+        "purge_expired_reset_tokens",
+        purge_expired_reset_tokens,
+        interval_seconds=settings.MAINTENANCE_RESET_TOKEN_INTERVAL_SECONDS,
+    )
+
+    scheduler.add_job(
+        "purge_expired_refresh_tokens",
+        purge_expired_refresh_tokens,
+        interval_seconds=settings.MAINTENANCE_REFRESH_TOKEN_INTERVAL_SECONDS,
+    )
+
+    # Every host has its own log directory, so every worker may prune it.
+    scheduler.add_job(
+        "prune_log_files",
+        prune_log_files,
+        interval_seconds=settings.MAINTENANCE_LOG_PRUNE_INTERVAL_SECONDS,
+        leader_only=False,
+    )
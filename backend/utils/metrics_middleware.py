@@ -0,0 +1,54 @@
+import time
+from starlette.types import ASGIApp
+from starlette.types import Message
+from starlette.types import Receive
+from starlette.types import Scope
+from starlette.types import Send
+
+
+from app.utils.metrics import HTTP_REQUESTS
+from app.utils.metrics import HTTP_REQUEST_DURATION
+from app.utils.metrics import HTTP_REQUESTS_IN_FLIGHT
+
+
+class MetricsMiddleware:
+    """
+    ASGI middleware recording request counts, latency and in-flight requests.
+
+    Requests are labelled with the route template (e.g. "/api/posts/{post_id}")
+    rather than the raw path, so the number of label sets stays bounded.
+    Requests that match no route share the "unmatched" label.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+
+        async def send_with_status(message: Message) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        HTTP_REQUESTS_IN_FLIGHT.inc()
+        started = time.perf_counter()
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            duration = time.perf_counter() - started
+            HTTP_REQUESTS_IN_FLIGHT.dec()
+
+            route = scope.get("route")
+            route_path = getattr(route, "path", None) or "unmatched"
+            method = scope["method"]
+
+            HTTP_REQUESTS.inc(method, route_path, str(status))
+            HTTP_REQUEST_DURATION.observe(duration, method, route_path)
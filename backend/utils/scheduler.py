@@ -0,0 +1,268 @@
+import settings
+import asyncio
+import random
+import time
+import zlib
+from typing import Awaitable
+from typing import Callable
+from typing import Optional
+from sqlalchemy import text
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.ext.asyncio import AsyncConnection
+from loguru import logger
+
+
+from database import async_engine
+from app.utils.metrics import SCHEDULER_JOB_DURATION
+from app.utils.metrics import SCHEDULER_JOB_RUNS
+
+
+class LeaderLock:
+    """
+    Elects one worker of the deployment as the leader, with a Postgres
+    advisory lock held for as long as the worker lives.
+
+    The leader keeps the lock, and the connection holding it, until release.
+    If the leader dies or loses its connection, Postgres frees the lock and
+    the next worker to call acquire takes over. The held connection takes one
+    slot of the database pool.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.key = zlib.crc32(f"scheduler:{name}".encode())
+        self._connection: Optional[AsyncConnection] = None
+        self._lock = asyncio.Lock()
+
+    async def acquire(self) -> bool:
+        """
+        Check that this worker is the leader, trying to become it if no worker is.
+
+        Returns:
+            bool: Whether this worker is the leader.
+        """
+
+        async with self._lock:
+
+            if self._connection is not None:
+                try:
+                    await self._connection.execute(text("SELECT 1"))
+                    return True
+                except SQLAlchemyError as e:
+
+                    logger.warning(f'Lost the {self.name} leader lock: {e}')
+
+                    await self._close()
+
+            connection = await async_engine.connect()
+
+            try:
+                result = await connection.execute(text("SELECT pg_try_advisory_lock(:key)"), {"key": self.key})
+                is_leader = bool(result.scalar())
+            except BaseException:
+                await connection.close()
+                raise
+
+            if not is_leader:
+                await connection.close()
+                return False
+
+            logger.info(f'Became the {self.name} leader')
+
+            self._connection = connection
+            return True
+
+    async def release(self) -> None:
+        """
+        Give up the leadership, if this worker holds it.
+        """
+
+        async with self._lock:
+
+            if self._connection is None:
+                return
+
+            try:
+                await self._connection.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": self.key})
+            except SQLAlchemyError as e:
+                logger.warning(f'Could not release the {self.name} leader lock: {e}')
+
+            await self._close()
+
+    async def _close(self) -> None:
+
+        connection, self._connection = self._connection, None
+
+        try:
+            await connection.close()
+        except SQLAlchemyError:
+            await connection.invalidate()
+
+
+class ScheduledJob:
+    """
+    A coroutine function run every interval_seconds, give or take jitter_seconds.
+
+    With a leader lock, the job only runs on the worker holding it, and is
+    skipped on the others. Jobs are expected to be idempotent: the lock stops
+    every worker from running them, but a run may be repeated when the
+    leadership moves.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        func: Callable[[], Awaitable],
+        interval_seconds: float,
+        jitter_seconds: float,
+        leader_lock: Optional[LeaderLock] = None,
+    ):
+        self.name = name
+        self.func = func
+        self.interval_seconds = interval_seconds
+        self.jitter_seconds = jitter_seconds
+        self.leader_lock = leader_lock
+
+    def next_delay(self) -> float:
+        return max(self.interval_seconds + random.uniform(-self.jitter_seconds, self.jitter_seconds), 0)
+
+    async def run_once(self) -> None:
+        """
+        Run the job once, unless it has a leader lock that another worker holds.
+        """
+
+        if self.leader_lock is not None and not await self.leader_lock.acquire():
+
+            logger.info(f'Skip job {self.name}: another worker is the leader')
+
+            SCHEDULER_JOB_RUNS.inc(self.name, "skipped")
+            return
+
+        await self._run()
+
+    async def _run(self) -> None:
+
+        started = time.perf_counter()
+
+        try:
+            result = await self.func()
+            outcome = "success"
+        except Exception as e:
+
+            logger.error(f'Job {self.name} failed: {e}')
+
+            result = None
+            outcome = "failure"
+
+        duration = time.perf_counter() - started
+        SCHEDULER_JOB_RUNS.inc(self.name, outcome)
+        SCHEDULER_JOB_DURATION.observe(duration, self.name)
+
+        logger.info(f'Job {self.name} finished in {duration * 1000:.1f} ms with result={result}')
+
+
+class Scheduler:
+    """
+    A minimal in-process periodic task scheduler running on the event loop.
+
+    Each job gets its own task that sleeps for its interval plus random
+    jitter between runs, so the workers of a deployment do not all wake up
+    at once.
+    """
+
+    def __init__(self):
+        self.jobs: dict[str, ScheduledJob] = {}
+        self.leader_lock = LeaderLock("leader")
+        self._tasks: list[asyncio.Task] = []
+
+    def add_job(
+        self,
+        name: str,
+        func: Callable[[], Awaitable],
+        interval_seconds: float,
+        jitter_seconds: float = None,
+        leader_only: bool = True,
+    ) -> ScheduledJob:
+        """
+        Register a job.
+
+        Args:
+            name (str): The unique name of the job.
+            func (Callable[[], Awaitable]): The coroutine function to run.
+            interval_seconds (float): The average time between runs.
+            jitter_seconds (float, optional): The maximum random deviation from
+                the interval. Defaults to settings.SCHEDULER_JITTER_SECONDS.
+            leader_only (bool, optional): Whether only the leader worker of the
+                deployment runs the job. Defaults to True.
+
+        Returns:
+            ScheduledJob: The registered job.
+        """
+
+        if jitter_seconds is None:
+            jitter_seconds = settings.SCHEDULER_JITTER_SECONDS
+
+        job = ScheduledJob(name, func, interval_seconds, jitter_seconds, self.leader_lock if leader_only else None)
+        self.jobs[name] = job
+
+        return job
+
+    def start(self) -> None:
+        """
+        Start running every registered job in the background.
+        """
+
+        logger.info(f'Starting scheduler with jobs: {", ".join(self.jobs)}')
+
+        for job in self.jobs.values():
+            self._tasks.append(asyncio.create_task(self._loop(job), name=f"scheduler:{job.name}"))
+
+    async def stop(self) -> None:
+        """
+        Cancel all jobs and wait for them to finish.
+        """
+
+        logger.info('Stopping scheduler')
+
+        for task in self._tasks:
+            task.cancel()
+
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+        await self.leader_lock.release()
+
+    async def _loop(self, job: ScheduledJob) -> None:
+
+        await asyncio.sleep(random.uniform(0, job.jitter_seconds))
+
+        while True:
+
+            try:
+                await job.run_once()
+            except Exception as e:
+
+                logger.error(f'Scheduler could not run job {job.name}: {e}')
+
+                SCHEDULER_JOB_RUNS.inc(job.name, "failure")
+
+            await asyncio.sleep(job.next_delay())
+
+
+_scheduler: Optional[Scheduler] = None
+
+
+def get_scheduler() -> Scheduler:
+    """
+    Get the process-wide scheduler.
+
+    Returns:
+        Scheduler: The shared scheduler.
+    """
+
+    global _scheduler
+
+    if _scheduler is None:
+        _scheduler = Scheduler()
+
+    return _scheduler
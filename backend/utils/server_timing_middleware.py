@@ -0,0 +1,45 @@
+import time
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp
+from starlette.types import Message
+from starlette.types import Receive
+from starlette.types import Scope
+from starlette.types import Send
+
+
+from app.utils.server_timing import format_server_timing
+from app.utils.server_timing import start_server_timing
+from app.utils.server_timing import stop_server_timing
+
+
+class ServerTimingMiddleware:
+    """
+    ASGI middleware adding a Server-Timing header with a per-phase breakdown.
+
+    Phases are accounted through a context variable by the code doing the
+    work (auth, db, hash, template, serialize), so only what happened before
+    the response started is reported.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        timings = start_server_timing()
+        started = time.perf_counter()
+
+        async def send_with_server_timing(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                header = format_server_timing(timings, time.perf_counter() - started)
+                MutableHeaders(scope=message).append("Server-Timing", header)
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_server_timing)
+        finally:
+            stop_server_timing()
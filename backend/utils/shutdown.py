@@ -1,9 +1,14 @@
 from loguru import logger
 
 
+from app.auth.utils.password_manager import shutdown_password_hash_executor
+
+
 async def shutdown():
     """
-    Called on application shutdown.
+    Called on application shutdown.  Stops the password hash pool.
     """
 
     logger.info("Shutting down application...")
+
+    shutdown_password_hash_executor()
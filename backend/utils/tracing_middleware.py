@@ -0,0 +1,63 @@
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp
+from starlette.types import Message
+from starlette.types import Receive
+from starlette.types import Scope
+from starlette.types import Send
+
+
+from app.utils.tracing import end_trace
+from app.utils.tracing import start_trace
+
+
+class TracingMiddleware:
+    """
+    ASGI middleware opening the root span of each sampled request.
+
+    The incoming W3C traceparent header is honoured, and the traceparent of
+    the root span is returned in the response so that clients can find the
+    trace. The span is named after the route template once routing is done.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        traceparent = None
+        for name, value in scope["headers"]:
+            if name == b"traceparent":
+                traceparent = value.decode("latin-1")
+                break
+
+        span = start_trace(
+            f"{scope['method']} {scope['path']}",
+            traceparent,
+            {"http.method": scope["method"], "http.target": scope["path"]},
+        )
+
+        if span is None:
+            await self.app(scope, receive, send)
+            return
+
+        async def send_with_traceparent(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                span.attributes["http.status_code"] = message["status"]
+                MutableHeaders(scope=message).append("traceparent", span.traceparent())
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_traceparent)
+        except BaseException as e:
+            span.set_error(e)
+            raise
+        finally:
+            route = scope.get("route")
+            if route is not None:
+                span.name = f"{scope['method']} {route.path}"
+                span.attributes["http.route"] = route.path
+            end_trace(span)